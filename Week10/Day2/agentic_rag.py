@@ -12,23 +12,99 @@ Components:
 """
 
 import os
-from typing import List, Dict, Any, Optional, TypedDict
-from dataclasses import dataclass
+import asyncio
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+import json
+import contextlib
+import functools
+import hashlib
+import logging
+import operator
+import re
+import threading
+import time
+import uuid
+import weakref
+from typing import (
+    List, Dict, Any, Optional, TypedDict, Annotated, Iterator, Callable, Collection,
+    FrozenSet, Set, Tuple)
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# Chunking parameters shared by the initial build and add_documents.
+# They are part of the index fingerprint: changing them forces a rebuild.
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+
+# File written next to a saved FAISS index describing what it was built from
+INDEX_MANIFEST = "manifest.json"
+BM25_FILE = "bm25.pkl"
+# Uploads are saved incrementally (the FAISS update log, BM25 catching up
+# on load) until they add up to as many chunks as the last full save, and
+# at least this many; then a background checkpoint saves the index in full
+CHECKPOINT_MIN_CHUNKS = 1024
+# Longest an upload appending to a FAISS index may hold its write lock at a
+# time, keeping queries out; batches are appended in slices that fit
+APPEND_HOLD_MS = 5.0
+
+# Collection built from the constructor's documents, stored at index_dir
+# itself; other collections live under index_dir/collections/<name>
+DEFAULT_COLLECTION = "default"
+COLLECTIONS_DIR = "collections"
+# "name" or "namespace/name"
+_COLLECTION_NAME = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]*(/[A-Za-z0-9_-][A-Za-z0-9_.-]*)?")
+
+# Query terms that signal current/real-time information is needed
+WEB_SEARCH_TERMS = [
+    "latest", "recent", "current", "today", "news",
+    "2024", "2025", "now", "this year", "this month"
+]
+
+GRAPH_MODES = ("sequential", "parallel")
+
+# blocking: reasoning is a graph node on the critical path
+# background: reasoning runs alongside the query and is reported if it
+#   finished in time; the answer never waits for it
+# off: no reasoning call (plan() still runs it on request)
+REASONING_MODES = ("blocking", "background", "off")
+
+# Share of latency_budget_ms each upstream-calling node may spend waiting
+BUDGET_SPLIT = {"reason": 0.2, "web_search": 0.35, "synthesize": 0.45}
 
 
 # ============================================
 # Agent State Definition
 # ============================================
-class AgentState(TypedDict):
-    """State passed between nodes in the agent graph."""
+class AgentState(TypedDict, total=False):
+    """
+    State passed between nodes in the agent graph.
+
+    Nodes return only the keys they produce. List fields that several nodes
+    contribute to (sources, steps) have an append reducer, so LangGraph
+    extends them in place of each node copying the whole list forward.
+    """
     query: str
     reasoning: str
     retrieved_docs: List[Dict[str, Any]]
+    # FAISS distances of the nearest chunks (lower is closer), for routing
+    retrieval_distances: List[float]
     web_results: List[Dict[str, Any]]
     needs_web_search: bool
     final_answer: str
-    sources: List[Dict[str, Any]]
-    steps: List[str]
+    sources: Annotated[List[Dict[str, Any]], operator.add]
+    steps: Annotated[List[str], operator.add]
+    # One timing/token record per node that ran (see _instrument)
+    metrics: Annotated[List[Dict[str, Any]], operator.add]
+    # time.perf_counter() value by which the answer is due (latency_budget_ms)
+    deadline: float
+    # Degradations applied to stay within budget or around a failing upstream
+    fallbacks: Annotated[List[str], operator.add]
+    # Set by query_stream: tokens are streamed, so synthesis is not hedged
+    streaming: bool
+    # Names of the collections retrieval searches
+    collections: List[str]
 
 
 # ============================================
@@ -92,6 +168,526 @@ SAMPLE_DOCUMENTS = [
 ]
 
 
+# ============================================
+# Index Helpers
+# ============================================
+def _split_documents(docs):
+    """Split LangChain documents into retrieval-sized chunks."""
+    from rag_ingest import text_splitter
+
+    return text_splitter(CHUNK_SIZE, CHUNK_OVERLAP).split_documents(docs)
+
+
+def _corpus_fingerprint(
+    documents: List[Dict[str, str]],
+    embedding_model: str,
+    index_params: Optional[Dict[str, Any]] = None,
+    chunk_store: bool = False,
+) -> str:
+    """Hash everything that determines the contents of the vector index."""
+    payload = {
+        "embedding_model": embedding_model,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "documents": [
+            [d["content"], d["title"], d.get("type", "knowledge_base")]
+            for d in documents
+        ],
+    }
+    # Flat indexes keep the original fingerprint, so saved indexes stay valid
+    if index_params and index_params["kind"] != "flat":
+        payload["index"] = index_params
+    if chunk_store:
+        payload["storage"] = "chunk_store"
+    return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+
+def _appendable_store(vector_store):
+    """
+    Store to append an upload to, without copying the index: LangChain's
+    FAISS store itself (published snapshots only see the positions below
+    their ntotal), or a new view of a rag_store.DiskVectorStore, whose
+    appends go past the original's end.
+    """
+    if hasattr(vector_store, "clone"):
+        return vector_store.clone()
+    return vector_store
+
+
+def _add_in_slices(
+    lock: "_ReadWriteLock", index, vectors, size: int, added: Optional[Callable] = None,
+) -> int:
+    """
+    Add vectors to a FAISS index that queries are searching, holding lock's
+    write side for about APPEND_HOLD_MS at a time (an HNSW graph takes a
+    millisecond or more per vector). Slices are sized from the CPU time the
+    last one took (wall time would include handing the GIL to queries),
+    growing at most twofold; returns the size to continue with.
+
+    Args:
+        added: Called with (start, end) of each slice once it is in the index
+    """
+    start = 0
+    while start < len(vectors):
+        end = min(start + size, len(vectors))
+        with lock.write():
+            began = time.thread_time()
+            index.add(vectors[start:end])
+            elapsed_ms = (time.thread_time() - began) * 1000
+            if added is not None:
+                added(start, end)
+        fits = APPEND_HOLD_MS * (end - start) / elapsed_ms if elapsed_ms else size * 2
+        size = max(1, min(size * 2, int(fits)))
+        start = end
+    return size
+
+
+def _append_chunks(
+    lock: "_ReadWriteLock", vector_store, texts: List[str], vectors, metadatas: List[Dict],
+    slice_size: int,
+) -> int:
+    """
+    Append chunks to a store that queries are searching. Only adding their
+    vectors to the FAISS index takes lock (see _add_in_slices, whose slice
+    size this takes and returns); text and metadata go in first, unseen by
+    queries until the snapshot covering them is published.
+    """
+    import faiss
+    import numpy as np
+    from langchain_core.documents import Document
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if hasattr(vector_store, "store"):
+        # rag_store.DiskVectorStore: its chunk files need no lock
+        sizes = [slice_size]
+
+        def add_vectors(new):
+            sizes[0] = _add_in_slices(lock, vector_store.ann_index, new, sizes[0])
+
+        vector_store.add_embeddings(
+            zip(texts, vectors), metadatas=metadatas, add_vectors=add_vectors)
+        return sizes[0]
+
+    # What FAISS.add_embeddings does, but into the docstore in place: its
+    # InMemoryDocstore.add copies the whole docstore on every call
+    if vector_store._normalize_L2:
+        faiss.normalize_L2(vectors)
+    ids = [str(uuid.uuid4()) for _ in texts]
+    vector_store.docstore._dict.update(
+        (doc_id, Document(id=doc_id, page_content=text, metadata=metadata))
+        for doc_id, text, metadata in zip(ids, texts, metadatas))
+    first = len(vector_store.index_to_docstore_id)
+
+    def added(start, end):
+        vector_store.index_to_docstore_id.update(
+            (first + i, ids[i]) for i in range(start, end))
+
+    return _add_in_slices(lock, vector_store.index, vectors, slice_size, added)
+
+
+def _compact_vector_store(vector_store, keep: List[int], spec=None):
+    """
+    Store holding only the chunks at positions keep, renumbered in that
+    order; with an IndexSpec, its FAISS index is retrained as that spec.
+    """
+    if hasattr(vector_store, "compact"):
+        # rag_store.DiskVectorStore: written as a new generation
+        return vector_store.compact(keep, spec)
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from rag_retrieval import compact_index
+
+    doc_ids = [vector_store.index_to_docstore_id[position] for position in keep]
+    return FAISS(
+        embedding_function=vector_store.embedding_function,
+        index=compact_index(vector_store.index, keep, spec=spec),
+        docstore=InMemoryDocstore({i: vector_store.docstore._dict[i] for i in doc_ids}),
+        index_to_docstore_id=dict(enumerate(doc_ids)),
+        normalize_L2=vector_store._normalize_L2,
+        distance_strategy=vector_store.distance_strategy,
+    )
+
+
+def _stored_chunks(
+    vector_store, ntotal: Optional[int] = None, start: int = 0
+) -> Iterator[tuple]:
+    """
+    (text, metadata) of a store's chunks from position start up to ntotal
+    (its end by default), in FAISS position order.
+    """
+    if hasattr(vector_store, "iter_chunks"):
+        # rag_store.DiskVectorStore: views are never appended to
+        return vector_store.iter_chunks(start)
+    docs = (
+        vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+        for i in range(start, vector_store.index.ntotal if ntotal is None else ntotal)
+    )
+    return ((doc.page_content, doc.metadata) for doc in docs)
+
+
+def _doc_id(metadata: Dict[str, Any]) -> str:
+    """Document a chunk belongs to: its upload's doc_id, else its title."""
+    return metadata.get("doc_id") or metadata.get("title", "")
+
+
+def normalize_collection_name(text: str) -> str:
+    """
+    Collection name for free text such as a workspace typed into the UI:
+    lowercased, whitespace runs turned into '-', other characters outside
+    letters, digits, '_', '-', '.' and '/' dropped.
+
+    Raises:
+        ValueError: if nothing valid ("name" or "namespace/name") remains
+    """
+    name = re.sub(r"\s+", "-", text.strip().lower())
+    name = re.sub(r"[^a-z0-9_./-]", "", name)
+    name = "/".join(part.lstrip(".") for part in name.split("/") if part.strip("."))
+    if not _COLLECTION_NAME.fullmatch(name):
+        raise ValueError(
+            f"Invalid collection name {text!r}: use letters, digits, '_', '-' "
+            "and '.', optionally as 'namespace/name'")
+    return name
+
+
+def _needs_web_search(query: str) -> bool:
+    """Keyword heuristic: does the query ask for current information?"""
+    query_lower = query.lower()
+    return any(term in query_lower for term in WEB_SEARCH_TERMS)
+
+
+class _Lazy:
+    """Thread-safe holder that builds its value on first get()."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._value = self._factory()
+                    self._loaded = True
+        return self._value
+
+    def set(self, value):
+        """Replace the value; concurrent get() returns either the old or the new one."""
+        with self._lock:
+            self._value = value
+            self._loaded = True
+
+
+class _ReadWriteLock:
+    """
+    Shared reads, exclusive writes. A waiting writer holds back new
+    readers, so a steady stream of queries cannot starve an upload; the
+    readers waiting when a write ends go before the next one, so a run of
+    writes (an upload's slices) cannot starve queries either.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+        self._waiting_readers = 0
+        self._readers_turn = False
+
+    @contextlib.contextmanager
+    def read(self):
+        with self._cond:
+            self._waiting_readers += 1
+            while self._writing or (self._waiting_writers and not self._readers_turn):
+                self._cond.wait()
+            self._waiting_readers -= 1
+            if not self._waiting_readers:
+                self._readers_turn = False
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writing or self._readers or self._readers_turn:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._readers_turn = self._waiting_readers > 0
+                self._cond.notify_all()
+
+
+class _DocumentTable:
+    """
+    Live documents of a collection: chunk positions per document id and
+    the documents holding each content hash (for deduplication).
+
+    Only changed by the collection's writers, under its ingest lock, after
+    the snapshot they describe has been published.
+    """
+
+    def __init__(self):
+        self.chunks: Dict[str, List[int]] = {}
+        self.owners: Dict[str, Set[str]] = {}
+        self._hashes: Dict[str, Set[str]] = {}
+
+    def add(self, doc_id: str, content_hash: Optional[str], positions: List[int]):
+        self.chunks.setdefault(doc_id, []).extend(positions)
+        if content_hash:
+            self.owners.setdefault(content_hash, set()).add(doc_id)
+            self._hashes.setdefault(doc_id, set()).add(content_hash)
+
+    def remove(self, doc_id: str) -> List[int]:
+        """Forget a document; returns the positions of its chunks."""
+        for content_hash in self._hashes.pop(doc_id, ()):
+            owners = self.owners[content_hash]
+            owners.discard(doc_id)
+            if not owners:
+                del self.owners[content_hash]
+        return self.chunks.pop(doc_id, [])
+
+    def renumber(self, positions: Dict[int, int]):
+        """Move chunks to new positions after compaction (old -> new)."""
+        for doc_id, old in self.chunks.items():
+            self.chunks[doc_id] = [positions[p] for p in old]
+
+
+class _Collection:
+    """
+    A named knowledge base backed by its own index shard.
+
+    The shard (snapshot) and the document table used for deduplication
+    and deletion are loaded on first use. unload() swaps in fresh holders:
+    readers that already hold the old snapshot finish on it, the next one
+    reloads from disk.
+    """
+
+    def __init__(self, name: str, documents, fingerprint: str,
+                 index_dir: Optional[str], load_snapshot, load_table):
+        self.name = name
+        self.documents = documents
+        self.fingerprint = fingerprint
+        self.index_dir = index_dir
+        self.uploaded_count = 0
+        # Chunks in the last full save; later uploads are saved incrementally
+        self.saved_chunks = 0
+        # Bumped on every publish; survives unload(), unlike the snapshot
+        self.version = 0
+        self.last_used = time.monotonic()
+        self.ingest_lock = threading.Lock()
+        self.compaction_pending = False
+        self._loaders = (load_snapshot, load_table)
+        self.unload()
+
+    def unload(self):
+        load_snapshot, load_table = self._loaders
+        self.snapshot = _Lazy(functools.partial(load_snapshot, self))
+        self.documents_table = _Lazy(functools.partial(load_table, self))
+
+
+@dataclass(frozen=True)
+class _IndexSnapshot:
+    """
+    One published version of a collection's FAISS store and BM25 index
+    (vector_store is None while the collection has no documents).
+
+    Its chunks are the first ntotal positions of the store. add_documents
+    appends to the same FAISS index and docstore (BM25 is copied, which
+    is cheap) and then swaps in the next snapshot, so an upload costs
+    what it adds rather than a copy of the index. Searches never return
+    positions past ntotal, and hold lock's read side around FAISS calls,
+    which are not safe while an add is running (appends hold its write
+    side, a few milliseconds at a time). Deleted and replaced chunks stay
+    in the indexes as tombstones (deleted positions) that searches skip,
+    until compaction rewrites the indexes without them.
+    """
+    vector_store: Any
+    bm25: _Lazy
+    version: int = 0
+    deleted: FrozenSet[int] = frozenset()
+    ntotal: Optional[int] = None
+    lock: _ReadWriteLock = field(default_factory=_ReadWriteLock, compare=False)
+
+    def __post_init__(self):
+        if self.ntotal is None:
+            object.__setattr__(
+                self, "ntotal", self.vector_store.index.ntotal if self.vector_store else 0)
+
+    @property
+    def live_chunks(self) -> int:
+        return self.ntotal - len(self.deleted)
+
+    @functools.cached_property
+    def _excluded(self):
+        import numpy as np
+
+        return np.fromiter(sorted(self.deleted), dtype=np.int64)
+
+    @functools.cached_property
+    def _selector(self):
+        from rag_retrieval import exclusion_selector
+
+        return exclusion_selector(self._excluded)
+
+    @functools.cached_property
+    def _visible_selector(self):
+        from rag_retrieval import visible_selector
+
+        return visible_selector(self.ntotal, self._excluded)
+
+    def search(self, vectors, k: int):
+        """FAISS search of the live chunks: (distances, positions), -1 padded."""
+        from rag_retrieval import search_params
+
+        index = self.vector_store.index
+        if hasattr(index, "store"):
+            # rag_store.MemmapFlatIndex scans this view only, filtering as it goes
+            return index.search(vectors, k, exclude=self._excluded if self.deleted else None)
+        with self.lock.read():
+            if index.ntotal > self.ntotal:
+                # An upload is appending (or failed after appending)
+                selector = self._visible_selector
+            elif self.deleted:
+                selector = self._selector
+            else:
+                return index.search(vectors, k)
+            return index.search(vectors, k, params=search_params(index, selector))
+
+
+_embedding_models_lock = threading.Lock()
+_embedding_models: Dict[str, Any] = {}
+
+
+def _shared_embedding_model(model_name: str):
+    """HuggingFace embedding model, loaded once per process and model name."""
+    with _embedding_models_lock:
+        model = _embedding_models.get(model_name)
+        if model is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            model = HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={"device": "cpu"},
+            )
+            _embedding_models[model_name] = model
+        return model
+
+
+@functools.lru_cache(maxsize=None)
+def _message_classes():
+    """(HumanMessage, SystemMessage), imported once instead of per node call."""
+    from langchain_core.messages import HumanMessage, SystemMessage
+    return HumanMessage, SystemMessage
+
+
+_loop_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Event loop running in a daemon thread, shared by all AgenticRAG instances."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="agentic-rag-loop", daemon=True
+            ).start()
+        return _loop
+
+
+def _normalize_query(query: str) -> str:
+    """Canonical form used to detect repeated questions ("What is RAG?" == "what is rag")."""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+def _similarity(distance: float) -> float:
+    """Map a FAISS distance to a 0-1 relevance score (1 = exact match)."""
+    return 1.0 / (1.0 + distance)
+
+
+def _confidence(distances: List[float]) -> float:
+    """Confidence in local evidence: the similarity of the nearest chunk."""
+    return _similarity(min(distances))
+
+
+def _keyword_coverage(query: str, docs: List[Dict[str, Any]]) -> float:
+    """Largest share of the query's keywords (BM25 tokens) found in one retrieved chunk."""
+    from rag_retrieval import tokenize
+
+    keywords = set(tokenize(query))
+    if not keywords:
+        return 0.0
+    return max(len(keywords.intersection(tokenize(doc["content"]))) for doc in docs) / len(keywords)
+
+
+def _elapsed_ms(start: float) -> float:
+    """Milliseconds since a time.perf_counter() reading."""
+    return (time.perf_counter() - start) * 1000
+
+
+def _llm_metrics(response, llm_ms: float, hedged: bool = False) -> Dict[str, Any]:
+    """Latency and token usage of one chat model call."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    return {
+        "llm_ms": llm_ms,
+        "prompt_tokens": usage.get("input_tokens", 0),
+        "completion_tokens": usage.get("output_tokens", 0),
+        "hedged": hedged,
+    }
+
+
+def _instrument(name: str, node):
+    """
+    Wrap a graph node so its update carries a metrics record with the node
+    name, start timestamp and wall time, merged with any stage timings the
+    node reported itself.
+    """
+    def record(update, start_ns, start):
+        entry = {"node": name, "start_ns": start_ns, "wall_ms": _elapsed_ms(start)}
+        for extra in update.get("metrics", ()):
+            entry.update(extra)
+        return {**update, "metrics": [entry]}
+
+    if asyncio.iscoroutinefunction(node):
+        async def async_wrapper(state):
+            start_ns, start = time.time_ns(), time.perf_counter()
+            return record(await node(state), start_ns, start)
+        return async_wrapper
+
+    def wrapper(state):
+        start_ns, start = time.time_ns(), time.perf_counter()
+        return record(node(state), start_ns, start)
+    return wrapper
+
+
+def _read_manifest(index_dir: str) -> Optional[Dict[str, Any]]:
+    """Load the manifest of a saved index, or None if there is none."""
+    path = os.path.join(index_dir, INDEX_MANIFEST)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
 # ============================================
 # AgenticRAG Class
 # ============================================
@@ -106,11 +702,49 @@ class AgenticRAG:
 
     def __init__(
         self,
-        groq_api_key: str,
-        tavily_api_key: str,
+        groq_api_key: Optional[str] = None,
+        tavily_api_key: Optional[str] = None,
         google_api_key: Optional[str] = None,
         model_name: str = "llama-3.1-8b-instant",
         embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+        documents: Optional[List[Dict[str, str]]] = None,
+        index_dir: Optional[str] = None,
+        embedding_cache_path: Optional[str] = None,
+        chunk_store: bool = False,
+        graph_mode: str = "sequential",
+        reasoning_mode: str = "blocking",
+        max_concurrency: int = 8,
+        response_cache_size: int = 256,
+        response_cache_ttl: float = 3600.0,
+        semantic_cache_threshold: Optional[float] = 0.95,
+        search_cache_ttl: float = 300.0,
+        search_cache_stale: float = 1800.0,
+        lazy: bool = False,
+        retrieval_k: int = 3,
+        hybrid_search: bool = True,
+        rrf_k: int = 60,
+        confidence_threshold: float = 0.5,
+        keyword_coverage: Optional[float] = 0.6,
+        rerank_model: Optional[str] = None,
+        rerank_candidates: int = 30,
+        rerank_budget_ms: Optional[float] = 150.0,
+        context_token_budget: Optional[int] = 2000,
+        index_spec: Any = None,
+        max_loaded_collections: int = 8,
+        collection_idle_seconds: Optional[float] = 900.0,
+        compact_threshold: Optional[float] = 0.2,
+        latency_budget_ms: Optional[float] = None,
+        llm_timeout_ms: Optional[float] = 30000.0,
+        search_timeout_ms: Optional[float] = 10000.0,
+        hedge_after_ms: Optional[float] = None,
+        breaker_failures: int = 5,
+        breaker_cooldown: float = 30.0,
+        llm: Any = None,
+        search_tool: Any = None,
+        embeddings: Any = None,
+        reranker: Any = None,
+        metrics_registry: Any = None,
+        otel_tracing: bool = False,
     ):
         """
         Initialize the Agentic RAG system.
@@ -121,69 +755,726 @@ class AgenticRAG:
             google_api_key: Optional API key for Google AI
             model_name: Groq model to use
             embedding_model: HuggingFace model for embeddings
+            documents: Knowledge base documents (defaults to SAMPLE_DOCUMENTS)
+            index_dir: Optional directory for an on-disk FAISS index. When set,
+                a saved index is reused if it was built from the same documents
+                and embedding model, and add_documents writes through to it:
+                each upload is saved incrementally, and the index in full in
+                the background once uploads add up (CHECKPOINT_MIN_CHUNKS).
+                Otherwise it is rebuilt, and the uploads saved in it are
+                re-embedded into the new index.
+            embedding_cache_path: SQLite file for the embedding cache. Defaults
+                to an in-memory cache that only lives as long as the process.
+            chunk_store: Keep chunk text, metadata and embeddings in
+                memory-mapped files under index_dir (rag_store) instead of
+                LangChain's in-memory docstore; retrieval reads only the
+                returned chunks. Requires index_dir.
+            graph_mode: "sequential" runs reason → retrieve → (web_search) →
+                synthesize; "parallel" starts reasoning, retrieval and
+                keyword-routed web search together and joins at synthesize.
+            reasoning_mode: "blocking" runs the reasoning LLM call as a
+                graph node, "background" starts it next to the query without
+                waiting for it, "off" skips it (see REASONING_MODES). Its
+                output is informational only: routing and synthesis do not
+                use it.
+            max_concurrency: Maximum in-flight Groq/Tavily calls per event
+                loop for aquery/abatch.
+            response_cache_size: Max cached answers (0 disables the cache)
+            response_cache_ttl: Seconds before a cached answer expires
+                (capped at search_cache_ttl for answers that used web results)
+            semantic_cache_threshold: Cosine similarity at which a cached
+                answer is reused for a differently worded query (None keeps
+                only the exact-match tier)
+            search_cache_ttl: Seconds web search results are reused for the
+                same normalized query (0 disables; identical concurrent
+                searches are still coalesced into one request)
+            search_cache_stale: Further seconds an expired result is still
+                served while it is refreshed in the background
+            lazy: Startup-optimized mode. Clients, the embedding model, the
+                vector store and the graphs are created on first use (or by
+                warmup()) instead of in the constructor.
+            retrieval_k: Number of chunks passed on to synthesis
+            hybrid_search: Fuse BM25 keyword results with vector results
+                (reciprocal rank fusion); False uses FAISS only
+            rrf_k: Reciprocal rank fusion constant
+            confidence_threshold: Vector confidence, 1 / (1 + nearest
+                FAISS distance), at which local documents are enough to
+                answer without web search
+            keyword_coverage: Share of the query's keywords that one
+                retrieved chunk must contain to answer locally even when
+                the vector confidence is lower (exact terms found by BM25,
+                e.g. names and identifiers). None routes on vector
+                confidence only.
+            rerank_model: Cross-encoder (e.g. rag_rerank.DEFAULT_RERANK_MODEL)
+                that reorders retrieved chunks in a rerank node between
+                retrieve and synthesize. Retrieval then over-fetches
+                rerank_candidates chunks and the reranker keeps retrieval_k
+                of them. None disables reranking.
+            rerank_candidates: Chunks retrieved for the reranker to score
+            rerank_budget_ms: Time the reranker may spend scoring per query;
+                candidates it has no time for keep their retrieval order
+            context_token_budget: Estimated tokens (~4 chars each) of
+                retrieved and web context sent to synthesis. Passages are
+                deduplicated and packed best-ranked first; None disables
+                the limit.
+            index_spec: rag_retrieval.IndexSpec choosing the FAISS index
+                (flat by default; IVF-Flat, IVF-PQ or HNSW for large
+                corpora). Build parameters are part of the index
+                fingerprint; nprobe / ef_search can be changed later with
+                tune_index().
+            max_loaded_collections: Collections whose index shard is kept in
+                memory; beyond it the least recently used one is evicted.
+                An evicted shard is unloaded and reloaded from index_dir on
+                next use; without index_dir there is nothing to reload
+                from, so every collection stays loaded.
+            collection_idle_seconds: Also evict shards not searched for this
+                long (None keeps idle shards)
+            compact_threshold: Share of a collection's chunks that may be
+                tombstones (deleted or replaced by upsert_documents) before
+                the collection is compacted in the background (None only
+                compacts on compact())
+            latency_budget_ms: End-to-end budget per query, split across
+                reason / web_search / synthesize by BUDGET_SPLIT and capped
+                by the time left. A node that runs out degrades instead of
+                waiting: reasoning is skipped, synthesis proceeds without
+                web results, or the answer falls back to the top passages.
+                The result's 'fallbacks' lists what fired. None disables.
+            llm_timeout_ms: Timeout for each Groq call (None = wait forever)
+            search_timeout_ms: Timeout for each web search
+            hedge_after_ms: If an LLM call has not answered after this long,
+                send the same request again and use whichever answers first
+                (None disables hedging)
+            breaker_failures: Consecutive failures or timeouts after which
+                calls to that upstream (llm, search) are rejected
+            breaker_cooldown: Seconds before an open circuit lets a trial
+                call through
+            llm: Chat model to use instead of ChatGroq (must support
+                invoke/ainvoke with a list of messages)
+            search_tool: Search tool to use instead of Tavily (invoke/ainvoke
+                with {"query": ...}, returning a list of result dicts)
+            embeddings: LangChain Embeddings to use instead of the HuggingFace
+                model; still cached under the embedding_model name
+            reranker: Cross-encoder to use instead of loading rerank_model
+                (predict(pairs) returning one score per pair); enables the
+                rerank node
+            metrics_registry: rag_metrics.MetricsRegistry that aggregates
+                per-query metrics (a private one is created by default)
+            otel_tracing: Also emit each query as OpenTelemetry spans
+                (requires opentelemetry-api and a configured tracer provider)
         """
-        # Set environment variables
-        os.environ["GROQ_API_KEY"] = groq_api_key
-        os.environ["TAVILY_API_KEY"] = tavily_api_key
+        if chunk_store and not index_dir:
+            raise ValueError("chunk_store requires index_dir")
+        if graph_mode not in GRAPH_MODES:
+            raise ValueError(
+                f"graph_mode must be one of {GRAPH_MODES}, got {graph_mode!r}")
+        if reasoning_mode not in REASONING_MODES:
+            raise ValueError(
+                f"reasoning_mode must be one of {REASONING_MODES}, got {reasoning_mode!r}")
+        self.graph_mode = graph_mode
+        self.reasoning_mode = reasoning_mode
+        self.max_concurrency = max_concurrency
+        self._limiters = weakref.WeakKeyDictionary()
+        self._limiter_lock = threading.Lock()
+
+        # Set environment variables (not needed for injected components)
+        if groq_api_key:
+            os.environ["GROQ_API_KEY"] = groq_api_key
+        if tavily_api_key:
+            os.environ["TAVILY_API_KEY"] = tavily_api_key
         if google_api_key:
             os.environ["GOOGLE_API_KEY"] = google_api_key
 
-        # Import dependencies
+        from rag_cache import EmbeddingCache, ResponseCache, SearchCache
+        from rag_metrics import MetricsRegistry
+        from rag_resilience import CircuitBreaker
+        from rag_retrieval import IndexSpec
+
+        self.model_name = model_name
+        self.embedding_model = embedding_model
+        self.documents = documents if documents is not None else SAMPLE_DOCUMENTS
+        self.index_dir = index_dir
+        self.chunk_store = chunk_store
+        self.retrieval_k = retrieval_k
+        self.hybrid_search = hybrid_search
+        self.rrf_k = rrf_k
+        self.confidence_threshold = confidence_threshold
+        self.keyword_coverage = keyword_coverage
+        self.rerank_model = rerank_model
+        self.rerank_candidates = rerank_candidates
+        self.rerank_budget_ms = rerank_budget_ms
+        self.rerank_enabled = rerank_model is not None or reranker is not None
+        self.context_token_budget = context_token_budget
+        self.index_spec = index_spec or IndexSpec()
+        self.latency_budget_ms = latency_budget_ms
+        self.llm_timeout_ms = llm_timeout_ms
+        self.search_timeout_ms = search_timeout_ms
+        self.hedge_after_ms = hedge_after_ms
+        self.breakers = {
+            name: CircuitBreaker(name, breaker_failures, breaker_cooldown)
+            for name in ("llm", "search")
+        }
+        # Sync upstream calls run here, so a timed-out call can be abandoned
+        self._upstream_pool = ThreadPoolExecutor(
+            max_workers=64, thread_name_prefix="upstream")
+        # Background reasoning waits on an LLM call in _upstream_pool, so it
+        # must not take a slot there itself; plans still queued when their
+        # answer is ready are cancelled
+        self._reasoning_pool = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="reason")
+        self.metrics = metrics_registry or MetricsRegistry()
+        self.otel_tracing = otel_tracing
+
+        # Content-addressed cache in front of the embedding model, so
+        # re-uploaded chunks and recent repeated queries skip the model
+        self.embedding_cache = EmbeddingCache(
+            embedding_cache_path or ":memory:")
+
+        # Answers to repeated questions; cleared whenever the corpus changes
+        self.response_cache = ResponseCache(
+            max_entries=response_cache_size,
+            ttl_seconds=response_cache_ttl,
+            similarity_threshold=semantic_cache_threshold,
+        )
+
+        # Tavily results for popular queries, shared across users
+        self.search_cache = SearchCache(
+            ttl_seconds=search_cache_ttl,
+            stale_seconds=search_cache_stale,
+        )
+
+        self.fingerprint = _corpus_fingerprint(
+            self.documents, embedding_model, self.index_spec.build_params(), chunk_store)
+
+        # Named knowledge bases, each with its own index shard; the
+        # constructor's documents form the default collection
+        self.max_loaded_collections = max_loaded_collections
+        self.collection_idle_seconds = collection_idle_seconds
+        self._collections: Dict[str, _Collection] = {}
+        self._collections_lock = threading.Lock()
+        self._next_eviction = 0.0
+        self._shard_pool = ThreadPoolExecutor(thread_name_prefix="shard")
+        self.compact_threshold = compact_threshold
+        self._compaction_pool = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="compact")
+        self._collections[DEFAULT_COLLECTION] = _Collection(
+            DEFAULT_COLLECTION, self.documents, self.fingerprint, index_dir,
+            self._load_snapshot, self._load_documents_table)
+
+        # Heavy components are built on first use behind thread-safe holders;
+        # injected components replace the default factories
+        self._base_embeddings = embeddings
+        self._base_reranker = reranker
+        self._llm = _Lazy(self._create_llm if llm is None else lambda: llm)
+        self._embeddings = _Lazy(self._create_embeddings)
+        self._search_tool = _Lazy(
+            self._create_search_tool if search_tool is None else lambda: search_tool)
+        self._reranker = _Lazy(
+            self._create_reranker if self.rerank_enabled else lambda: None)
+        self._graph = _Lazy(self._build_graph)
+        self._async_graph = _Lazy(
+            functools.partial(self._build_graph, async_nodes=True))
+
+        if not lazy:
+            self.warmup()
+
+    # --------------------------------------------
+    # Components (created lazily)
+    # --------------------------------------------
+    def _create_llm(self):
         from langchain_groq import ChatGroq
-        from langchain_community.tools.tavily_search import TavilySearchResults
-        from langchain_community.vectorstores import FAISS
-        from langchain_huggingface import HuggingFaceEmbeddings
-        from langchain_text_splitters import RecursiveCharacterTextSplitter
-        from langchain_core.documents import Document
 
-        # Initialize LLM
-        self.llm = ChatGroq(
-            model=model_name,
+        return ChatGroq(
+            model=self.model_name,
             temperature=0.1,
             max_tokens=2048,
         )
 
-        # Initialize embeddings
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=embedding_model,
-            model_kwargs={"device": "cpu"},
+    def _create_embeddings(self):
+        from rag_cache import CachedEmbeddings
+
+        # The default model is shared by every instance in the process
+        base = self._base_embeddings
+        if base is None:
+            base = _shared_embedding_model(self.embedding_model)
+        return CachedEmbeddings(
+            base,
+            model_name=self.embedding_model,
+            cache=self.embedding_cache,
+        )
+
+    def _create_search_tool(self):
+        from langchain_community.tools.tavily_search import TavilySearchResults
+
+        return TavilySearchResults(max_results=3, search_depth="basic")
+
+    def _create_reranker(self):
+        from rag_rerank import CrossEncoderReranker, DEFAULT_RERANK_MODEL
+
+        # The cross-encoder itself is shared by every instance in the process
+        return CrossEncoderReranker(
+            self.rerank_model or DEFAULT_RERANK_MODEL,
+            max_candidates=self.rerank_candidates,
+            time_budget_ms=self.rerank_budget_ms,
+            model=self._base_reranker,
         )
 
-        # Initialize Tavily search
-        self.search_tool = TavilySearchResults(
-            max_results=3, search_depth="basic")
+    @property
+    def llm(self):
+        return self._llm.get()
+
+    @property
+    def embeddings(self):
+        return self._embeddings.get()
+
+    @property
+    def search_tool(self):
+        return self._search_tool.get()
+
+    @property
+    def reranker(self):
+        """rag_rerank.CrossEncoderReranker, or None when reranking is off."""
+        return self._reranker.get()
 
-        # Build vector store from sample documents
+    @property
+    def snapshot(self) -> _IndexSnapshot:
+        """
+        Current index version of the default collection; hold on to it for
+        the duration of a read.
+        """
+        return self._shard(self._collections[DEFAULT_COLLECTION])
+
+    @property
+    def vector_store(self):
+        """FAISS store, loaded from index_dir or built from the documents."""
+        return self.snapshot.vector_store
+
+    @property
+    def bm25(self):
+        """Keyword index over the same chunks, by FAISS position."""
+        return self.snapshot.bm25.get()
+
+    @property
+    def uploaded_count(self) -> int:
+        """Documents uploaded to the default collection."""
+        return self._collections[DEFAULT_COLLECTION].uploaded_count
+
+    @property
+    def graph(self):
+        return self._graph.get()
+
+    @property
+    def async_graph(self):
+        return self._async_graph.get()
+
+    def warmup(self) -> Dict[str, float]:
+        """
+        Load every lazy component now, off the request path.
+
+        Returns:
+            Milliseconds spent loading each component (0 if already loaded)
+        """
+        timings = {}
+        for name, load in [
+            ("llm", self._llm.get),
+            ("embeddings", self._embeddings.get),
+            ("search_tool", self._search_tool.get),
+            ("reranker", lambda: self.reranker is not None and self.reranker.model),
+            ("vector_store", lambda: self.snapshot),
+            ("bm25", lambda: self.bm25),
+            ("graph", self._graph.get),
+            ("async_graph", self._async_graph.get),
+        ]:
+            start = time.perf_counter()
+            load()
+            timings[name] = (time.perf_counter() - start) * 1000
+        return timings
+
+    def _build_index(self, collection: _Collection, skip: Collection[str] = ()):
+        """
+        Split a collection's documents and embed them into FAISS (None for a
+        collection without documents; its store is created on first upload).
+
+        Args:
+            skip: Titles of documents to leave out (deleted or replaced in
+                the index this one replaces)
+        """
+        from langchain_community.vectorstores import FAISS
+        from langchain_core.documents import Document
+
+        documents = [d for d in collection.documents if d["title"] not in skip]
+        if not documents:
+            return None
         docs = [
             Document(page_content=d["content"], metadata={
                      "title": d["title"], "type": d["type"]})
-            for d in SAMPLE_DOCUMENTS
+            for d in documents
         ]
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500, chunk_overlap=50)
-        splits = text_splitter.split_documents(docs)
-        self.vector_store = FAISS.from_documents(splits, self.embeddings)
+        splits = _split_documents(docs)
+        if self.index_spec.kind == "flat" and not self.chunk_store:
+            return FAISS.from_documents(splits, self.embeddings)
+
+        # Approximate indexes are trained on the corpus before it is added
+        texts = [split.page_content for split in splits]
+        return self._new_vector_store(
+            collection, texts, self.embeddings.embed_documents(texts),
+            [split.metadata for split in splits])
+
+    def _new_vector_store(
+        self, collection: _Collection, texts: List[str], vectors, metadatas: List[Dict]
+    ):
+        """
+        Vector store of the configured index_spec (and storage), trained on
+        and holding vectors.
+        """
+        import numpy as np
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        from langchain_community.vectorstores import FAISS
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.chunk_store:
+            from rag_store import DiskVectorStore
+
+            # Exact search scans the mapped matrix; no FAISS copy of it
+            vector_store = DiskVectorStore.create(
+                collection.index_dir, self.embeddings,
+                None if self.index_spec.kind == "flat" else self.index_spec.build(vectors))
+            vector_store.add_embeddings(zip(texts, vectors), metadatas=metadatas)
+            return vector_store
+        vector_store = FAISS(
+            embedding_function=self.embeddings,
+            index=self.index_spec.build(vectors),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+        vector_store.add_embeddings(zip(texts, vectors.tolist()), metadatas=metadatas)
+        return vector_store
+
+    def _load_snapshot(self, collection: _Collection) -> _IndexSnapshot:
+        vector_store = self._load_or_build_index(collection)
+        # A rebuilt index has just been saved with no tombstones
+        manifest = _read_manifest(collection.index_dir) if collection.index_dir else None
+        deleted = frozenset(manifest.get("deleted", ())) if manifest and vector_store else frozenset()
+        return _IndexSnapshot(
+            vector_store,
+            _Lazy(functools.partial(
+                self._load_or_build_bm25, vector_store, collection.index_dir)),
+            collection.version, deleted)
+
+    def _load_or_build_index(self, collection: _Collection):
+        """Reuse the on-disk index when its fingerprint matches, else rebuild."""
+        if not collection.index_dir:
+            return self._build_index(collection)
+
+        from langchain_community.vectorstores import FAISS
+
+        manifest = _read_manifest(collection.index_dir)
+        if manifest and manifest.get("fingerprint") == collection.fingerprint:
+            try:
+                if self.chunk_store:
+                    from rag_store import DiskVectorStore
+
+                    vector_store = DiskVectorStore.load(
+                        collection.index_dir, self.embeddings)
+                else:
+                    # The docstore pickle is written by _save_index only
+                    vector_store = FAISS.load_local(
+                        collection.index_dir, self.embeddings,
+                        allow_dangerous_deserialization=True)
+                    self._replay_updates(collection, vector_store, manifest["num_chunks"])
+                self.index_spec.tune(vector_store.index)
+                collection.uploaded_count = manifest.get("uploaded_documents", 0)
+                collection.saved_chunks = manifest.get("saved_chunks", manifest["num_chunks"])
+                return vector_store
+            except Exception:
+                logger.warning("Saved index in %s unreadable, rebuilding",
+                               collection.index_dir, exc_info=True)
+
+        # Uploads only exist in the saved index: carry them over, re-embedded
+        texts, metadatas, skip = self._saved_uploads(collection, manifest) if manifest else ([], [], ())
+        vector_store = self._build_index(collection, skip)
+        if texts:
+            logger.warning("Index in %s was saved for another configuration; "
+                           "re-embedding its %d uploaded chunks", collection.index_dir, len(texts))
+            vectors = self.embeddings.embed_documents(texts)
+            if vector_store is None:
+                vector_store = self._new_vector_store(collection, texts, vectors, metadatas)
+            else:
+                vector_store.add_embeddings(zip(texts, vectors), metadatas=metadatas)
+            collection.uploaded_count = manifest.get("uploaded_documents", 0)
+        if vector_store is not None:
+            self._save_index(collection, vector_store)
+        return vector_store
+
+    def _saved_uploads(
+        self, collection: _Collection, manifest: Dict[str, Any]
+    ) -> Tuple[List[str], List[Dict], Set[str]]:
+        """
+        Live uploaded chunks (texts, metadatas) of the index saved in a
+        collection's directory, whatever its embedding model or layout,
+        and the titles of constructor documents it had deleted or replaced.
+        Nothing (with a warning) if that index cannot be read.
+        """
+        from langchain_community.vectorstores import FAISS
+        from rag_store import STORE_FILE, ChunkStore
+
+        index_dir = collection.index_dir
+        num_chunks = manifest.get("num_chunks", 0)
+        texts, metadatas, seen, live = [], [], set(), set()
+        try:
+            storage = manifest.get("storage")
+            if storage is None:
+                # Manifests without it: the layout saved last
+                paths = [os.path.join(index_dir, name) for name in ("index.pkl", STORE_FILE)]
+                mtimes = [os.path.getmtime(p) if os.path.exists(p) else -1 for p in paths]
+                storage = "chunk_store" if mtimes[1] > mtimes[0] else "faiss"
+            if storage == "chunk_store":
+                store = ChunkStore.open(index_dir)
+                if store is None:
+                    raise ValueError(f"no chunk store in {index_dir}")
+                chunks = (store.record(i) for i in range(min(num_chunks, len(store))))
+            else:
+                vector_store = FAISS.load_local(
+                    index_dir, self.embeddings, allow_dangerous_deserialization=True)
+                self._replay_updates(collection, vector_store, num_chunks)
+                chunks = _stored_chunks(vector_store, num_chunks)
+            deleted = set(manifest.get("deleted", ()))
+            for position, (text, metadata) in enumerate(chunks):
+                if metadata.get("type") == "user_upload":
+                    if position not in deleted:
+                        texts.append(text)
+                        metadatas.append(metadata)
+                elif metadata:
+                    seen.add(_doc_id(metadata))
+                    if position not in deleted:
+                        live.add(_doc_id(metadata))
+        except Exception:
+            logger.warning("Index in %s unreadable; documents uploaded to it are lost",
+                           index_dir, exc_info=True)
+            return [], [], set()
+        return texts, metadatas, seen - live
+
+    def _replay_updates(self, collection: _Collection, vector_store, num_chunks: int):
+        """Re-add to a loaded FAISS store the uploads logged since its full save."""
+        import numpy as np
+        from rag_store import UpdateLog
+
+        log = UpdateLog(collection.index_dir)
+        for first, texts, metadatas, vectors in log.replay(vector_store.index.ntotal, num_chunks):
+            gap = first - vector_store.index.ntotal
+            if gap > 0:
+                # Appended by an upload that failed; tombstoned in the manifest
+                vector_store.add_embeddings(
+                    zip([""] * gap, np.zeros((gap, vectors.shape[1]), dtype=np.float32).tolist()),
+                    metadatas=[{}] * gap)
+            vector_store.add_embeddings(zip(texts, vectors.tolist()), metadatas=metadatas)
+
+    def _load_or_build_bm25(
+        self, vector_store, index_dir: Optional[str] = None, ntotal: Optional[int] = None
+    ):
+        """
+        Load the saved BM25 index if it matches the vector store's first
+        ntotal chunks (all by default), else rebuild it. A saved index
+        that is shorter, from the last full save, catches up on the chunks
+        uploaded since.
+        """
+        from rag_retrieval import BM25Index
+
+        if vector_store is None:
+            return BM25Index()
+        if ntotal is None:
+            ntotal = vector_store.index.ntotal
+        path = os.path.join(index_dir, BM25_FILE) if index_dir else None
+
+        if path and os.path.exists(path):
+            try:
+                bm25 = BM25Index.load(path)
+                if len(bm25) <= ntotal:
+                    bm25.add(text for text, _ in _stored_chunks(vector_store, ntotal, len(bm25)))
+                    return bm25
+            except Exception:
+                logger.warning("Saved BM25 index %s unreadable, rebuilding",
+                               path, exc_info=True)
+
+        # Positions must line up with FAISS, so index chunks in FAISS order
+        bm25 = BM25Index()
+        bm25.add(text for text, _ in _stored_chunks(vector_store, ntotal))
+        if path:
+            bm25.save(path)
+        return bm25
+
+    def _load_documents_table(self, collection: _Collection) -> _DocumentTable:
+        """Live documents of a collection, read from its chunks' metadata."""
+        from rag_ingest import document_hash
+
+        # Uploads carry their hash in chunk metadata, so it survives save/load
+        base_hashes = {d["title"]: document_hash(d["content"]) for d in collection.documents}
+        table = _DocumentTable()
+        snapshot = collection.snapshot.get()
+        if snapshot.vector_store is None:
+            return table
+        for position, (_, metadata) in enumerate(
+                _stored_chunks(snapshot.vector_store, snapshot.ntotal)):
+            if position not in snapshot.deleted:
+                table.add(_doc_id(metadata),
+                          metadata.get("content_hash") or base_hashes.get(metadata.get("title")),
+                          [position])
+        return table
+
+    def _save_index(
+        self, collection: _Collection, vector_store, bm25=None,
+        deleted: FrozenSet[int] = frozenset(),
+    ):
+        """
+        Write a collection's vector store, BM25 index (if built) and
+        manifest in full, replacing its incremental saves.
+        """
+        from rag_store import UpdateLog
+
+        index_dir = collection.index_dir
+        os.makedirs(index_dir, exist_ok=True)
+        vector_store.save_local(index_dir)
+        bm25_path = os.path.join(index_dir, BM25_FILE)
+        if bm25 is not None:
+            bm25.save(bm25_path)
+        elif os.path.exists(bm25_path):
+            # Describes another layout; it would otherwise be caught up
+            os.remove(bm25_path)
+        collection.saved_chunks = vector_store.index.ntotal
+        self._write_manifest(collection, vector_store, deleted)
+        UpdateLog(index_dir).clear()
+
+    def _save_upload(
+        self, collection: _Collection, vector_store, first_position: int,
+        batches: List[tuple], deleted: FrozenSet[int],
+    ):
+        """
+        Save an upload to a saved store in time proportional to the upload:
+        the chunk store commits its new chunks (its ANN index catches up on
+        load), LangChain's store logs them in its UpdateLog. The BM25 index
+        catches up on load too; see CHECKPOINT_MIN_CHUNKS for full saves.
+
+        Args:
+            batches: (texts, vectors, metadatas) appended from first_position
+                (unused by the chunk store)
+        """
+        from rag_store import UpdateLog
 
-        # Build the agent graph
-        self.graph = self._build_graph()
+        if self.chunk_store:
+            vector_store.save_local(collection.index_dir, index=False)
+            self._write_manifest(collection, vector_store, deleted)
+            return
+        log = UpdateLog(collection.index_dir)
+        size = log.size()
+        log.append(first_position,
+                   [text for texts, _, _ in batches for text in texts],
+                   [metadata for _, _, metadatas in batches for metadata in metadatas],
+                   [vector for _, vectors, _ in batches for vector in vectors])
+        try:
+            self._write_manifest(collection, vector_store, deleted)
+        except Exception:
+            # Unpublished: a load must not replay it
+            log.truncate(size)
+            raise
+
+    def _write_manifest(
+        self, collection: _Collection, vector_store, deleted: FrozenSet[int] = frozenset()
+    ):
+        """
+        Write the manifest describing a saved store; on its own when only the
+        tombstones changed. It goes last, so a partial save never looks valid.
+        """
+        index_dir = collection.index_dir
+        manifest = {
+            "collection": collection.name,
+            "fingerprint": collection.fingerprint,
+            "embedding_model": self.embedding_model,
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "index_spec": self.index_spec.build_params(),
+            "storage": "chunk_store" if self.chunk_store else "faiss",
+            "num_chunks": vector_store.index.ntotal,
+            "saved_chunks": collection.saved_chunks,
+            "deleted": sorted(deleted),
+            "uploaded_documents": collection.uploaded_count,
+            "updated_at": time.time(),
+        }
+        tmp_path = os.path.join(index_dir, INDEX_MANIFEST + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(index_dir, INDEX_MANIFEST))
+
+    def _build_graph(self, async_nodes: bool = False):
+        """
+        Build the LangGraph workflow for the configured graph_mode. The
+        reason node is only part of the graph in blocking reasoning_mode,
+        the rerank node only when reranking is enabled; it follows retrieve
+        and routing to web search happens after it.
 
-    def _build_graph(self):
-        """Build the LangGraph workflow."""
-        from langgraph.graph import StateGraph, END
+        With async_nodes=True the nodes use the async LLM/search clients; that
+        graph must be run with ainvoke.
+        """
+        from langgraph.graph import StateGraph, START, END
+
+        if async_nodes:
+            reason, retrieve, rerank = (
+                self._areason_node, self._aretrieve_node, self._arerank_node)
+            web_search, synthesize = self._aweb_search_node, self._asynthesize_node
+        else:
+            reason, retrieve, rerank = (
+                self._reason_node, self._retrieve_node, self._rerank_node)
+            web_search, synthesize = self._web_search_node, self._synthesize_node
+        reason = _instrument("reason", reason)
+        retrieve = _instrument("retrieve", retrieve)
+        rerank = _instrument("rerank", rerank)
+        web_search = _instrument("web_search", web_search)
+        synthesize = _instrument("synthesize", synthesize)
 
         workflow = StateGraph(AgentState)
+        blocking = self.reasoning_mode == "blocking"
+        # Node whose output the web-search routing looks at
+        retrieved = "rerank" if self.rerank_enabled else "retrieve"
+        if self.rerank_enabled:
+            workflow.add_node("rerank", rerank)
+            workflow.add_edge("retrieve", "rerank")
+
+        if self.graph_mode == "parallel":
+            # Reasoning, retrieval and (keyword-routed) web search start
+            # together; synthesize is deferred until every branch is done.
+            if blocking:
+                workflow.add_node("reason", reason)
+            workflow.add_node("retrieve", retrieve)
+            workflow.add_node("web_search", web_search)
+            workflow.add_node("synthesize", synthesize, defer=True)
+
+            workflow.add_conditional_edges(
+                START, self._fan_out,
+                ["reason", "retrieve", "web_search"] if blocking else ["retrieve", "web_search"])
+            if blocking:
+                workflow.add_edge("reason", "synthesize")
+            workflow.add_conditional_edges(
+                retrieved,
+                self._should_fall_back_to_web,
+                {"web_search": "web_search", "synthesize": "synthesize"}
+            )
+            workflow.add_edge("web_search", "synthesize")
+            workflow.add_edge("synthesize", END)
+            return workflow.compile()
 
         # Add nodes
-        workflow.add_node("reason", self._reason_node)
-        workflow.add_node("retrieve", self._retrieve_node)
-        workflow.add_node("web_search", self._web_search_node)
-        workflow.add_node("synthesize", self._synthesize_node)
+        if blocking:
+            workflow.add_node("reason", reason)
+        workflow.add_node("retrieve", retrieve)
+        workflow.add_node("web_search", web_search)
+        workflow.add_node("synthesize", synthesize)
 
         # Set entry point and edges
-        workflow.set_entry_point("reason")
-        workflow.add_edge("reason", "retrieve")
+        if blocking:
+            workflow.set_entry_point("reason")
+            workflow.add_edge("reason", "retrieve")
+        else:
+            workflow.set_entry_point("retrieve")
         workflow.add_conditional_edges(
-            "retrieve",
+            retrieved,
             self._should_search_web,
             {"web_search": "web_search", "synthesize": "synthesize"}
         )
@@ -192,130 +1483,162 @@ class AgenticRAG:
 
         return workflow.compile()
 
-    def _reason_node(self, state: AgentState) -> AgentState:
-        """Analyze query and plan retrieval strategy."""
-        from langchain_core.messages import HumanMessage, SystemMessage
+    # --------------------------------------------
+    # Node helpers shared by the sync and async nodes
+    # --------------------------------------------
+    def _reasoning_messages(self, state: AgentState) -> list:
+        HumanMessage, SystemMessage = _message_classes()
 
-        messages = [
+        return [
             SystemMessage(content="""You are a reasoning agent analyzing a user query.
             Determine what information is needed and whether current/real-time info is required.
             Respond with a brief reasoning plan (2-3 sentences)."""),
             HumanMessage(content=f"Query: {state['query']}")
         ]
 
-        response = self.llm.invoke(messages)
-
-        # Detect if web search is needed
-        query_lower = state["query"].lower()
-        needs_web = any(term in query_lower for term in [
-            "latest", "recent", "current", "today", "news",
-            "2024", "2025", "now", "this year", "this month"
-        ])
-
-        # Get existing steps or initialize empty list
-        current_steps = list(state.get("steps") or [])
-        current_steps.append(f"🧠 Reasoning: {response.content[:100]}...")
-
+    def _reasoning_update(self, response, llm_ms: float, hedged: bool = False) -> Dict[str, Any]:
+        # Only the keys this node owns; steps are appended by the reducer
         return {
-            "query": state["query"],
             "reasoning": response.content,
-            "retrieved_docs": state.get("retrieved_docs") or [],
-            "web_results": state.get("web_results") or [],
-            "needs_web_search": needs_web,
-            "final_answer": state.get("final_answer") or "",
-            "sources": state.get("sources") or [],
-            "steps": current_steps,
+            "steps": [f"🧠 Reasoning: {response.content[:100]}..."],
+            "metrics": [_llm_metrics(response, llm_ms, hedged)],
         }
 
-    def _retrieve_node(self, state: AgentState) -> AgentState:
-        """Retrieve documents from vector store."""
-        docs = self.vector_store.similarity_search(state["query"], k=3)
+    def _reasoning_fallback(self, e: Exception) -> Dict[str, Any]:
+        # The plan is advisory, so the query carries on without it
+        logger.warning("Reasoning skipped: %s", e)
+        return {
+            "reasoning": "",
+            "steps": [f"⏭️ Reasoning skipped: {str(e)}"],
+            "fallbacks": ["reasoning_skipped"],
+            "metrics": [{"error": type(e).__name__}],
+        }
 
+    def _retrieval_update(
+        self, docs, distances: List[float], timings: Optional[Dict[str, float]] = None,
+        scores: Optional[List[Optional[float]]] = None,
+    ) -> Dict[str, Any]:
         retrieved = [
             {
                 "content": doc.page_content,
                 "title": doc.metadata.get("title", "Document"),
                 "type": doc.metadata.get("type", "knowledge_base"),
+                "score": score,
             }
-            for doc in docs
+            for doc, score in zip(docs, scores or [None] * len(docs))
         ]
 
-        current_steps = list(state.get("steps") or [])
-        current_steps.append(f"📚 Retrieved {len(retrieved)} documents")
-
-        return {
-            "query": state["query"],
-            "reasoning": state.get("reasoning") or "",
+        update = {
             "retrieved_docs": retrieved,
-            "web_results": state.get("web_results") or [],
-            "needs_web_search": state.get("needs_web_search") or False,
-            "final_answer": state.get("final_answer") or "",
-            "sources": state.get("sources") or [],
-            "steps": current_steps,
+            "retrieval_distances": distances,
+            "steps": [self._retrieval_step(retrieved, distances)],
+            "metrics": [dict(timings or {}, documents=len(retrieved))],
         }
+        if not self.rerank_enabled:
+            # With reranking these are candidates; rerank reports the sources
+            update["sources"] = retrieved
+        return update
 
-    def _should_search_web(self, state: AgentState) -> str:
-        """Routing: decide whether to search web."""
-        if state.get("needs_web_search", False):
-            return "web_search"
-        if not state.get("retrieved_docs"):
-            return "web_search"
-        return "synthesize"
+    def _prefetched_update(self, state: AgentState) -> Dict[str, Any]:
+        """Retrieve node update when query_batch already searched for this query."""
+        update = {"steps": [self._retrieval_step(
+            state["retrieved_docs"], state.get("retrieval_distances") or [])]}
+        if not self.rerank_enabled:
+            update["sources"] = state["retrieved_docs"]
+        return update
 
-    def _web_search_node(self, state: AgentState) -> AgentState:
-        """Search the web using Tavily."""
-        current_steps = list(state.get("steps") or [])
+    def _retrieval_k(self) -> int:
+        """Chunks to retrieve: the reranker's candidates when reranking."""
+        if self.rerank_enabled:
+            return max(self.rerank_candidates, self.retrieval_k)
+        return self.retrieval_k
 
-        try:
-            print(f"🔍 Searching web for: {state['query']}")  # Debug
-            results = self.search_tool.invoke({"query": state["query"]})
-            print(f"📥 Got {len(results)} results from Tavily")  # Debug
-
-            web_results = [
-                {
-                    "content": r.get("content", ""),
-                    "title": r.get("title", "Web Result"),
-                    "url": r.get("url", ""),
-                    "type": "web_search",
-                }
-                for r in results
-            ]
-            current_steps.append(f"🌐 Web search: {len(web_results)} results")
-        except Exception as e:
-            print(f"❌ Web search failed: {e}")  # Debug
-            web_results = []
-            current_steps.append(f"⚠️ Web search error: {str(e)}")
+    def _retrieval_step(self, retrieved, distances: List[float]) -> str:
+        step = f"📚 Retrieved {len(retrieved)} documents"
+        if distances:
+            step += f" (confidence {_confidence(distances):.2f})"
+        return step
 
-        return {
-            "query": state["query"],
-            "reasoning": state.get("reasoning") or "",
-            "retrieved_docs": state.get("retrieved_docs") or [],
+    def _search_key(self, query: str) -> str:
+        """Search cache key: normalized query plus the tool's search parameters."""
+        tool = self.search_tool
+        return json.dumps([
+            _normalize_query(query),
+            type(tool).__name__,
+            getattr(tool, "max_results", None),
+            getattr(tool, "search_depth", None),
+        ])
+
+    def _web_search_update(
+        self, results, web_search_ms: float, cache_status: str = "miss"
+    ) -> Dict[str, Any]:
+        web_results = [
+            {
+                "content": r.get("content", ""),
+                "title": r.get("title", "Web Result"),
+                "url": r.get("url", ""),
+                "type": "web_search",
+                # Tavily's relevance score (0-1), used for context packing
+                "score": r.get("score"),
+            }
+            for r in results
+        ]
+        step = f"🌐 Web search: {len(web_results)} results"
+        if cache_status != "miss":
+            step += f" (cache: {cache_status})"
+        return {
             "web_results": web_results,
-            "needs_web_search": state.get("needs_web_search") or False,
-            "final_answer": state.get("final_answer") or "",
-            "sources": state.get("sources") or [],
-            "steps": current_steps,
+            "sources": web_results,
+            "steps": [step],
+            "metrics": [{
+                "web_search_ms": web_search_ms,
+                "results": len(web_results),
+                "search_cache": cache_status,
+            }],
         }
 
-    def _synthesize_node(self, state: AgentState) -> AgentState:
-        """Synthesize final answer from all sources."""
-        from langchain_core.messages import HumanMessage, SystemMessage
+    def _web_search_error(self, e: Exception) -> Dict[str, Any]:
+        from rag_resilience import CircuitOpenError, UpstreamTimeout
+
+        logger.warning("Web search failed: %s", e)
+        if isinstance(e, UpstreamTimeout):
+            fallback = "web_search_timeout"
+        elif isinstance(e, CircuitOpenError):
+            fallback = "web_search_circuit_open"
+        else:
+            fallback = "web_search_error"
+        return {
+            "web_results": [],
+            "steps": [f"⚠️ Web search error: {str(e)}; answering from local documents"],
+            "fallbacks": [fallback],
+            "metrics": [{"error": type(e).__name__}],
+        }
 
-        # Combine sources
-        all_sources = []
-        context_parts = []
+    def _synthesis_messages(self, state: AgentState):
+        """
+        Build the synthesis prompt from the retrieved and web sources.
 
-        for doc in (state.get("retrieved_docs") or []):
-            all_sources.append(doc)
-            context_parts.append(
-                f"[Knowledge Base - {doc['title']}]\n{doc['content']}")
+        Returns:
+            (messages, passages, packing): the packed passages and the token
+            counts reported by rag_retrieval.pack_context
+        """
+        from rag_retrieval import pack_context
 
-        for result in (state.get("web_results") or []):
-            all_sources.append(result)
-            context_parts.append(
-                f"[Web - {result['title']}]\n{result['content']}")
+        HumanMessage, SystemMessage = _message_classes()
 
-        context = "\n\n".join(context_parts)
+        passages, packing = pack_context(
+            [
+                [{"label": f"Knowledge Base - {doc['title']}", "content": doc["content"],
+                  "score": doc.get("score")}
+                 for doc in state.get("retrieved_docs") or ()],
+                [{"label": f"Web - {result['title']}", "content": result["content"],
+                  "score": result.get("score")}
+                 for result in state.get("web_results") or ()],
+            ],
+            self.context_token_budget,
+        )
+        context = "\n\n".join(
+            f"[{passage['label']}]\n{passage['content']}" for passage in passages)
 
         messages = [
             SystemMessage(content="""You are a helpful assistant that synthesizes information 
@@ -324,76 +1647,1446 @@ class AgenticRAG:
             HumanMessage(
                 content=f"Context:\n{context}\n\nQuestion: {state['query']}\n\nProvide a well-sourced answer:")
         ]
+        return messages, passages, packing
+
+    def _synthesis_update(
+        self, response, llm_ms: float, packing: Dict[str, int], hedged: bool = False
+    ) -> Dict[str, Any]:
+        # sources were already appended by retrieve / web_search
+        steps = []
+        if packing["tokens_saved"]:
+            steps.append(
+                f"✂️ Packed context: ~{packing['tokens_out']} tokens "
+                f"(saved ~{packing['tokens_saved']})")
+        steps.append("✅ Synthesized answer")
+        return {
+            "final_answer": response.content,
+            "steps": steps,
+            "metrics": [dict(
+                _llm_metrics(response, llm_ms, hedged),
+                context_tokens=packing["tokens_out"],
+                context_tokens_saved=packing["tokens_saved"],
+            )],
+        }
+
+    def _synthesis_fallback(self, e: Exception, passages) -> Dict[str, Any]:
+        """Extractive answer from the best packed passages when the LLM is unavailable."""
+        logger.warning("Synthesis failed, answering extractively: %s", e)
+        if passages:
+            answer = "⚠️ The language model is unavailable, so here are the most relevant passages:"
+            for passage in passages[:3]:
+                content = passage["content"]
+                if len(content) > 400:
+                    content = content[:400].rsplit(" ", 1)[0] + " …"
+                answer += f"\n\n**{passage['label']}**\n{content}"
+        else:
+            answer = "⚠️ The language model is unavailable and no relevant passages were found."
+        return {
+            "final_answer": answer,
+            "steps": [f"⚠️ Synthesis error: {str(e)}; returned the top passages"],
+            "fallbacks": ["synthesis_extractive"],
+            "metrics": [{"error": type(e).__name__}],
+        }
+
+    # --------------------------------------------
+    # Upstream calls (timeouts, hedging, circuit breaking)
+    # --------------------------------------------
+    def _timeout(self, state: AgentState, node: str, call_timeout_ms: Optional[float]):
+        """
+        Seconds a node may wait on its upstream: the call timeout, capped by
+        the node's share of the latency budget and by the time left.
+        """
+        limits = [call_timeout_ms] if call_timeout_ms is not None else []
+        deadline = state.get("deadline")
+        if self.latency_budget_ms is not None and deadline is not None:
+            # Shares of nodes that are not on the critical path are handed on
+            on_path = [n for n in BUDGET_SPLIT
+                       if n != "reason" or self.reasoning_mode == "blocking"]
+            share = BUDGET_SPLIT[node] / sum(BUDGET_SPLIT[n] for n in on_path)
+            limits.append(self.latency_budget_ms * share)
+            limits.append((deadline - time.perf_counter()) * 1000)
+        return max(0.0, min(limits)) / 1000 if limits else None
+
+    def _hedge_after(self, hedge: bool) -> Optional[float]:
+        if not hedge or self.hedge_after_ms is None:
+            return None
+        return self.hedge_after_ms / 1000
+
+    def _call_llm(self, messages, timeout: Optional[float], hedge: bool = True):
+        """llm.invoke with timeout, optional hedging and the llm circuit breaker."""
+        from rag_resilience import call_with_timeout
 
-        response = self.llm.invoke(messages)
+        breaker = self.breakers["llm"]
+        breaker.check()
+        try:
+            response, hedged = call_with_timeout(
+                lambda: self.llm.invoke(messages), timeout,
+                self._upstream_pool, self._hedge_after(hedge))
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return response, hedged
+
+    async def _acall_llm(self, messages, timeout: Optional[float], hedge: bool = True):
+        """Async _call_llm, inside the per-loop concurrency limit."""
+        from rag_resilience import acall_with_timeout
 
-        current_steps = list(state.get("steps") or [])
-        current_steps.append("✅ Synthesized answer")
+        breaker = self.breakers["llm"]
+        breaker.check()
+        try:
+            async with self._upstream_limiter():
+                response, hedged = await acall_with_timeout(
+                    lambda: self.llm.ainvoke(messages), timeout, self._hedge_after(hedge))
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return response, hedged
+
+    # --------------------------------------------
+    # Sync nodes
+    # --------------------------------------------
+    def _reason_node(self, state: AgentState) -> Dict[str, Any]:
+        """Analyze query and plan retrieval strategy."""
+        messages = self._reasoning_messages(state)
+        start = time.perf_counter()
+        try:
+            response, hedged = self._call_llm(
+                messages, self._timeout(state, "reason", self.llm_timeout_ms))
+        except Exception as e:
+            return self._reasoning_fallback(e)
+        return self._reasoning_update(response, _elapsed_ms(start), hedged)
+
+    def _retrieve_node(self, state: AgentState) -> Dict[str, Any]:
+        """Retrieve documents from vector store."""
+        if state.get("retrieved_docs"):
+            # Already fetched by query_batch's batched search
+            return self._prefetched_update(state)
+        timings: Dict[str, float] = {}
+        docs, distances, scores = self._search(
+            [state["query"]], k=self._retrieval_k(), timings=timings,
+            collections=state.get("collections"))[0]
+        return self._retrieval_update(docs, distances, timings, scores)
 
+    def _rerank_node(self, state: AgentState) -> Dict[str, Any]:
+        """Keep the retrieval_k candidates the cross-encoder scores highest."""
+        candidates = state.get("retrieved_docs") or []
+        try:
+            order, stats = self.reranker.rerank(
+                state["query"], [doc["content"] for doc in candidates], self.retrieval_k)
+        except Exception as e:
+            # Retrieval order is a usable ranking on its own
+            logger.warning("Rerank skipped: %s", e)
+            kept = candidates[:self.retrieval_k]
+            return {
+                "retrieved_docs": kept,
+                "sources": kept,
+                "steps": [f"⏭️ Rerank skipped: {str(e)}"],
+                "fallbacks": ["rerank_skipped"],
+                "metrics": [{"error": type(e).__name__}],
+            }
+        kept = [candidates[i] for i in order]
+        step = f"🔀 Reranked {stats['candidates']} candidates, kept {len(kept)}"
+        if stats["scored"] < stats["candidates"]:
+            step += f" ({stats['scored']} scored within the time budget)"
         return {
-            "query": state["query"],
-            "reasoning": state.get("reasoning") or "",
-            "retrieved_docs": state.get("retrieved_docs") or [],
-            "web_results": state.get("web_results") or [],
-            "needs_web_search": state.get("needs_web_search") or False,
-            "final_answer": response.content,
-            "sources": all_sources,
-            "steps": current_steps,
+            "retrieved_docs": kept,
+            "sources": kept,
+            "steps": [step],
+            "metrics": [stats],
         }
 
-    def add_documents(self, texts: List[str], titles: Optional[List[str]] = None):
-        """Add new documents to the knowledge base."""
-        from langchain_text_splitters import RecursiveCharacterTextSplitter
-        from langchain_core.documents import Document
+    def _fan_out(self, state: AgentState) -> List[str]:
+        """Parallel mode entry: start every branch that is already known to be needed."""
+        branches = ["reason", "retrieve"] if self.reasoning_mode == "blocking" else ["retrieve"]
+        if state.get("needs_web_search", False):
+            branches.append("web_search")
+        return branches
+
+    def _should_search_web(self, state: AgentState) -> str:
+        """
+        Routing: decide whether to search web.
+
+        Recency keywords always go to the web. Otherwise the web is only used
+        when local evidence is weak: nothing retrieved, or both the vector
+        confidence is below confidence_threshold and no retrieved chunk
+        contains keyword_coverage of the query's keywords.
+        """
+        if state.get("needs_web_search", False):
+            return "web_search"
+        docs = state.get("retrieved_docs")
+        if not docs:
+            return "web_search"
+
+        distances = state.get("retrieval_distances") or []
+        confidence = _confidence(distances) if distances else 0.0
+        coverage = _keyword_coverage(state["query"], docs)
+        route = (
+            "synthesize"
+            if confidence >= self.confidence_threshold
+            or (self.keyword_coverage is not None and coverage >= self.keyword_coverage)
+            else "web_search"
+        )
+
+        # Evidence distribution, for tuning confidence_threshold / keyword_coverage
+        logger.info(
+            "route=%s confidence=%.3f keyword_coverage=%.2f distances=%s",
+            route, confidence, coverage, [round(d, 3) for d in distances],
+        )
+        return route
+
+    def _should_fall_back_to_web(self, state: AgentState) -> str:
+        """Parallel mode routing: web search is already running if the keywords asked for it."""
+        if state.get("needs_web_search", False):
+            return "synthesize"
+        return self._should_search_web(state)
+
+    def _search_upstream(self, query: Dict[str, str]):
+        """
+        search_tool.invoke through the search circuit breaker, recording
+        the outcome. Only upstream calls are gated; cached results are
+        still served while the circuit is open.
+        """
+        breaker = self.breakers["search"]
+        breaker.check()
+        try:
+            results = self.search_tool.invoke(query)
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return results
+
+    def _refresh_search(self, query: Dict[str, str]):
+        """
+        Background refresh of a stale search result. Bounded by
+        search_timeout_ms, so a hung refresh cannot hold the breaker's
+        half-open trial forever.
+        """
+        from rag_resilience import UpstreamTimeout, call_with_timeout
+
+        timeout = self.search_timeout_ms / 1000 if self.search_timeout_ms is not None else None
+        try:
+            results, _ = call_with_timeout(
+                lambda: self._search_upstream(query), timeout, self._upstream_pool)
+        except UpstreamTimeout:
+            self.breakers["search"].record_failure()
+            raise
+        return results
+
+    def _web_search_node(self, state: AgentState) -> Dict[str, Any]:
+        """Search the web using Tavily."""
+        from rag_resilience import UpstreamTimeout, call_with_timeout
+
+        query = {"query": state["query"]}
+        try:
+            logger.debug("Searching web for: %s", state["query"])
+            start = time.perf_counter()
+            key = self._search_key(state["query"])
+            (results, status), _ = call_with_timeout(
+                lambda: self.search_cache.get(
+                    key, lambda: self._search_upstream(query),
+                    lambda: self._refresh_search(query)),
+                self._timeout(state, "web_search", self.search_timeout_ms),
+                self._upstream_pool)
+        except Exception as e:
+            # Upstream errors were recorded by the call that made them
+            if isinstance(e, UpstreamTimeout):
+                self.breakers["search"].record_failure()
+            return self._web_search_error(e)
+        return self._web_search_update(results, _elapsed_ms(start), status)
+
+    def _synthesize_node(self, state: AgentState) -> Dict[str, Any]:
+        """Synthesize final answer from all sources."""
+        messages, passages, packing = self._synthesis_messages(state)
+        start = time.perf_counter()
+        try:
+            # A hedged duplicate would interleave its tokens into the stream
+            response, hedged = self._call_llm(
+                messages, self._timeout(state, "synthesize", self.llm_timeout_ms),
+                hedge=not state.get("streaming", False))
+        except Exception as e:
+            return self._synthesis_fallback(e, passages)
+        return self._synthesis_update(response, _elapsed_ms(start), packing, hedged)
+
+    # --------------------------------------------
+    # Async nodes (used by aquery)
+    # --------------------------------------------
+    def _upstream_limiter(self) -> asyncio.Semaphore:
+        """Semaphore capping in-flight Groq/Tavily calls on the running loop."""
+        loop = asyncio.get_running_loop()
+        with self._limiter_lock:
+            semaphore = self._limiters.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._limiters[loop] = semaphore
+        return semaphore
+
+    async def _areason_node(self, state: AgentState) -> Dict[str, Any]:
+        """Async variant of _reason_node."""
+        messages = self._reasoning_messages(state)
+        start = time.perf_counter()
+        try:
+            response, hedged = await self._acall_llm(
+                messages, self._timeout(state, "reason", self.llm_timeout_ms))
+        except Exception as e:
+            return self._reasoning_fallback(e)
+        return self._reasoning_update(response, _elapsed_ms(start), hedged)
+
+    async def _aretrieve_node(self, state: AgentState) -> Dict[str, Any]:
+        """Async variant of _retrieve_node (local work, not rate limited)."""
+        if state.get("retrieved_docs"):
+            return self._prefetched_update(state)
+        timings: Dict[str, float] = {}
+        docs, distances, scores = (await asyncio.to_thread(
+            self._search, [state["query"]], k=self._retrieval_k(), timings=timings,
+            collections=state.get("collections")))[0]
+        return self._retrieval_update(docs, distances, timings, scores)
+
+    async def _arerank_node(self, state: AgentState) -> Dict[str, Any]:
+        """Async variant of _rerank_node (CPU-bound, runs in a thread)."""
+        return await asyncio.to_thread(self._rerank_node, state)
+
+    async def _aweb_search_node(self, state: AgentState) -> Dict[str, Any]:
+        """Async variant of _web_search_node."""
+        from rag_resilience import UpstreamTimeout, acall_with_timeout
+
+        query = {"query": state["query"]}
+        breaker = self.breakers["search"]
+
+        async def search():
+            breaker.check()
+            try:
+                async with self._upstream_limiter():
+                    results = await self.search_tool.ainvoke(query)
+            except Exception:
+                # Not on cancellation: a timeout is recorded below
+                breaker.record_failure()
+                raise
+            breaker.record_success()
+            return results
+
+        try:
+            start = time.perf_counter()
+            key = self._search_key(state["query"])
+            (results, status), _ = await acall_with_timeout(
+                lambda: self.search_cache.aget(
+                    key, search, lambda: self._refresh_search(query)),
+                self._timeout(state, "web_search", self.search_timeout_ms))
+        except Exception as e:
+            if isinstance(e, UpstreamTimeout):
+                breaker.record_failure()
+            return self._web_search_error(e)
+        return self._web_search_update(results, _elapsed_ms(start), status)
+
+    async def _asynthesize_node(self, state: AgentState) -> Dict[str, Any]:
+        """Async variant of _synthesize_node."""
+        messages, passages, packing = self._synthesis_messages(state)
+        start = time.perf_counter()
+        try:
+            response, hedged = await self._acall_llm(
+                messages, self._timeout(state, "synthesize", self.llm_timeout_ms))
+        except Exception as e:
+            return self._synthesis_fallback(e, passages)
+        return self._synthesis_update(response, _elapsed_ms(start), packing, hedged)
+
+    # --------------------------------------------
+    # Collections (one index shard each)
+    # --------------------------------------------
+    def _collection_dir(self, name: str) -> Optional[str]:
+        if not self.index_dir:
+            return None
+        if name == DEFAULT_COLLECTION:
+            return self.index_dir
+        return os.path.join(self.index_dir, COLLECTIONS_DIR, *name.split("/"))
+
+    def _collection(self, name: str, create: bool = False) -> _Collection:
+        """Look a collection up by name; unknown names raise KeyError unless create."""
+        with self._collections_lock:
+            collection = self._collections.get(name)
+            if collection is not None:
+                return collection
+            if not _COLLECTION_NAME.fullmatch(name):
+                raise ValueError(
+                    f"Invalid collection name {name!r}: use letters, digits, '_', "
+                    "'-' and '.', optionally as 'namespace/name'")
+            index_dir = self._collection_dir(name)
+            if not create and not (index_dir and _read_manifest(index_dir)):
+                raise KeyError(f"Unknown collection: {name!r}")
+            # Collections other than the default one only hold uploads
+            collection = _Collection(
+                name, [],
+                _corpus_fingerprint(
+                    [], self.embedding_model, self.index_spec.build_params(), self.chunk_store),
+                index_dir, self._load_snapshot, self._load_documents_table)
+            self._collections[name] = collection
+            return collection
+
+    def create_collection(self, name: str):
+        """
+        Create an empty collection ("name" or "namespace/name") if it does
+        not exist yet. It is saved under index_dir once it has documents.
+        """
+        self._collection(name, create=True)
+
+    def collections(self, namespace: Optional[str] = None) -> List[str]:
+        """Names of the known and saved collections, optionally of one namespace."""
+        with self._collections_lock:
+            names = set(self._collections)
+        root = os.path.join(self.index_dir, COLLECTIONS_DIR) if self.index_dir else None
+        if root and os.path.isdir(root):
+            for dirpath, _, filenames in os.walk(root):
+                if INDEX_MANIFEST in filenames:
+                    names.add(os.path.relpath(dirpath, root).replace(os.sep, "/"))
+        if namespace is not None:
+            names = {n for n in names if n.startswith(namespace.rstrip("/") + "/")}
+        return sorted(names)
+
+    def _resolve_collections(self, targets=None) -> List[_Collection]:
+        """
+        Collections a query searches: None means the default collection; a
+        name or list of names, where "namespace/" stands for every
+        collection in that namespace.
+        """
+        if targets is None:
+            targets = [DEFAULT_COLLECTION]
+        elif isinstance(targets, str):
+            targets = [targets]
+        names: List[str] = []
+        for target in targets:
+            expanded = self.collections(target) if target.endswith("/") else [target]
+            names.extend(n for n in expanded if n not in names)
+        return [self._collection(name) for name in names]
+
+    def _shard(self, collection: _Collection) -> _IndexSnapshot:
+        """A collection's current snapshot, loading it (and evicting others) as needed."""
+        collection.last_used = time.monotonic()
+        was_loaded = collection.snapshot.loaded
+        snapshot = collection.snapshot.get()
+        if not was_loaded or collection.last_used >= self._next_eviction:
+            self._next_eviction = collection.last_used + 10.0
+            self._evict(keep=collection)
+        return snapshot
+
+    def _evict(self, keep: Optional[_Collection] = None) -> List[str]:
+        """
+        Unload least recently used shards beyond max_loaded_collections and
+        shards idle for collection_idle_seconds; shards being written are
+        skipped. Only shards saved under index_dir (every published one is)
+        can be reloaded, so only they are unloaded or counted towards the
+        limit: without index_dir nothing is evicted.
+        """
+        if not self.index_dir:
+            return []
+        now = time.monotonic()
+        with self._collections_lock:
+            loaded = sorted(
+                (c for c in self._collections.values()
+                 if c.snapshot.loaded and c is not keep and c.index_dir),
+                key=lambda c: c.last_used)
+        excess = len(loaded) + (keep is not None) - self.max_loaded_collections
+        evicted = []
+        for collection in loaded:
+            idle = (self.collection_idle_seconds is not None
+                    and now - collection.last_used > self.collection_idle_seconds)
+            if excess <= 0 and not idle:
+                continue
+            if not collection.ingest_lock.acquire(blocking=False):
+                continue
+            try:
+                collection.unload()
+            finally:
+                collection.ingest_lock.release()
+            excess -= 1
+            evicted.append(collection.name)
+        if evicted:
+            logger.info("Unloaded collection shards: %s", evicted)
+        return evicted
+
+    def evict_idle(self) -> List[str]:
+        """Evict idle and surplus shards now; returns the collections evicted."""
+        return self._evict()
+
+    def collection_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per known collection: whether its shard is loaded, live and deleted
+        (not yet compacted) chunks, uploads, idle time.
+        """
+        now = time.monotonic()
+        with self._collections_lock:
+            collections = list(self._collections.values())
+        stats = {}
+        for collection in collections:
+            loaded = collection.snapshot.loaded
+            snapshot = collection.snapshot.get() if loaded else None
+            stats[collection.name] = {
+                "loaded": loaded,
+                "chunks": snapshot.live_chunks if loaded else None,
+                "deleted_chunks": len(snapshot.deleted) if loaded else None,
+                "uploaded_documents": collection.uploaded_count,
+                "idle_s": now - collection.last_used,
+            }
+        return stats
+
+    def add_documents(
+        self,
+        texts: List[str],
+        titles: Optional[List[str]] = None,
+        batch_size: int = 64,
+        workers: Optional[int] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        collection: str = DEFAULT_COLLECTION,
+        doc_ids: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Add new documents to a collection's knowledge base.
+
+        Documents whose content was already ingested into the collection are
+        skipped. New ones are split (in a process pool for large uploads),
+        embedded batch_size chunks at a time and appended to the FAISS index
+        (in place) and to a copy of the BM25 index, published as the next
+        snapshot at the end. Queries keep reading the previous snapshot's
+        chunks until then; writers to the same collection are serialized.
+
+        Args:
+            texts: Document contents
+            titles: Display titles (default "Document 1", "Document 2", ...)
+            batch_size: Chunks per embedding call and FAISS append
+            workers: Splitting processes (defaults to the CPU count)
+            progress: Called after each batch with chunks_done, chunks_total,
+                elapsed_s and chunks_per_sec
+            collection: Target collection, created if it does not exist. The
+                first upload to an empty collection builds its index, trained
+                on all of that upload's chunks.
+            doc_ids: Ids that delete_documents / upsert_documents address
+                the documents by (default: their titles)
+
+        Returns:
+            Dict with documents (added), duplicates (skipped), chunks,
+            elapsed_s and chunks_per_sec
+        """
+        return self._ingest(
+            texts, titles, doc_ids, False, batch_size, workers, progress, collection)
+
+    def upsert_documents(
+        self,
+        texts: List[str],
+        titles: Optional[List[str]] = None,
+        doc_ids: Optional[List[str]] = None,
+        batch_size: int = 64,
+        workers: Optional[int] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        collection: str = DEFAULT_COLLECTION,
+    ) -> Dict[str, Any]:
+        """
+        Add documents, replacing the collection's earlier version of each id.
+
+        Only changed documents are split and embedded: ones whose id
+        already holds this content are skipped like duplicates (content
+        equal to another document's is not a duplicate here; it still
+        replaces this id's old version). A changed document's old chunks are
+        tombstoned in the same snapshot that adds its new ones, so queries
+        see one version or the other, never both or neither. Arguments are
+        as for add_documents; doc_ids default to the titles.
+
+        Returns:
+            add_documents' stats plus replaced (documents whose old
+            version was removed)
+        """
+        return self._ingest(
+            texts, titles, doc_ids, True, batch_size, workers, progress, collection)
+
+    def _ingest(
+        self, texts, titles, doc_ids, replace: bool, batch_size: int,
+        workers: Optional[int], progress, collection: str,
+    ) -> Dict[str, Any]:
+        """add_documents (replace=False) and upsert_documents (replace=True)."""
+        from rag_ingest import batched, document_hash, split_parallel
 
         if titles is None:
             titles = [f"Document {i+1}" for i in range(len(texts))]
+        if doc_ids is None:
+            doc_ids = titles
 
-        docs = [
-            Document(page_content=text, metadata={
-                     "title": title, "type": "user_upload"})
-            for text, title in zip(texts, titles)
+        start = time.perf_counter()
+        target = self._collection(collection, create=True)
+        with target.ingest_lock:
+            current = self._shard(target)
+            table = target.documents_table.get()
+            items, seen, replaced = [], set(), []
+            for text, title, doc_id in zip(texts, titles, doc_ids):
+                content_hash = document_hash(text)
+                owners = table.owners.get(content_hash, ())
+                # Adds skip content any document holds; upserts only content
+                # the same document holds (unchanged), so a document edited
+                # to match another one still replaces its old version
+                key = (doc_id, content_hash) if replace else content_hash
+                if (doc_id in owners if replace else owners) or key in seen:
+                    continue
+                seen.add(key)
+                if replace and doc_id in table.chunks and doc_id not in replaced:
+                    replaced.append(doc_id)
+                items.append((text, {
+                    "title": title, "type": "user_upload",
+                    "content_hash": content_hash, "doc_id": doc_id}))
+            deleted = current.deleted.union(*(table.chunks[d] for d in replaced))
+
+            chunks = split_parallel(items, CHUNK_SIZE, CHUNK_OVERLAP, workers)
+            vector_store, lock = current.vector_store, current.lock
+            # Appended by an upload that failed before publishing
+            orphans = range(current.ntotal, vector_store.index.ntotal if vector_store else 0)
+            first_position = current.ntotal + len(orphans)
+            if chunks and vector_store is not None:
+                vector_store = _appendable_store(vector_store)
+                deleted = deleted.union(orphans)
+            # Unbuilt BM25 is built later from the new docstore, uploads included
+            bm25 = current.bm25.get().copy() if current.bm25.loaded and chunks else None
+            if bm25 is not None and orphans:
+                bm25.add([""] * len(orphans))
+            # Empty collection: vectors are held until the index is trained on them
+            pending = [] if chunks and vector_store is None else None
+            # Saved as a whole once done, unless the whole store is (pending)
+            appended = [] if target.index_dir and pending is None else None
+
+            done, slice_size = 0, 1
+            for batch in batched(chunks, batch_size):
+                batch_texts = [text for text, _ in batch]
+                vectors = self.embeddings.embed_documents(batch_texts)
+                batch_metadatas = [metadata for _, metadata in batch]
+                if pending is not None:
+                    pending.extend(zip(batch_texts, vectors, batch_metadatas))
+                else:
+                    slice_size = _append_chunks(
+                        lock, vector_store, batch_texts, vectors, batch_metadatas, slice_size)
+                    if appended is not None and not self.chunk_store:
+                        appended.append((batch_texts, vectors, batch_metadatas))
+                if bm25 is not None:
+                    bm25.add(batch_texts)
+
+                done += len(batch)
+                if progress is not None:
+                    elapsed = time.perf_counter() - start
+                    progress({
+                        "chunks_done": done,
+                        "chunks_total": len(chunks),
+                        "elapsed_s": elapsed,
+                        "chunks_per_sec": done / elapsed if elapsed else 0.0,
+                    })
+
+            if pending:
+                pending_texts, pending_vectors, pending_metadatas = zip(*pending)
+                vector_store = self._new_vector_store(
+                    target, list(pending_texts), list(pending_vectors), list(pending_metadatas))
+                lock = _ReadWriteLock()
+
+            if chunks:
+                # Save before publishing, so a failed save changes nothing
+                # that queries can see; write-through survives a restart
+                target.uploaded_count += len(items)
+                if appended is not None:
+                    self._save_upload(target, vector_store, first_position, appended, deleted)
+                elif target.index_dir:
+                    self._save_index(target, vector_store, bm25, deleted)
+                ntotal = vector_store.index.ntotal
+                bm25_holder = _Lazy(functools.partial(
+                    self._load_or_build_bm25, vector_store, target.index_dir, ntotal))
+                if bm25 is not None:
+                    bm25_holder.set(bm25)
+                self._publish(target, vector_store, bm25_holder, deleted, ntotal, lock)
+            elif replaced:
+                # Replaced by documents without any text: a plain delete
+                self._publish(target, vector_store, current.bm25, deleted,
+                              current.ntotal, lock)
+            # Only once published, so a failed upload can be retried
+            for doc_id in replaced:
+                table.remove(doc_id)
+            for position, (_, metadata) in enumerate(chunks, start=first_position):
+                table.add(metadata["doc_id"], metadata["content_hash"], [position])
+            self._schedule_compaction(target)
+
+        elapsed = time.perf_counter() - start
+        stats = {
+            "collection": collection,
+            "documents": len(items),
+            "duplicates": len(texts) - len(items),
+            "chunks": len(chunks),
+            "elapsed_s": elapsed,
+            "chunks_per_sec": len(chunks) / elapsed if elapsed else 0.0,
+        }
+        if replace:
+            stats["replaced"] = len(replaced)
+        logger.info(
+            "Ingested %d documents (%d duplicates) as %d chunks in %.2fs "
+            "(%.0f chunks/s)", stats["documents"], stats["duplicates"],
+            stats["chunks"], elapsed, stats["chunks_per_sec"])
+        return stats
+
+    def delete_documents(self, doc_ids, collection: str = DEFAULT_COLLECTION) -> Dict[str, Any]:
+        """
+        Remove documents from a collection by id (the doc_id they were added
+        with, else their title).
+
+        Their chunks are tombstoned in a new snapshot: searches skip them
+        from then on and their content can be added again. Nothing is
+        re-embedded or rewritten beyond the manifest; compaction reclaims
+        the space later.
+
+        Returns:
+            Dict with collection, documents (deleted), chunks (tombstoned)
+            and missing (ids not in the collection)
+        """
+        if isinstance(doc_ids, str):
+            doc_ids = [doc_ids]
+        target = self._collection(collection)
+        with target.ingest_lock:
+            current = self._shard(target)
+            table = target.documents_table.get()
+            found = [doc_id for doc_id in dict.fromkeys(doc_ids) if doc_id in table.chunks]
+            positions = [p for doc_id in found for p in table.chunks[doc_id]]
+            if positions:
+                deleted = current.deleted.union(positions)
+                if target.index_dir:
+                    self._write_manifest(target, current.vector_store, deleted)
+                self._publish(target, current.vector_store, current.bm25, deleted,
+                              current.ntotal, current.lock)
+            for doc_id in found:
+                table.remove(doc_id)
+            self._schedule_compaction(target)
+
+        logger.info("Deleted %d documents (%d chunks) from %r",
+                    len(found), len(positions), collection)
+        return {
+            "collection": collection,
+            "documents": len(found),
+            "chunks": len(positions),
+            "missing": len(set(doc_ids)) - len(found),
+        }
+
+    def _publish(self, target: _Collection, vector_store, bm25: _Lazy,
+                 deleted: FrozenSet[int], ntotal: int, lock: _ReadWriteLock):
+        """Swap in a collection's next snapshot after its content changed."""
+        target.version += 1
+        target.snapshot.set(_IndexSnapshot(
+            vector_store, bm25, target.version, deleted, ntotal, lock))
+        # Cached answers may cite removed documents or miss new ones
+        self.response_cache.clear()
+
+    def _schedule_compaction(self, target: _Collection):
+        """
+        Queue a background compaction once tombstones pass compact_threshold,
+        once the corpus has outgrown the training of an IVF index, or once
+        enough uploads were saved incrementally for a full save.
+        """
+        if target.compaction_pending:
+            return
+        snapshot = target.snapshot.get()
+        if snapshot.vector_store is None:
+            return
+        compact = (self.compact_threshold is not None and snapshot.deleted
+                   and len(snapshot.deleted) >= self.compact_threshold * snapshot.ntotal)
+        if not (compact or self._degraded(target, snapshot)
+                or self._checkpoint_due(target, snapshot)):
+            return
+        target.compaction_pending = True
+        self._compaction_pool.submit(self._compact_in_background, target)
+
+    def _compact_in_background(self, target: _Collection):
+        try:
+            self._compact(target)
+        except Exception:
+            logger.exception("Compacting collection %r failed", target.name)
+        finally:
+            target.compaction_pending = False
+
+    def compact(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, Any]:
+        """
+        Rewrite a collection's indexes without its deleted chunks.
+
+        Runs by itself in the background once compact_threshold is passed.
+        Vectors are copied, not re-embedded, and the FAISS index keeps its
+        training, unless the collection has grown too large for it (an IVF
+        index trained on a small corpus has few cells, and ivf-pq falls back
+        to ivf-flat): then it is retrained as index_spec on the remaining
+        vectors, which also runs by itself once uploads make it due. BM25
+        is rebuilt from the remaining chunks. With index_dir, the result is
+        saved in full; with nothing to drop or retrain, a collection whose
+        uploads were saved incrementally since its last full save is saved
+        in full as it stands (by itself once CHECKPOINT_MIN_CHUNKS says so).
+        Uploads to the collection wait while it runs; queries do not.
+
+        Returns:
+            Dict with collection, chunks (remaining), reclaimed (chunks
+            dropped), retrained (whether the FAISS index was) and elapsed_s
+        """
+        return self._compact(self._collection(collection))
+
+    def _compact(self, target: _Collection) -> Dict[str, Any]:
+        from rag_retrieval import BM25Index
+
+        start = time.perf_counter()
+        with target.ingest_lock:
+            current = self._shard(target)
+            deleted = current.deleted
+            keep = []
+            if current.vector_store is not None:
+                # Past ntotal: appended by a failed upload, never published
+                keep = [p for p in range(current.ntotal) if p not in deleted]
+            retrain = current.vector_store is not None and bool(
+                self.index_spec.degraded(current.vector_store.index, len(keep)))
+            if deleted or retrain:
+                vector_store = _compact_vector_store(
+                    current.vector_store, keep, self.index_spec if retrain else None)
+                # A BM25 file must never be mistaken for the new layout
+                bm25 = BM25Index()
+                bm25.add(text for text, _ in _stored_chunks(vector_store))
+                if target.index_dir:
+                    self._save_index(target, vector_store, bm25)
+                bm25_holder = _Lazy(functools.partial(
+                    self._load_or_build_bm25, vector_store, target.index_dir))
+                bm25_holder.set(bm25)
+                # Same content as before: version and cached answers stay valid
+                target.snapshot.set(_IndexSnapshot(vector_store, bm25_holder, target.version))
+                if target.documents_table.loaded:
+                    target.documents_table.get().renumber(
+                        {old: new for new, old in enumerate(keep)})
+            elif (target.index_dir and current.ntotal > target.saved_chunks
+                    # Vectors of a failed upload are only dropped by the next one
+                    and current.vector_store.index.ntotal == current.ntotal):
+                self._save_index(target, current.vector_store, current.bm25.get(), deleted)
+                logger.info("Saved %r in full (%d chunks) in %.2fs", target.name,
+                            current.ntotal, time.perf_counter() - start)
+
+        elapsed = time.perf_counter() - start
+        if deleted or retrain:
+            logger.info("Compacted %r: %d chunks kept, %d reclaimed%s in %.2fs",
+                        target.name, len(keep), len(deleted),
+                        ", index retrained" if retrain else "", elapsed)
+        return {
+            "collection": target.name,
+            "chunks": len(keep),
+            "reclaimed": len(deleted),
+            "retrained": retrain,
+            "elapsed_s": elapsed,
+        }
+
+    def _checkpoint_due(self, target: _Collection, snapshot: _IndexSnapshot) -> bool:
+        """Whether a shard's incrementally saved uploads call for a full save."""
+        unsaved = snapshot.ntotal - target.saved_chunks
+        return bool(target.index_dir) and unsaved >= max(target.saved_chunks, CHECKPOINT_MIN_CHUNKS)
+
+    def _degraded(self, target: _Collection, snapshot: _IndexSnapshot) -> bool:
+        """Whether a shard's IVF index is too coarse for its live chunks (logged)."""
+        reason = self.index_spec.degraded(snapshot.vector_store.index, snapshot.live_chunks)
+        if reason:
+            logger.warning("Index of %r has degraded (%s); retraining it", target.name, reason)
+        return bool(reason)
+
+    def tune_index(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """
+        Change the recall/latency trade-off of IVF (nprobe) or HNSW
+        (ef_search) indexes: loaded shards are tuned in place, and shards
+        loaded or published later use the new setting too.
+        """
+        import dataclasses
+
+        changes = {"nprobe": nprobe, "ef_search": ef_search}
+        self.index_spec = dataclasses.replace(
+            self.index_spec, **{k: v for k, v in changes.items() if v is not None})
+        with self._collections_lock:
+            collections = list(self._collections.values())
+        for collection in collections:
+            if collection.snapshot.loaded:
+                vector_store = collection.snapshot.get().vector_store
+                if vector_store is not None:
+                    self.index_spec.tune(vector_store.index)
+
+    def _chunk(self, position: int, vector_store=None):
+        """Document stored at a FAISS index position (of the current snapshot by default)."""
+        if vector_store is None:
+            vector_store = self.vector_store
+        if hasattr(vector_store, "document"):
+            # Chunk store: reads just this record
+            return vector_store.document(position)
+        doc_id = vector_store.index_to_docstore_id[position]
+        return vector_store.docstore.search(doc_id)
+
+    def _embed_queries(self, queries: List[str], timings: Dict[str, float]):
+        """All queries' embeddings from one model call, as a float32 matrix."""
+        import numpy as np
+
+        start = time.perf_counter()
+        vectors = np.asarray(
+            self.embeddings.embed_documents(queries), dtype=np.float32)
+        timings["embedding_ms"] = _elapsed_ms(start)
+        return vectors
+
+    def _vector_search(
+        self, queries: List[str], k: int, timings: Optional[Dict[str, float]] = None,
+        snapshot: Optional[_IndexSnapshot] = None, vectors=None,
+    ) -> List[List[tuple]]:
+        """
+        Embed all queries in one model call (unless vectors are given) and
+        search FAISS once, skipping deleted chunks.
+
+        Returns:
+            Per query, (position, distance) pairs, nearest first
+        """
+        timings = {} if timings is None else timings
+        if vectors is None:
+            vectors = self._embed_queries(queries, timings)
+
+        if snapshot is None:
+            snapshot = self.snapshot
+        if snapshot.vector_store._normalize_L2:
+            import faiss
+            vectors = vectors.copy()
+            faiss.normalize_L2(vectors)
+
+        start = time.perf_counter()
+        distances, indices = snapshot.search(vectors, k)
+        timings["faiss_ms"] = _elapsed_ms(start)
+        return [
+            # -1 marks missing hits when the index holds fewer than k vectors
+            [(int(i), float(d)) for i, d in zip(row_i, row_d) if i != -1]
+            for row_i, row_d in zip(indices, distances)
         ]
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500, chunk_overlap=50)
-        splits = text_splitter.split_documents(docs)
-        self.vector_store.add_documents(splits)
+    def _shard_hits(self, collection: _Collection, queries: List[str], vectors, k: int):
+        """
+        Vector and (with hybrid_search) BM25 hits in one collection's shard.
 
-    def query(self, question: str) -> Dict[str, Any]:
+        Returns:
+            (snapshot, per-query vector hits, per-query BM25 hits, timings)
         """
-        Execute a query through the agentic RAG pipeline.
+        snapshot = self._shard(collection)
+        timings: Dict[str, float] = {"faiss_ms": 0.0, "bm25_ms": 0.0}
+        if snapshot.vector_store is None:
+            empty = [[] for _ in queries]
+            return snapshot, empty, empty, timings
+        vector_hits = self._vector_search(queries, k, timings, snapshot, vectors)
+        lexical_hits = [[] for _ in queries]
+        if self.hybrid_search:
+            start = time.perf_counter()
+            bm25 = snapshot.bm25.get()
+            lexical_hits = [bm25.search(query, k, snapshot.deleted) for query in queries]
+            timings["bm25_ms"] = _elapsed_ms(start)
+        return snapshot, vector_hits, lexical_hits, timings
+
+    def _search(
+        self, queries: List[str], k: Optional[int] = None,
+        timings: Optional[Dict[str, float]] = None,
+        collections=None,
+    ) -> List[tuple]:
+        """
+        Retrieve the top-k chunks for each query from one or more collections.
+
+        The queries are embedded once; each collection's shard is searched
+        in parallel (FAISS, plus BM25 when hybrid_search is on). Vector hits
+        from all shards are merged by distance and BM25 hits by score, then
+        fused by reciprocal rank fusion. Both retrievers over-fetch so fusion
+        has candidates to choose from. Each shard is read from one snapshot,
+        so positions stay consistent while add_documents publishes a new one.
 
         Args:
-            question: User's question
+            collections: Collection name(s) to search (see
+                _resolve_collections); None searches the default collection
+
+        Returns:
+            Per query, (documents, distances, scores): distances are the
+            FAISS distances of the k nearest chunks, used for routing;
+            scores are each document's vector similarity (see _similarity)
+            for context packing. A keyword-only hit, beyond the vector
+            candidates, gets the similarity of the farthest candidate,
+            which bounds its own. Stage timings (embedding_ms, faiss_ms,
+            bm25_ms; the slowest shard's) go into timings.
+        """
+        k = k or self.retrieval_k
+        fetch_k = k * 4 if self.hybrid_search else k
+        timings = {} if timings is None else timings
+
+        targets = self._resolve_collections(collections)
+        if not targets:
+            # A namespace that has no collections yet holds no documents
+            return [([], [], []) for _ in queries]
+        vectors = self._embed_queries(queries, timings)
+        search = functools.partial(
+            self._shard_hits, queries=queries, vectors=vectors, k=fetch_k)
+        if len(targets) == 1:
+            shards = [search(targets[0])]
+        else:
+            shards = list(self._shard_pool.map(search, targets))
+        timings["faiss_ms"] = max(shard[3]["faiss_ms"] for shard in shards)
+        if self.hybrid_search:
+            timings["bm25_ms"] = max(shard[3]["bm25_ms"] for shard in shards)
+
+        results = []
+        for q in range(len(queries)):
+            # Hits are keyed by (shard, position); rank breaks ties in shard order
+            vector_hits = sorted(
+                (distance, s, rank, position)
+                for s, shard in enumerate(shards)
+                for rank, (position, distance) in enumerate(shard[1][q]))[:fetch_k]
+            ranked = [(s, position) for _, s, _, position in vector_hits]
+            if self.hybrid_search:
+                from rag_retrieval import reciprocal_rank_fusion
+
+                lexical = [
+                    (s, position) for _, s, _, position in sorted(
+                        (-score, s, rank, position)
+                        for s, shard in enumerate(shards)
+                        for rank, (position, score) in enumerate(shard[2][q]))[:fetch_k]]
+                ranked = reciprocal_rank_fusion([ranked, lexical], k=self.rrf_k)
+            docs = [
+                self._chunk(position, shards[s][0].vector_store) for s, position in ranked[:k]]
+            distance_of = {(s, position): distance for distance, s, _, position in vector_hits}
+            farthest = vector_hits[-1][0] if vector_hits else None
+            scores = [
+                None if distance is None else _similarity(distance)
+                for distance in (distance_of.get(hit, farthest) for hit in ranked[:k])]
+            results.append((docs, [hit[0] for hit in vector_hits[:k]], scores))
+        return results
+
+    def query_batch(
+        self, questions: List[str], max_workers: Optional[int] = None,
+        collections=None,
+    ) -> Dict[str, Any]:
+        """
+        Answer many questions, sharing work between them.
+
+        Normalized-identical questions are answered once. All distinct
+        questions are embedded in one forward pass and searched with a single
+        batched FAISS call (plus BM25 when hybrid_search is on); the LLM/web
+        part of the graph then runs in a thread pool of max_workers
+        (defaults to max_concurrency). collections is as for query().
 
         Returns:
-            Dict with 'answer', 'sources', and 'reasoning_steps'
+            Dict with 'results' (one query() result per input question, in
+            order) and 'timing' (aggregate seconds and counts)
         """
-        initial_state: AgentState = {
+        start = time.perf_counter()
+        scope = self._scope(collections)
+
+        # Collapse duplicates, keeping the first spelling as representative
+        groups: Dict[str, str] = {}
+        for q in questions:
+            groups.setdefault(_normalize_query(q), q)
+        unique = list(groups.values())
+
+        t0 = time.perf_counter()
+        retrieved = [
+            self._retrieval_update(docs, distances, scores=scores)
+            for docs, distances, scores in self._search(
+                unique, k=self._retrieval_k(), collections=list(scope))
+        ] if unique else []
+        retrieval_s = time.perf_counter() - t0
+
+        def run(question: str, retrieval: Dict[str, Any]) -> Dict[str, Any]:
+            start_ns, start = time.time_ns(), time.perf_counter()
+            state = self._initial_state(question, scope)
+            state["retrieved_docs"] = retrieval["retrieved_docs"]
+            state["retrieval_distances"] = retrieval["retrieval_distances"]
+            reasoning = self._start_reasoning(question)
+            try:
+                final = self.graph.invoke(state)
+            except Exception as e:
+                return self._record(self._format_error(e), question, start_ns, start,
+                                    error=True)
+            final = self._merge_reasoning(final, reasoning)
+            return self._record(self._format_result(final), question, start_ns, start,
+                                final.get("metrics", ()))
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_concurrency) as pool:
+            answers = list(pool.map(run, unique, retrieved))
+        generation_s = time.perf_counter() - t0
+
+        by_key = {_normalize_query(q): a for q, a in zip(unique, answers)}
+        total_s = time.perf_counter() - start
+        return {
+            "results": [by_key[_normalize_query(q)] for q in questions],
+            "timing": {
+                "questions": len(questions),
+                "unique_questions": len(unique),
+                "retrieval_s": retrieval_s,
+                "generation_s": generation_s,
+                "total_s": total_s,
+                "questions_per_s": len(questions) / total_s if total_s else 0.0,
+            },
+        }
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit rates of the embedding, response and web search caches."""
+        return {
+            "embeddings": self.embedding_cache.stats(),
+            "responses": self.response_cache.stats(),
+            "search": self.search_cache.stats(),
+        }
+
+    def _scope(self, collections=None) -> tuple:
+        """Names of the collections a query searches (raises KeyError for unknown ones)."""
+        return tuple(c.name for c in self._resolve_collections(collections))
+
+    def _initial_state(self, question: str, scope: tuple = (DEFAULT_COLLECTION,)) -> AgentState:
+        # Everything else is filled in by the nodes
+        state: AgentState = {
             "query": question,
-            "reasoning": "",
-            "retrieved_docs": [],
-            "web_results": [],
-            "needs_web_search": False,
-            "final_answer": "",
+            "needs_web_search": _needs_web_search(question),
+            "collections": list(scope),
+        }
+        if self.latency_budget_ms is not None:
+            state["deadline"] = time.perf_counter() + self.latency_budget_ms / 1000
+        return state
+
+    @staticmethod
+    def _format_result(result: AgentState) -> Dict[str, Any]:
+        return {
+            "answer": result.get("final_answer", ""),
+            "sources": result.get("sources", []),
+            "reasoning_steps": result.get("steps", []),
+            "fallbacks": result.get("fallbacks", []),
+        }
+
+    @staticmethod
+    def _format_error(e: Exception) -> Dict[str, Any]:
+        return {
+            "answer": f"Error processing query: {str(e)}",
             "sources": [],
-            "steps": [],
+            "reasoning_steps": [f"❌ Error: {str(e)}"],
+            "fallbacks": [],
+        }
+
+    def _record(
+        self,
+        result: Dict[str, Any],
+        question: str,
+        start_ns: int,
+        start: float,
+        records=(),
+        cache: str = "miss",
+        error: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Attach a 'metrics' dict to a query result and export it.
+
+        metrics holds total_ms, the response-cache outcome, per-node records
+        (wall_ms plus stage timings and token counts) and summed LLM tokens.
+        """
+        nodes = {}
+        for record in records:
+            record = dict(record)
+            nodes[record.pop("node")] = record
+
+        metrics = {
+            "start_ns": start_ns,
+            "total_ms": _elapsed_ms(start),
+            "cache": cache,
+            "error": error,
+            "fallbacks": list(result.get("fallbacks", ())),
+            "nodes": nodes,
+            "llm_tokens": {
+                "prompt": sum(r.get("prompt_tokens", 0) for r in nodes.values()),
+                "completion": sum(r.get("completion_tokens", 0) for r in nodes.values()),
+            },
         }
+        result["metrics"] = metrics
+
+        self.metrics.observe_query(metrics)
+        if self.otel_tracing:
+            from rag_metrics import emit_spans
+            emit_spans(metrics, question)
+        return result
+
+    def upstream_status(self) -> Dict[str, Any]:
+        """Circuit breaker state per upstream (llm, search)."""
+        return {name: breaker.stats() for name, breaker in self.breakers.items()}
+
+    def metrics_text(self) -> str:
+        """Aggregated query metrics in Prometheus text format."""
+        return self.metrics.render_prometheus()
+
+    @staticmethod
+    def _response_key(question: str, scope: tuple) -> str:
+        key = _normalize_query(question)
+        if scope == (DEFAULT_COLLECTION,):
+            return key
+        return json.dumps([list(scope), key])
 
+    def _versions(self, scope: tuple) -> tuple:
+        return tuple(self._collection(name).version for name in scope)
+
+    def _cached_response(self, question: str, scope: tuple = (DEFAULT_COLLECTION,)):
+        """
+        Look the question up in the response cache; answers are only shared
+        between queries over the same collections.
+
+        Returns (result, embedding, tier): result is a marked copy of the
+        cached answer or None; embedding is the query embedding when the
+        semantic tier had to compute it, so the caller can store it on a
+        miss; tier is "exact", "semantic" or "miss". A failed lookup (e.g.
+        the embedding model erroring) is a miss, never a failed query.
+        """
+        if self.response_cache.max_entries <= 0:
+            return None, None, "miss"
         try:
-            result = self.graph.invoke(initial_state)
-            return {
-                "answer": result["final_answer"],
-                "sources": result["sources"],
-                "reasoning_steps": result["steps"],
-            }
+            return self._lookup_response(question, scope)
+        except Exception:
+            logger.warning("Response cache lookup failed; treating it as a miss",
+                           exc_info=True)
+            return None, None, "miss"
+
+    def _lookup_response(self, question: str, scope: tuple):
+        key = self._response_key(question, scope)
+        cached = self.response_cache.get_exact(key)
+        if cached is not None:
+            return self._mark_cached(cached, "♻️ Cache hit: exact match"), None, "exact"
+
+        embedding = None
+        if self.response_cache.similarity_threshold is not None:
+            # Blocking (model or SQLite): async callers use _acached_response
+            embedding = self.embeddings.embed_query(question)
+        hit = (self.response_cache.get_similar(embedding, scope=",".join(scope))
+               if embedding else None)
+        if hit is not None:
+            cached, similarity = hit
+            step = f"♻️ Cache hit: semantic match (similarity {similarity:.2f})"
+            return self._mark_cached(cached, step), embedding, "semantic"
+        return None, embedding, "miss"
+
+    async def _acached_response(self, question: str, scope: tuple = (DEFAULT_COLLECTION,)):
+        """_cached_response without blocking the event loop on the query embedding."""
+        if self.response_cache.similarity_threshold is None:
+            return self._cached_response(question, scope)
+        return await asyncio.to_thread(self._cached_response, question, scope)
+
+    def _store_response(
+        self, question: str, embedding, result: Dict[str, Any], scope: tuple, versions: tuple
+    ):
+        """
+        Cache an answer unless documents were added to its collections while
+        it was computed or it is a degraded (fallback) answer. Answers that
+        used web results are kept no longer than the results themselves
+        (search_cache_ttl).
+        """
+        if self._versions(scope) != versions or result["fallbacks"]:
+            return
+        ttl = None
+        if any(source.get("type") == "web_search" for source in result["sources"]):
+            ttl = self.search_cache.ttl_seconds
+        try:
+            self.response_cache.put(
+                self._response_key(question, scope), embedding, result,
+                scope=",".join(scope), ttl_seconds=ttl)
+        except Exception:
+            # The answer is still returned; it is just not cached
+            logger.warning("Caching the response failed", exc_info=True)
+
+    # --------------------------------------------
+    # Reasoning off the critical path
+    # --------------------------------------------
+    def plan(self, question: str) -> str:
+        """Run the reasoning step on request and return the plan text."""
+        return self._reason_node({"query": question})["reasoning"]
+
+    def _start_reasoning(self, question: str) -> Optional[concurrent.futures.Future]:
+        """Background mode: start the reasoning call without waiting for it."""
+        if self.reasoning_mode != "background":
+            return None
+        # No deadline: it is not allowed to hold up the answer anyway
+        return self._reasoning_pool.submit(
+            _instrument("reason", self._reason_node), {"query": question})
+
+    async def _astart_reasoning(self, question: str) -> Optional[asyncio.Task]:
+        if self.reasoning_mode != "background":
+            return None
+        return asyncio.ensure_future(
+            _instrument("reason", self._areason_node)({"query": question}))
+
+    @staticmethod
+    def _merge_reasoning(final: Dict[str, Any], pending) -> Dict[str, Any]:
+        """
+        Add a background reasoning update to the final state if it finished
+        before the answer; otherwise it is dropped (async: cancelled).
+        """
+        if pending is None:
+            return final
+        if not pending.done():
+            pending.cancel()
+            return final
+        if pending.cancelled() or pending.exception() is not None:
+            return final
+        update = pending.result()
+        if update.get("fallbacks"):
+            # A skipped plan does not degrade the answer
+            return final
+        return {
+            **final,
+            "reasoning": update["reasoning"],
+            "steps": update["steps"] + list(final.get("steps", ())),
+            "metrics": update["metrics"] + list(final.get("metrics", ())),
+        }
+
+    @staticmethod
+    def _mark_cached(cached: Dict[str, Any], step: str) -> Dict[str, Any]:
+        return {**cached, "reasoning_steps": [step, *cached["reasoning_steps"]]}
+
+    def query(self, question: str, collections=None) -> Dict[str, Any]:
+        """
+        Execute a query through the agentic RAG pipeline.
+
+        Args:
+            question: User's question
+            collections: Collection name, or list of names, to retrieve from;
+                "namespace/" selects every collection in a namespace. Their
+                shards are searched in parallel. None uses the default
+                collection.
+
+        Returns:
+            Dict with 'answer', 'sources', 'reasoning_steps', 'fallbacks'
+            (degradations applied, e.g. "web_search_timeout") and 'metrics'
+            (per-node timings, token counts and cache outcome)
+        """
+        start_ns, start = time.time_ns(), time.perf_counter()
+        try:
+            # Unknown or invalid collection names are reported like any error
+            scope = self._scope(collections)
+            cached, embedding, tier = self._cached_response(question, scope)
+            if cached is not None:
+                return self._record(cached, question, start_ns, start, cache=tier)
+
+            versions = self._versions(scope)
+            reasoning = self._start_reasoning(question)
+            final = self.graph.invoke(self._initial_state(question, scope))
         except Exception as e:
-            return {
-                "answer": f"Error processing query: {str(e)}",
-                "sources": [],
-                "reasoning_steps": [f"❌ Error: {str(e)}"],
-            }
+            return self._record(self._format_error(e), question, start_ns, start,
+                                error=True)
+        final = self._merge_reasoning(final, reasoning)
+
+        result = self._record(self._format_result(final), question, start_ns, start,
+                              final.get("metrics", ()))
+        self._store_response(question, embedding, result, scope, versions)
+        return result
+
+    async def aquery(self, question: str, collections=None) -> Dict[str, Any]:
+        """
+        Async version of query().
+
+        Uses the async Groq/Tavily clients, so many questions can be in
+        flight on one event loop; upstream calls are capped by
+        max_concurrency.
+        """
+        start_ns, start = time.time_ns(), time.perf_counter()
+        reasoning = None
+        try:
+            scope = self._scope(collections)
+            cached, embedding, tier = await self._acached_response(question, scope)
+            if cached is not None:
+                return self._record(cached, question, start_ns, start, cache=tier)
+
+            versions = self._versions(scope)
+            reasoning = await self._astart_reasoning(question)
+            final = await self.async_graph.ainvoke(self._initial_state(question, scope))
+        except Exception as e:
+            self._merge_reasoning({}, reasoning)
+            return self._record(self._format_error(e), question, start_ns, start,
+                                error=True)
+        final = self._merge_reasoning(final, reasoning)
+
+        result = self._record(self._format_result(final), question, start_ns, start,
+                              final.get("metrics", ()))
+        self._store_response(question, embedding, result, scope, versions)
+        return result
+
+    def query_stream(self, question: str, collections=None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a query as it runs.
+
+        Yields event dicts:
+        - {"type": "step", "content": str} as each node finishes
+        - {"type": "token", "content": str} for each synthesized answer token
+        - {"type": "done", "result": dict} last, with the same dict query() returns
+        """
+        start_ns, start = time.time_ns(), time.perf_counter()
+        try:
+            scope = self._scope(collections)
+            cached, embedding, tier = self._cached_response(question, scope)
+        except Exception as e:
+            yield from self._error_events(e, question, start_ns, start)
+            return
+        if cached is not None:
+            for step in cached["reasoning_steps"]:
+                yield {"type": "step", "content": step}
+            yield {"type": "token", "content": cached["answer"]}
+            yield {"type": "done", "result": self._record(
+                cached, question, start_ns, start, cache=tier)}
+            return
+
+        final: Dict[str, Any] = {
+            "final_answer": "", "sources": [], "steps": [], "metrics": [], "fallbacks": []}
+        state = self._initial_state(question, scope)
+        state["streaming"] = True
+        streamed = False
+        versions = self._versions(scope)
+        reasoning = self._start_reasoning(question)
+        try:
+            for mode, payload in self.graph.stream(
+                state, stream_mode=["updates", "messages"]
+            ):
+                if mode == "messages":
+                    chunk, metadata = payload
+                    # The reasoning call streams too; only the answer is shown
+                    if metadata.get("langgraph_node") == "synthesize" and chunk.content:
+                        streamed = True
+                        yield {"type": "token", "content": chunk.content}
+                    continue
+
+                for update in payload.values():
+                    if not update:
+                        continue
+                    final["sources"].extend(update.get("sources", ()))
+                    final["metrics"].extend(update.get("metrics", ()))
+                    final["fallbacks"].extend(update.get("fallbacks", ()))
+                    for step in update.get("steps", ()):
+                        final["steps"].append(step)
+                        yield {"type": "step", "content": step}
+                    if "final_answer" in update:
+                        final["final_answer"] = update["final_answer"]
+        except Exception as e:
+            yield from self._error_events(e, question, start_ns, start)
+            return
+
+        final = self._merge_reasoning(final, reasoning)
+        result = self._record(self._format_result(final), question, start_ns, start,
+                              final["metrics"])
+        if not streamed:
+            # LLM client without token streaming: emit the answer in one piece
+            yield {"type": "token", "content": result["answer"]}
+        elif "synthesis_extractive" in result["fallbacks"]:
+            # Synthesis gave up part-way; show what replaced it
+            yield {"type": "token", "content": "\n\n" + result["answer"]}
+        self._store_response(question, embedding, result, scope, versions)
+        yield {"type": "done", "result": result}
+
+    def _error_events(self, e: Exception, question: str, start_ns: int, start: float):
+        """query_stream's closing events for a query that failed."""
+        result = self._record(self._format_error(e), question, start_ns, start, error=True)
+        yield {"type": "token", "content": result["answer"]}
+        yield {"type": "done", "result": result}
+
+    async def abatch(self, questions: List[str], collections=None) -> List[Dict[str, Any]]:
+        """Run several questions concurrently; results are in input order."""
+        return list(await asyncio.gather(
+            *(self.aquery(q, collections) for q in questions)))
+
+    def submit(self, question: str, collections=None) -> concurrent.futures.Future:
+        """
+        Schedule aquery on the process-wide background event loop.
+
+        Lets synchronous callers (e.g. Streamlit sessions on separate
+        threads) share one loop instead of each blocking a thread per call.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self.aquery(question, collections), _background_loop())
 
 
 # ============================================
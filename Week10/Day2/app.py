@@ -7,6 +7,7 @@ All agent logic is imported from agentic_rag.py.
 
 import os
 import json
+import uuid
 import streamlit as st
 from pathlib import Path
 from dotenv import load_dotenv
@@ -22,6 +23,10 @@ TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 LANGCHAIN_API_KEY = os.getenv("LANGCHAIN_API_KEY")
 
+# Saved indexes: startup skips re-embedding, and workspace shards can be
+# unloaded from memory and reloaded from here
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", str(Path(__file__).parent / "rag_index"))
+
 if LANGCHAIN_API_KEY:
     os.environ["LANGCHAIN_TRACING_V2"] = os.getenv(
         "LANGCHAIN_TRACING_V2", "true")
@@ -66,6 +71,20 @@ with st.sidebar:
     st.divider()
 
     st.subheader("📚 Knowledge Base")
+    workspace_input = st.text_input(
+        "Workspace (optional)",
+        help="Uploads go to this workspace's own collection, e.g. 'team-a/docs'. "
+             "Questions search it together with the shared knowledge base.",
+    ).strip()
+    workspace = ""
+    if workspace_input:
+        from agentic_rag import normalize_collection_name
+        try:
+            workspace = normalize_collection_name(workspace_input)
+        except ValueError as e:
+            st.error(str(e))
+        if workspace and workspace != workspace_input:
+            st.caption(f"Workspace: `{workspace}`")
     uploaded_files = st.file_uploader(
         "Upload documents (optional)",
         accept_multiple_files=True,
@@ -118,6 +137,7 @@ def initialize_agent():
             groq_api_key=GROQ_API_KEY,
             tavily_api_key=TAVILY_API_KEY,
             google_api_key=GOOGLE_API_KEY,
+            index_dir=INDEX_DIR,
         )
         return agent, None
     except Exception as e:
@@ -126,17 +146,64 @@ def initialize_agent():
 
 agent, init_error = initialize_agent()
 
-# Handle file uploads
+
+# ============================================
+# Background Ingestion
+# ============================================
+JOB_ICONS = {"queued": "⏳", "running": "⚙️", "done": "✅", "duplicate": "♻️", "failed": "❌"}
+
+
+@st.cache_resource
+def ingestion_queue(_agent):
+    """One background ingestion worker per agent, shared by all sessions."""
+    from rag_ingest import IngestionQueue
+    return IngestionQueue(_agent)
+
+
+# Uploads are only hashed here; files seen before (in any rerun) map to
+# their existing job, and a background worker does the indexing
+if "upload_jobs" not in st.session_state:
+    st.session_state.upload_jobs = []
+if "uploader_id" not in st.session_state:
+    # The agent is shared by every session: a re-uploaded file name only
+    # replaces this session's own earlier upload
+    st.session_state.uploader_id = uuid.uuid4().hex
 if agent and uploaded_files:
-    texts = []
-    titles = []
-    for f in uploaded_files:
-        content = f.read().decode("utf-8")
-        texts.append(content)
-        titles.append(f.name)
-    if texts:
-        agent.add_documents(texts, titles)
-        st.sidebar.success(f"Added {len(texts)} document(s)")
+    uploads = ingestion_queue(agent)
+    job_ids = uploads.submit(
+        [(f.name, f.getvalue()) for f in uploaded_files],
+        collection=workspace or "default",
+        owner=st.session_state.uploader_id)
+    st.session_state.upload_jobs.extend(
+        j for j in job_ids if j not in st.session_state.upload_jobs)
+
+
+def show_upload_status(polling: bool):
+    """Sidebar list of this session's uploads, refreshed while any is pending."""
+    uploads = ingestion_queue(agent)
+    jobs = uploads.status(st.session_state.upload_jobs)
+    for job in jobs:
+        label = f"{JOB_ICONS[job['status']]} {job['name']}"
+        if job["status"] == "running":
+            st.progress(job["progress"], text=label)
+        elif job["status"] == "done":
+            detail = "replaced earlier version" if job["replaced"] else "added"
+            st.caption(f"{label}: {detail}, {job['chunks']} chunks")
+        elif job["status"] == "duplicate":
+            st.caption(f"{label}: already indexed")
+        elif job["status"] == "failed":
+            st.caption(f"{label}: {job['error']}")
+        else:
+            st.caption(f"{label}: queued")
+    if polling and not uploads.active(st.session_state.upload_jobs):
+        # Last poll: a full rerun picks up new collections and stops polling
+        st.rerun()
+
+
+if agent and st.session_state.upload_jobs:
+    polling = ingestion_queue(agent).active(st.session_state.upload_jobs)
+    with st.sidebar:
+        st.fragment(run_every=1.0 if polling else None)(show_upload_status)(polling)
 
 
 # ============================================
@@ -199,37 +266,53 @@ if submit_button and query.strip():
         st.markdown(query)
 
     with st.chat_message("assistant"):
-        with st.spinner("🤔 Thinking..."):
-            if agent:
-                result = agent.query(query)
-            else:
-                result = {
-                    "answer": "Agent not initialized. Check API keys.",
-                    "sources": [],
-                    "reasoning_steps": ["❌ Initialization failed"]
-                }
-
+        if agent:
+            # Steps appear in the status box as each node finishes, then the
+            # answer streams in token by token
+            status = st.status("🤔 Thinking...", expanded=False)
+            result = {}
+
+            # Shared knowledge base plus the workspace, once it has uploads
+            collections = None
+            if workspace and workspace in agent.collections():
+                collections = ["default", workspace]
+
+            def answer_tokens():
+                for event in agent.query_stream(query, collections):
+                    if event["type"] == "step":
+                        if show_steps:
+                            status.write(event["content"])
+                    elif event["type"] == "token":
+                        yield event["content"]
+                    elif event["type"] == "done":
+                        result.update(event["result"])
+
+            st.write_stream(answer_tokens())
+            status.update(
+                label="🧠 Reasoning Steps" if show_steps else "✅ Done",
+                state="complete")
+        else:
+            result = {
+                "answer": "Agent not initialized. Check API keys.",
+                "sources": [],
+                "reasoning_steps": ["❌ Initialization failed"]
+            }
             st.markdown(result["answer"])
 
-            if show_sources and result.get("sources"):
-                with st.expander("📚 Sources", expanded=False):
-                    for src in result["sources"]:
-                        st.markdown(
-                            f"**{src.get('title', 'Source')}** ({src.get('type', 'unknown')})")
-                        if src.get("url"):
-                            st.caption(f"URL: {src.get('url')}")
-                        st.caption(src.get('content', '')[:200] + "...")
-
-            if show_steps and result.get("reasoning_steps"):
-                with st.expander("🧠 Reasoning Steps", expanded=False):
-                    for step in result["reasoning_steps"]:
-                        st.markdown(f"- {step}")
-
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": result["answer"],
-                "sources": result.get("sources", [])
-            })
+        if show_sources and result.get("sources"):
+            with st.expander("📚 Sources", expanded=False):
+                for src in result["sources"]:
+                    st.markdown(
+                        f"**{src.get('title', 'Source')}** ({src.get('type', 'unknown')})")
+                    if src.get("url"):
+                        st.caption(f"URL: {src.get('url')}")
+                    st.caption(src.get('content', '')[:200] + "...")
+
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": result.get("answer", ""),
+            "sources": result.get("sources", [])
+        })
 
 # Footer
 st.divider()
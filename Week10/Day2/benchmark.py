@@ -0,0 +1,626 @@
+"""
+Agentic RAG Benchmarks
+======================
+Performance benchmarks for agentic_rag.py.
+
+Usage:
+    python benchmark.py startup [--runs N] [--lazy]
+    python benchmark.py allocations [--queries N] [--context-kb KB]
+    python benchmark.py pipeline [--clients 1 4 16] [--queries N]
+        [--llm-latency-ms MS] [--search-latency-ms MS] [--error-rate P]
+        [--reasoning-mode blocking background off] [--rerank-pair-ms MS]
+    python benchmark.py index [--vectors N] [--dim D] [--queries N] [--k K]
+    python benchmark.py storage [--docs N] [--doc-chars C] [--queries N]
+    python benchmark.py updates [--docs 500 2000 8000] [--doc-chars C] [--runs N]
+
+Benchmarks:
+- startup: cold init (fresh interpreter: imports + model load + index build)
+  and warm init (another AgenticRAG in the same process) in milliseconds
+- allocations: memory allocated per query through the graph, with stub
+  LLM/search/embeddings so only the pipeline itself is measured
+- pipeline: load test against deterministic stand-ins with simulated
+  latency and error rates; reports p50/p95/p99 per node and end to end,
+  throughput at each client concurrency, and the memory high-water mark;
+  with several --reasoning-mode values, a final table compares end-to-end
+  latency with the reasoning call on, off and off the critical path;
+  --rerank-pair-ms adds the rerank node with a stand-in cross-encoder
+- index: recall@k versus per-query latency of IVF-Flat, IVF-PQ and HNSW
+  (swept over nprobe / ef_search) against the exact flat index, on a
+  synthetic clustered corpus, with index size and build time
+- storage: Python memory held by a reloaded index of uploads, peak RSS and
+  vector search latency (fresh interpreter each), with chunk text in the
+  in-memory docstore versus the on-disk chunk store
+- updates: time to upsert (replace) and delete one document, for growing
+  corpora in both storage modes, and to compact the tombstones afterwards
+
+All benchmarks except startup run offline: no Groq, Tavily or HuggingFace
+calls are made.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Placeholder keys: clients are constructed but never called
+DUMMY_KEYS = {"groq_api_key": "benchmark", "tavily_api_key": "benchmark"}
+
+
+# ============================================
+# Startup
+# ============================================
+def _startup_child(lazy: bool):
+    """Runs in a fresh interpreter: time one cold and one warm init."""
+    start = time.perf_counter()
+    from agentic_rag import AgenticRAG
+    import_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    cold = AgenticRAG(**DUMMY_KEYS, lazy=lazy)
+    cold_ms = (time.perf_counter() - start) * 1000
+    cold_warmup = cold.warmup() if lazy else {}
+
+    start = time.perf_counter()
+    warm = AgenticRAG(**DUMMY_KEYS, lazy=lazy)
+    warm_ms = (time.perf_counter() - start) * 1000
+    warm_warmup = warm.warmup() if lazy else {}
+
+    print(json.dumps({
+        "import_ms": import_ms,
+        "cold_init_ms": cold_ms,
+        "cold_warmup_ms": sum(cold_warmup.values()),
+        "warm_init_ms": warm_ms,
+        "warm_warmup_ms": sum(warm_warmup.values()),
+    }))
+
+
+def bench_startup(runs: int, lazy: bool):
+    samples = []
+    for _ in range(runs):
+        cmd = [sys.executable, __file__, "_startup_child"]
+        if lazy:
+            cmd.append("--lazy")
+        out = subprocess.run(
+            cmd, cwd=HERE, capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"Startup ({'lazy' if lazy else 'eager'}, {runs} runs, median ms)")
+    for key in samples[0]:
+        values = [s[key] for s in samples]
+        print(f"  {key:<16} {statistics.median(values):10.1f}")
+
+
+# ============================================
+# Offline Stand-ins
+# ============================================
+class _SimulatedUpstream:
+    """Latency and failure injection shared by the stand-ins (seeded, so runs repeat)."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        """(delay in seconds, whether this call fails)."""
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+            fail = self._rng.random() < self.error_rate
+        return max(0.0, self.latency_ms + jitter) / 1000, fail
+
+    def _call(self):
+        delay, fail = self._draw()
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError(f"simulated {type(self).__name__} failure")
+
+    async def _acall(self):
+        import asyncio
+
+        delay, fail = self._draw()
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError(f"simulated {type(self).__name__} failure")
+
+
+class StubLLM(_SimulatedUpstream):
+    """Chat model stand-in returning a fixed-size answer."""
+
+    def __init__(self, answer_chars: int = 800, **kwargs):
+        super().__init__(**kwargs)
+        self.answer = "x" * answer_chars
+
+    def invoke(self, messages, **kwargs):
+        from langchain_core.messages import AIMessage
+
+        self._call()
+        return AIMessage(content=self.answer)
+
+    async def ainvoke(self, messages, **kwargs):
+        from langchain_core.messages import AIMessage
+
+        await self._acall()
+        return AIMessage(content=self.answer)
+
+
+class StubSearch(_SimulatedUpstream):
+    """Tavily stand-in returning n results of a given size."""
+
+    def __init__(self, n_results: int = 3, result_chars: int = 2000, **kwargs):
+        super().__init__(**kwargs)
+        self.results = [
+            {"title": f"Result {i}", "url": f"https://example.com/{i}",
+             "content": "w" * result_chars}
+            for i in range(n_results)
+        ]
+
+    def invoke(self, query, **kwargs):
+        self._call()
+        return self.results
+
+    async def ainvoke(self, query, **kwargs):
+        await self._acall()
+        return self.results
+
+
+class StubCrossEncoder:
+    """Cross-encoder stand-in: word overlap score, fixed CPU cost per pair."""
+
+    def __init__(self, pair_ms: float = 2.0):
+        self.pair_ms = pair_ms
+
+    def predict(self, pairs):
+        time.sleep(self.pair_ms * len(pairs) / 1000)
+        return [
+            len(set(query.lower().split()) & set(passage.lower().split()))
+            for query, passage in pairs
+        ]
+
+
+def stub_embeddings(dim: int = 64, latency_ms: float = 0.0):
+    """Deterministic bag-of-words hashing embeddings (no model download)."""
+    from langchain_core.embeddings import Embeddings
+
+    class StubEmbeddings(Embeddings):
+        def _embed(self, text):
+            vector = [0.0] * dim
+            for word in text.lower().split():
+                digest = hashlib.md5(word.encode("utf-8")).digest()
+                vector[digest[0] % dim] += 1.0
+            norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+            return [x / norm for x in vector]
+
+        def embed_documents(self, texts):
+            time.sleep(latency_ms / 1000)
+            return [self._embed(t) for t in texts]
+
+        def embed_query(self, text):
+            time.sleep(latency_ms / 1000)
+            return self._embed(text)
+
+    return StubEmbeddings()
+
+
+def offline_agent(llm=None, search_tool=None, embeddings=None, warm=True, **kwargs):
+    """AgenticRAG wired to stand-ins instead of Groq/Tavily/HuggingFace."""
+    from agentic_rag import AgenticRAG
+
+    agent = AgenticRAG(
+        llm=llm or StubLLM(),
+        search_tool=search_tool or StubSearch(),
+        embeddings=embeddings or stub_embeddings(),
+        embedding_model="benchmark-stub",
+        lazy=True,
+        **kwargs,
+    )
+    if warm:
+        agent.warmup()
+    return agent
+
+
+def _synthetic_documents(n_docs: int, doc_chars: int):
+    words = ["retrieval", "agent", "graph", "vector", "search", "latency",
+             "groq", "tavily", "index", "chunk", "answer", "context"]
+    return [
+        {
+            "title": f"Doc {i}",
+            "type": "knowledge_base",
+            "content": " ".join(
+                words[(i * 7 + j) % len(words)] for j in range(doc_chars // 7)),
+        }
+        for i in range(n_docs)
+    ]
+
+
+# ============================================
+# Allocations
+# ============================================
+def bench_allocations(n_queries: int, context_kb: int):
+    """Peak traced memory per query, for large retrieved + web contexts."""
+    agent = offline_agent(
+        search_tool=StubSearch(result_chars=context_kb * 1024 // 3),
+        documents=_synthetic_documents(200, 2000),
+        retrieval_k=8,
+        response_cache_size=0,
+    )
+    # Web-routed queries carry both retrieved chunks and web results
+    questions = [f"latest news on vector search {i}" for i in range(n_queries)]
+    agent.query(questions[0])  # warm imports and lazy state
+
+    peaks = []
+    tracemalloc.start()
+    for question in questions:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        agent.query(question)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+
+    print(f"Allocations ({n_queries} queries, ~{context_kb} KB web context)")
+    print(f"  peak KiB/query  median {statistics.median(peaks) / 1024:8.1f}"
+          f"  max {max(peaks) / 1024:8.1f}")
+
+
+# ============================================
+# Chunk Storage
+# ============================================
+def _storage_child(index_dir: str, chunk_store: bool, n_queries: int):
+    """Runs in a fresh interpreter: load an index built by bench_storage and search it."""
+    import resource
+
+    # Warm imports on a throwaway agent so only the loaded index is traced
+    offline_agent(documents=_synthetic_documents(1, 200))
+    tracemalloc.start()
+    agent = offline_agent(index_dir=index_dir, chunk_store=chunk_store,
+                          documents=_synthetic_documents(1, 200), retrieval_k=8,
+                          hybrid_search=False)
+    loaded, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Vector search plus reading the top-k chunks (no BM25)
+    latencies = []
+    for i in range(n_queries):
+        start = time.perf_counter()
+        agent._search([f"vector search latency {i}"], 8)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    print(json.dumps({
+        "traced_mib": loaded / 2**20,
+        "max_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "search_p50_ms": statistics.median(latencies),
+    }))
+
+
+def bench_storage(n_docs: int, doc_chars: int, n_queries: int):
+    """Per-process memory of a loaded index: in-RAM docstore vs chunk store."""
+    import tempfile
+
+    print(f"Chunk storage ({n_docs} uploaded docs x {doc_chars} chars, "
+          f"{n_queries} searches)")
+    print(f"  {'storage':<12}{'traced MiB':>12}{'max RSS MiB':>13}{'search p50 ms':>15}")
+    # Distinct contents, so upload dedup keeps every document
+    uploads = [
+        {"title": d["title"], "content": f"{d['title']}. {d['content']}"}
+        for d in _synthetic_documents(n_docs, doc_chars)
+    ]
+    for chunk_store in (False, True):
+        with tempfile.TemporaryDirectory() as index_dir:
+            # Small constructor corpus; the uploads are what the store holds
+            builder = offline_agent(index_dir=index_dir, chunk_store=chunk_store,
+                                    documents=_synthetic_documents(1, 200))
+            builder.add_documents([d["content"] for d in uploads],
+                                  [d["title"] for d in uploads])
+            del builder
+
+            cmd = [sys.executable, __file__, "_storage_child", index_dir,
+                   "--queries", str(n_queries)]
+            if chunk_store:
+                cmd.append("--chunk-store")
+            out = subprocess.run(
+                cmd, cwd=HERE, capture_output=True, text=True, check=True)
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+        label = "chunk store" if chunk_store else "docstore"
+        print(f"  {label:<12}{r['traced_mib']:>12.1f}{r['max_rss_mib']:>13.1f}"
+              f"{r['search_p50_ms']:>15.3f}")
+
+
+def bench_updates(corpus_sizes, doc_chars: int, runs: int):
+    """Latency of replacing and deleting one document as the corpus grows."""
+    import tempfile
+
+    print(f"Document updates (1 doc x {doc_chars} chars per call, median of {runs})")
+    print(f"  {'storage':<12}{'corpus docs':>12}{'upsert ms':>11}{'delete ms':>11}"
+          f"{'compact ms':>12}")
+    for chunk_store in (False, True):
+        for n_docs in corpus_sizes:
+            uploads = _synthetic_documents(n_docs, doc_chars)
+            with tempfile.TemporaryDirectory() as index_dir:
+                agent = offline_agent(index_dir=index_dir, chunk_store=chunk_store,
+                                      documents=_synthetic_documents(1, 200),
+                                      compact_threshold=None)
+                agent.add_documents([f"{d['title']}. {d['content']}" for d in uploads],
+                                    [d["title"] for d in uploads])
+                upserts, deletes = [], []
+                for i in range(runs):
+                    title = uploads[i]["title"]
+                    start = time.perf_counter()
+                    agent.upsert_documents([f"{title} revised. {uploads[i]['content']}"], [title])
+                    upserts.append((time.perf_counter() - start) * 1000)
+                    start = time.perf_counter()
+                    agent.delete_documents([uploads[runs + i]["title"]])
+                    deletes.append((time.perf_counter() - start) * 1000)
+                compact_ms = agent.compact()["elapsed_s"] * 1000
+            label = "chunk store" if chunk_store else "docstore"
+            print(f"  {label:<12}{n_docs:>12}{statistics.median(upserts):>11.1f}"
+                  f"{statistics.median(deletes):>11.1f}{compact_ms:>12.1f}")
+
+
+# ============================================
+# Pipeline Load Test
+# ============================================
+NODES = ("reason", "retrieve", "rerank", "web_search", "synthesize")
+
+
+def _percentiles(values):
+    """(p50, p95, p99) of a list of samples."""
+    if len(values) < 2:
+        value = values[0] if values else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+# Sub-stage timings reported inside the node metrics, with their row labels
+STAGES = {
+    "embedding_ms": "  embedding",
+    "faiss_ms": "  faiss",
+    "bm25_ms": "  bm25",
+    "web_search_ms": "  search_api",
+}
+
+
+def bench_pipeline(clients_levels, n_queries, llm_latency_ms, search_latency_ms,
+                   jitter_ms, error_rate, graph_mode, web_ratio,
+                   reasoning_modes=("blocking",), rerank_pair_ms=None):
+    summary = {}
+    for reasoning_mode in reasoning_modes:
+        print(f"Pipeline ({graph_mode}, reasoning {reasoning_mode}, {n_queries} queries "
+              f"per level, LLM {llm_latency_ms}±{jitter_ms} ms, search "
+              f"{search_latency_ms}±{jitter_ms} ms, error rate {error_rate:.1%})")
+        for clients in clients_levels:
+            summary[reasoning_mode, clients] = _pipeline_level(
+                clients, n_queries, llm_latency_ms, search_latency_ms, jitter_ms,
+                error_rate, graph_mode, web_ratio, reasoning_mode, rerank_pair_ms)
+        print()
+
+    if len(reasoning_modes) > 1:
+        print(f"End-to-end latency by reasoning mode ({graph_mode})")
+        print(f"  {'mode':<12}{'clients':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for (reasoning_mode, clients), latencies in summary.items():
+            p50, p95, p99 = _percentiles(latencies)
+            print(f"  {reasoning_mode:<12}{clients:>8}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
+
+    # ru_maxrss is in KiB on Linux
+    high_water = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\n  memory high-water mark: {high_water:.1f} MiB")
+
+
+def _pipeline_level(clients, n_queries, llm_latency_ms, search_latency_ms, jitter_ms,
+                    error_rate, graph_mode, web_ratio, reasoning_mode, rerank_pair_ms=None):
+    """Run one concurrency level, print its table and return end-to-end latencies."""
+    agent = offline_agent(
+        llm=StubLLM(latency_ms=llm_latency_ms, jitter_ms=jitter_ms,
+                    error_rate=error_rate, seed=1),
+        search_tool=StubSearch(latency_ms=search_latency_ms, jitter_ms=jitter_ms,
+                               error_rate=error_rate, seed=2),
+        documents=_synthetic_documents(200, 2000),
+        graph_mode=graph_mode,
+        reasoning_mode=reasoning_mode,
+        reranker=None if rerank_pair_ms is None else StubCrossEncoder(rerank_pair_ms),
+        response_cache_size=0,
+        warm=False,
+    )
+    timings = defaultdict(list)
+    agent.warmup()
+
+    # Distinct questions; a share of them is keyword-routed to the web
+    n_web = int(n_queries * web_ratio)
+    questions = [f"latest vector search news {i}" for i in range(n_web)]
+    questions += [f"how does graph retrieval work {i}" for i in range(n_queries - n_web)]
+    random.Random(0).shuffle(questions)
+
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def client_query(question):
+        nonlocal errors
+        metrics = agent.query(question)["metrics"]
+        with lock:
+            latencies.append(metrics["total_ms"])
+            errors += metrics["error"]
+            for node, record in metrics["nodes"].items():
+                timings[node].append(record["wall_ms"])
+                for field, label in STAGES.items():
+                    if field in record:
+                        timings[label].append(record[field])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client_query, questions))
+    wall = time.perf_counter() - start
+
+    print(f"\n  clients={clients}: {n_queries / wall:.1f} queries/s, "
+          f"{errors} errors")
+    print(f"    {'stage':<12}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = [*NODES, *STAGES.values()]
+    for name, samples in [*((n, timings[n]) for n in rows), ("end_to_end", latencies)]:
+        p50, p95, p99 = _percentiles(samples)
+        print(f"    {name:<12}{len(samples):>7}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
+    return latencies
+
+
+# ============================================
+# Vector Index Trade-offs
+# ============================================
+def _clustered_vectors(rng, centers, n, noise=0.35):
+    """Unit vectors scattered around random centers, like sentence embeddings."""
+    import numpy as np
+
+    points = centers[rng.integers(len(centers), size=n)]
+    points = points + noise * rng.standard_normal(points.shape) / math.sqrt(centers.shape[1])
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    return points.astype(np.float32)
+
+
+def bench_index(n_vectors, dim, n_queries, k, nlist, pq_m):
+    import faiss
+    import numpy as np
+    from rag_retrieval import IndexSpec
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(1, n_vectors // 500), dim))
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    corpus = _clustered_vectors(rng, centers, n_vectors)
+    queries = _clustered_vectors(rng, centers, n_queries)
+
+    sweeps = [
+        (IndexSpec(kind="flat"), "-", [None]),
+        (IndexSpec(kind="ivf-flat", nlist=nlist), "nprobe", [1, 4, 16, 64]),
+        (IndexSpec(kind="ivf-pq", nlist=nlist, pq_m=pq_m), "nprobe", [1, 4, 16, 64]),
+        (IndexSpec(kind="hnsw"), "efSearch", [16, 32, 64, 128]),
+    ]
+
+    print(f"Vector index ({n_vectors} x {dim} corpus, {n_queries} queries, recall@{k})")
+    print(f"  {'index':<22}{'knob':>12}{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'B/vector':>10}{'build s':>9}")
+
+    truth = None
+    for spec, knob, values in sweeps:
+        start = time.perf_counter()
+        index = spec.build(corpus)
+        index.add(corpus)
+        build_s = time.perf_counter() - start
+        bytes_per_vector = faiss.serialize_index(index).nbytes / n_vectors
+
+        for value in values:
+            spec.tune(index, nprobe=value, ef_search=value)
+            # One query per call, as on the request path
+            latencies, hits = [], []
+            for query in queries:
+                start = time.perf_counter()
+                _, ids = index.search(query[None, :], k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits.append(ids[0])
+            if truth is None:
+                truth = hits
+
+            recall = statistics.mean(
+                len(set(found) & set(expected)) / k
+                for found, expected in zip(hits, truth))
+            p50, p95, _ = _percentiles(latencies)
+            label = f"{knob}={value}" if value else "exact"
+            print(f"  {spec.factory_string(n_vectors):<22}{label:>12}{recall:>9.3f}"
+                  f"{p50:>9.3f}{p95:>9.3f}{bytes_per_vector:>10.0f}{build_s:>9.2f}")
+
+
+# ============================================
+# CLI
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("startup", help="cold and warm AgenticRAG init time")
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--lazy", action="store_true",
+                   help="construct with lazy=True and time warmup() separately")
+
+    p = sub.add_parser("allocations", help="memory allocated per query")
+    p.add_argument("--queries", type=int, default=50)
+    p.add_argument("--context-kb", type=int, default=64)
+
+    p = sub.add_parser("pipeline", help="offline load test with stand-ins")
+    p.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--llm-latency-ms", type=float, default=300.0)
+    p.add_argument("--search-latency-ms", type=float, default=500.0)
+    p.add_argument("--jitter-ms", type=float, default=50.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--web-ratio", type=float, default=0.3,
+                   help="share of questions routed to web search by keyword")
+    p.add_argument("--graph-mode", default="sequential",
+                   choices=["sequential", "parallel"])
+    p.add_argument("--reasoning-mode", nargs="+", default=["blocking"],
+                   choices=["blocking", "background", "off"],
+                   help="one run per mode; several modes are compared at the end")
+    p.add_argument("--rerank-pair-ms", type=float, default=None,
+                   help="enable reranking with a stand-in costing this much per pair")
+
+    p = sub.add_parser("index", help="recall vs latency of approximate FAISS indexes")
+    p.add_argument("--vectors", type=int, default=100_000)
+    p.add_argument("--dim", type=int, default=384)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--nlist", type=int, default=1024)
+    p.add_argument("--pq-m", type=int, default=48,
+                   help="PQ sub-quantizers (must divide --dim)")
+
+    p = sub.add_parser("storage", help="memory of a loaded index, docstore vs chunk store")
+    p.add_argument("--docs", type=int, default=2000)
+    p.add_argument("--doc-chars", type=int, default=4000)
+    p.add_argument("--queries", type=int, default=200)
+
+    p = sub.add_parser("updates", help="upsert / delete latency vs corpus size")
+    p.add_argument("--docs", type=int, nargs="+", default=[500, 2000, 8000])
+    p.add_argument("--doc-chars", type=int, default=2000)
+    p.add_argument("--runs", type=int, default=5)
+
+    p = sub.add_parser("_startup_child")
+    p.add_argument("--lazy", action="store_true")
+
+    p = sub.add_parser("_storage_child")
+    p.add_argument("index_dir")
+    p.add_argument("--chunk-store", action="store_true")
+    p.add_argument("--queries", type=int, default=200)
+
+    args = parser.parse_args()
+    if args.command == "startup":
+        bench_startup(args.runs, args.lazy)
+    elif args.command == "allocations":
+        bench_allocations(args.queries, args.context_kb)
+    elif args.command == "pipeline":
+        bench_pipeline(args.clients, args.queries, args.llm_latency_ms,
+                       args.search_latency_ms, args.jitter_ms, args.error_rate,
+                       args.graph_mode, args.web_ratio, args.reasoning_mode,
+                       args.rerank_pair_ms)
+    elif args.command == "index":
+        bench_index(args.vectors, args.dim, args.queries, args.k, args.nlist, args.pq_m)
+    elif args.command == "storage":
+        bench_storage(args.docs, args.doc_chars, args.queries)
+    elif args.command == "updates":
+        bench_updates(args.docs, args.doc_chars, args.runs)
+    elif args.command == "_startup_child":
+        _startup_child(args.lazy)
+    elif args.command == "_storage_child":
+        _storage_child(args.index_dir, args.chunk_store, args.queries)
+
+
+if __name__ == "__main__":
+    main()
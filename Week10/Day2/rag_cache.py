@@ -0,0 +1,525 @@
+"""
+Caches for the Agentic RAG System
+=================================
+Caching layers used by agentic_rag.py to avoid repeating expensive work.
+
+Components:
+- EmbeddingCache: persistent SQLite store of embedding vectors
+- CachedEmbeddings: LangChain Embeddings wrapper that consults the cache
+- ResponseCache: exact + semantic cache of final answers with TTL/LRU
+- SearchCache: web search results with TTL, request coalescing and
+  stale-while-revalidate
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+def _text_hash(text: str) -> str:
+    """Content address of a piece of text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ============================================
+# Embedding Cache
+# ============================================
+class EmbeddingCache:
+    """
+    Content-addressed embedding store keyed by (embedding_model, sha256(text)).
+
+    Document vectors are stored as packed float32 blobs in SQLite. Pass a file
+    path to keep embeddings across restarts, or ":memory:" for a per-process
+    cache. Query vectors live in a separate in-memory LRU of max_queries
+    entries: every distinct question would otherwise add a row that is never
+    evicted, and some models embed queries differently from documents.
+    """
+
+    def __init__(self, path: str = ":memory:", max_queries: int = 1024):
+        self.path = path
+        self.max_queries = max_queries
+        self._queries: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )"""
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up cached vectors; missing entries come back as None."""
+        hashes = [_text_hash(t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # Chunked to stay under SQLite's bound-parameter limit
+            unique = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = array("f", blob).tolist()
+
+            vectors = [found.get(h) for h in hashes]
+            hit_count = sum(v is not None for v in vectors)
+            self.hits += hit_count
+            self.misses += len(vectors) - hit_count
+        return vectors
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Store vectors for the given texts, replacing existing entries."""
+        rows = [
+            (model, _text_hash(t), array("f", v).tobytes())
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def get_query(self, model: str, text: str) -> Optional[List[float]]:
+        """Look up a cached query vector, refreshing its LRU position."""
+        key = (model, _text_hash(text))
+        with self._lock:
+            vector = self._queries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._queries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put_query(self, model: str, text: str, vector: List[float]):
+        """Store a query vector, evicting the least recently used beyond max_queries."""
+        if self.max_queries <= 0:
+            return
+        key = (model, _text_hash(text))
+        with self._lock:
+            self._queries[key] = vector
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters since startup plus the number of stored vectors."""
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "query_entries": len(self._queries),
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that only runs the underlying model on cache misses.
+
+    Used for both FAISS ingestion (embed_documents) and similarity_search
+    (embed_query). Document vectors go to the persistent store and query
+    vectors to its bounded in-memory LRU, so the two never answer for each
+    other and questions cannot grow the cache without limit.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(self.model_name, texts)
+
+        # Embed each distinct missing text once, in a single model call
+        missing = list(dict.fromkeys(
+            t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            computed = self.embeddings.embed_documents(missing)
+            self.cache.put_many(self.model_name, missing, computed)
+            by_text = dict(zip(missing, computed))
+            vectors = [
+                v if v is not None else by_text[t]
+                for t, v in zip(texts, vectors)
+            ]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get_query(self.model_name, text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_query(self.model_name, text, vector)
+        return vector
+
+
+# ============================================
+# Response Cache
+# ============================================
+class ResponseCache:
+    """
+    Two-tier cache of query results.
+
+    - Exact tier: keyed by the normalized query string.
+    - Semantic tier: reuses an entry whose query embedding has cosine
+      similarity >= similarity_threshold with the new query, among entries
+      stored under the same scope (e.g. the collections searched). Unit
+      embeddings are rows of one float32 matrix, so a lookup is a single
+      matrix-vector product.
+
+    Entries expire after ttl_seconds (or the shorter ttl passed to put())
+    and the least recently used entry is evicted beyond max_entries.
+    clear() drops everything, e.g. when the knowledge base changes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 3600.0,
+        similarity_threshold: Optional[float] = 0.95,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Semantic tier: one matrix row per entry with an embedding
+        self._matrix = None             # max_entries x dim, allocated on first put
+        self._row_keys: List[Optional[str]] = []
+        self._free_rows: List[int] = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return now - entry["created_at"] > entry["ttl"]
+
+    def _drop(self, key: str):
+        """Under the lock: remove an entry and free its matrix row."""
+        entry = self._entries.pop(key)
+        row = entry["row"]
+        if row is not None:
+            self._row_keys[row] = None
+            self._free_rows.append(row)
+
+    def get_exact(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached result for a normalized query, if fresh. Counts a
+        miss when there is no semantic tier to try next.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, time.time()):
+                self._drop(key)
+                entry = None
+            if entry is None:
+                if self.similarity_threshold is None:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry["result"]
+
+    def get_similar(self, embedding: List[float], scope: str = ""):
+        """
+        Return (result, similarity) for the closest fresh entry above the
+        threshold, or None. Counts a miss when nothing qualifies.
+        """
+        import numpy as np
+
+        if self.similarity_threshold is None:
+            return None
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        now = time.time()
+        with self._lock:
+            hit = None
+            if self._matrix is not None and len(self._row_keys):
+                similarities = self._matrix[:len(self._row_keys)] @ query
+                rows = np.flatnonzero(similarities >= self.similarity_threshold)
+                # Best first; rows of dropped entries are skipped
+                for row in rows[np.argsort(-similarities[rows], kind="stable")]:
+                    key = self._row_keys[row]
+                    if key is None:
+                        continue
+                    entry = self._entries[key]
+                    if self._expired(entry, now):
+                        self._drop(key)
+                        continue
+                    if entry["scope"] == scope:
+                        hit = key, float(similarities[row])
+                        break
+
+            if hit is None:
+                self.misses += 1
+                return None
+            key, similarity = hit
+            self._entries.move_to_end(key)
+            self.semantic_hits += 1
+            return self._entries[key]["result"], similarity
+
+    def _store_embedding(self, key: str, embedding: Optional[List[float]]) -> Optional[int]:
+        """Under the lock: write a unit embedding to a free matrix row."""
+        import numpy as np
+
+        if not embedding or self.similarity_threshold is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = len(self._row_keys)
+            self._row_keys.append(None)
+        self._matrix[row] = vector / (np.linalg.norm(vector) or 1.0)
+        self._row_keys[row] = key
+        return row
+
+    def put(self, key: str, embedding: Optional[List[float]], result: Dict[str, Any],
+            scope: str = "", ttl_seconds: Optional[float] = None):
+        """Cache a result; ttl_seconds can only shorten the cache-wide TTL."""
+        if self.max_entries <= 0:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            while len(self._entries) >= self.max_entries:
+                self._drop(next(iter(self._entries)))
+            self._entries[key] = {
+                "result": result,
+                "row": self._store_embedding(key, embedding),
+                "scope": scope,
+                "created_at": time.time(),
+                "ttl": ttl,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._row_keys = []
+            self._free_rows = []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+# ============================================
+# Search Cache
+# ============================================
+def _waiter_error(e: BaseException) -> Exception:
+    """What coalesced callers see when the search they waited on failed."""
+    if isinstance(e, Exception):
+        return e
+    return RuntimeError(f"Web search interrupted: {type(e).__name__}")
+
+
+class SearchCache:
+    """
+    Cache of web search results.
+
+    An entry is fresh for ttl_seconds, then stale for stale_seconds more:
+    a stale entry is still returned, and a single background refresh
+    replaces it. Concurrent lookups of a missing key share one upstream
+    call instead of each searching. Failed searches are not cached. The
+    least recently used entry is evicted beyond max_entries; ttl_seconds=0
+    disables caching (coalescing still applies).
+
+    Lookups return (results, status) with status "fresh", "stale",
+    "coalesced" (waited for another caller's search) or "miss".
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 300.0,
+        stale_seconds: float = 1800.0,
+        max_entries: int = 1024,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresher = concurrent.futures.ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="search-refresh")
+        self.counts = {"fresh": 0, "stale": 0, "coalesced": 0, "miss": 0, "refreshes": 0}
+
+    def _lookup(self, key: str):
+        """
+        Under the lock: (cached value, status) for a cache hit, else
+        (future, "coalesced") to wait on or (future, "miss") to fulfil.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl_seconds > 0:
+            age = time.time() - entry[0]
+            if age <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                return entry[1], "fresh"
+            if age <= self.ttl_seconds + self.stale_seconds:
+                self._entries.move_to_end(key)
+                return entry[1], "stale"
+            del self._entries[key]
+
+        future = self._inflight.get(key)
+        if future is not None:
+            return future, "coalesced"
+        future = concurrent.futures.Future()
+        self._inflight[key] = future
+        return future, "miss"
+
+    def _store(self, key: str, value: Any):
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _settle(self, key: str, future: concurrent.futures.Future, value=None, error=None):
+        with self._lock:
+            if error is None:
+                self._store(key, value)
+            del self._inflight[key]
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+
+    def _refresh(self, key: str, fetch: Callable[[], Any]):
+        """Replace a stale entry in the background (at most one refresh per key)."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self.counts["refreshes"] += 1
+
+        def run():
+            try:
+                value = fetch()
+                with self._lock:
+                    self._store(key, value)
+            except Exception as e:
+                logger.warning("Background search refresh failed: %s", e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._refresher.submit(run)
+
+    def get(
+        self,
+        key: str,
+        fetch: Callable[[], Any],
+        refresh: Optional[Callable[[], Any]] = None,
+    ):
+        """
+        Cached results for key, calling fetch() on a miss. Stale entries
+        are refreshed in the background with refresh() (default fetch()).
+        """
+        with self._lock:
+            value, status = self._lookup(key)
+            self.counts[status] += 1
+        if status == "stale":
+            self._refresh(key, refresh or fetch)
+        if status in ("fresh", "stale"):
+            return value, status
+        if status == "coalesced":
+            return value.result(), status
+
+        try:
+            result = fetch()
+        except BaseException as e:
+            self._settle(key, value, error=_waiter_error(e))
+            raise
+        self._settle(key, value, result)
+        return result, status
+
+    async def aget(
+        self,
+        key: str,
+        afetch: Callable[[], Awaitable[Any]],
+        refresh: Callable[[], Any],
+    ):
+        """
+        Async get(): afetch() serves a miss; stale entries are refreshed on
+        the background thread pool with the synchronous refresh().
+        """
+        with self._lock:
+            value, status = self._lookup(key)
+            self.counts[status] += 1
+        if status == "stale":
+            self._refresh(key, refresh)
+        if status in ("fresh", "stale"):
+            return value, status
+        if status == "coalesced":
+            return await asyncio.wrap_future(value), status
+
+        try:
+            result = await afetch()
+        except BaseException as e:
+            # Includes cancellation, so waiting callers are never stranded
+            self._settle(key, value, error=_waiter_error(e))
+            raise
+        self._settle(key, value, result)
+        return result, status
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = sum(v for k, v in self.counts.items() if k != "refreshes")
+            served = self.counts["fresh"] + self.counts["stale"] + self.counts["coalesced"]
+            return dict(
+                self.counts,
+                hit_rate=served / lookups if lookups else 0.0,
+                entries=len(self._entries),
+            )
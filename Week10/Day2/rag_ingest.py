@@ -0,0 +1,264 @@
+"""
+Ingestion Helpers for the Agentic RAG System
+============================================
+Splitting and deduplication used by AgenticRAG.add_documents, and the
+background upload queue used by app.py.
+
+Components:
+- document_hash: content address used to skip re-uploaded documents
+- text_splitter: one shared RecursiveCharacterTextSplitter per configuration
+- split_parallel: chunk documents in a process pool when there are many
+- batched: fixed-size slices for embedding and FAISS appends
+- IngestionQueue: uploads ingested by a worker thread, deduplicated across
+  Streamlit reruns, with pollable per-file status
+"""
+
+import functools
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Dict, Tuple, Iterable, Iterator, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# (text, metadata) pairs, for documents and for their chunks
+Item = Tuple[str, Dict[str, str]]
+
+
+def document_hash(text: str) -> str:
+    """Content address of an uploaded document."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def text_splitter(chunk_size: int, chunk_overlap: int):
+    """Splitters are stateless, so each process builds one per configuration."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def split_items(items: List[Item], chunk_size: int, chunk_overlap: int) -> List[Item]:
+    """Split documents into chunks that keep their document's metadata."""
+    splitter = text_splitter(chunk_size, chunk_overlap)
+    return [
+        (chunk, dict(metadata))
+        for text, metadata in items
+        for chunk in splitter.split_text(text)
+    ]
+
+
+def batched(items: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+_pools_lock = threading.Lock()
+_pools: Dict[int, ProcessPoolExecutor] = {}
+
+
+def _split_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool of a given size, started once per process and reused.
+
+    Workers are started by a fork server (spawn where there is none), not
+    forked: callers are multithreaded (Streamlit, torch, the ingestion
+    thread), and a child forked while another thread holds a lock can
+    deadlock.
+    """
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in methods else "spawn")
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pools[workers] = pool
+        return pool
+
+
+def split_parallel(
+    items: List[Item],
+    chunk_size: int,
+    chunk_overlap: int,
+    workers: Optional[int] = None,
+    min_parallel_chars: int = 1_000_000,
+) -> List[Item]:
+    """
+    Split documents, in a process pool when there is enough text to pay
+    for starting one. Chunk order follows document order either way.
+
+    Args:
+        items: (text, metadata) documents
+        workers: Pool size (defaults to the CPU count; 1 splits in-process)
+        min_parallel_chars: Total text size below which splitting stays
+            in-process
+    """
+    workers = workers or os.cpu_count() or 1
+    total_chars = sum(len(text) for text, _ in items)
+    if workers <= 1 or len(items) < 2 or total_chars < min_parallel_chars:
+        return split_items(items, chunk_size, chunk_overlap)
+
+    # A few slices per worker keeps the pool busy when document sizes vary
+    per_slice = max(1, len(items) // (workers * 4))
+    slices = list(batched(items, per_slice))
+    results = _split_pool(workers).map(
+        split_items, slices,
+        [chunk_size] * len(slices), [chunk_overlap] * len(slices))
+    return [chunk for result in results for chunk in result]
+
+
+# ============================================
+# Background Upload Queue
+# ============================================
+class IngestionQueue:
+    """
+    Uploaded files ingested one at a time by a background thread.
+
+    submit() only hashes the files: a file (collection, owner, name,
+    content) that was submitted before maps to its existing job, so
+    rerunning a script with the same uploads never queues them again. The
+    worker decodes each file and passes it to agent.upsert_documents keyed
+    by doc_id(): an edited file replaces the earlier version its owner
+    uploaded to that collection, never another owner's file of the same
+    name, and unchanged content is not embedded again. Callers poll
+    status() for progress.
+
+    Job status: queued, running, done, duplicate (the owner's file
+    already has this content) or failed (with error; empty and non-UTF-8 files fail).
+    Failed files are not retried until their content changes.
+    """
+
+    def __init__(self, agent, max_finished: int = 500):
+        """
+        Args:
+            agent: AgenticRAG (or anything with its upsert_documents)
+            max_finished: Finished jobs kept for status(); older ones are
+                forgotten, and resubmitting them is deduplicated by the
+                agent instead
+        """
+        self.agent = agent
+        self.max_finished = max_finished
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._payloads: Dict[str, bytes] = {}
+        self._finished: List[str] = []
+        self._pending: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    @staticmethod
+    def job_id(name: str, data: bytes, collection: str, owner: str = "") -> str:
+        """Stable id of one file's upload to a collection by an owner."""
+        key = "\0".join([collection, owner, name, hashlib.sha256(data).hexdigest()])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def doc_id(name: str, collection: str, owner: str = "") -> str:
+        """Document id an owner's file is upserted under ("collection:owner:name")."""
+        return ":".join([collection, owner, name])
+
+    def submit(
+        self, files: Iterable[Tuple[str, bytes]], collection: str = "default",
+        owner: str = "",
+    ) -> List[str]:
+        """
+        Queue (name, content) files that were not submitted before.
+
+        Args:
+            files: (file name, content) pairs
+            collection: Collection the files are added to
+            owner: Uploader (e.g. a session id); files only replace earlier
+                uploads of the same name by the same owner
+
+        Returns:
+            Job ids, one per file, in order (existing ids for known files)
+        """
+        job_ids = []
+        with self._lock:
+            for name, data in files:
+                job_id = self.job_id(name, data, collection, owner)
+                job_ids.append(job_id)
+                if job_id in self._jobs:
+                    continue
+                self._jobs[job_id] = {
+                    "id": job_id,
+                    "name": name,
+                    "collection": collection,
+                    "owner": owner,
+                    "status": "queued",
+                    "progress": 0.0,
+                    "chunks": 0,
+                    "replaced": False,
+                    "error": None,
+                    "submitted_at": time.time(),
+                }
+                self._payloads[job_id] = data
+                self._pending.put(job_id)
+            if self._worker is None and not self._pending.empty():
+                self._worker = threading.Thread(
+                    target=self._run, name="ingestion", daemon=True)
+                self._worker.start()
+        return job_ids
+
+    def status(self, job_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Copies of the given jobs (all known jobs by default), in submission order."""
+        with self._lock:
+            if job_ids is None:
+                jobs = list(self._jobs.values())
+            else:
+                jobs = [self._jobs[j] for j in dict.fromkeys(job_ids) if j in self._jobs]
+            return [dict(job) for job in jobs]
+
+    def active(self, job_ids: Optional[Iterable[str]] = None) -> bool:
+        """Whether any of the jobs is still queued or running."""
+        return any(job["status"] in ("queued", "running") for job in self.status(job_ids))
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self):
+        while True:
+            job_id = self._pending.get()
+            with self._lock:
+                job = dict(self._jobs[job_id])
+                data = self._payloads.pop(job_id)
+            self._update(job_id, status="running")
+            try:
+                text = data.decode("utf-8")
+            except UnicodeDecodeError:
+                text = None
+            try:
+                if text is None:
+                    self._update(job_id, status="failed", error="Not a UTF-8 text file")
+                elif not text.strip():
+                    # Would otherwise be reported as added, with 0 chunks
+                    self._update(job_id, status="failed", error="Empty file")
+                else:
+                    stats = self.agent.upsert_documents(
+                        [text], [job["name"]],
+                        doc_ids=[self.doc_id(job["name"], job["collection"], job["owner"])],
+                        progress=lambda p: self._update(
+                            job_id, progress=p["chunks_done"] / p["chunks_total"]),
+                        collection=job["collection"])
+                    self._update(
+                        job_id, status="done" if stats["documents"] else "duplicate",
+                        progress=1.0, chunks=stats["chunks"],
+                        replaced=bool(stats["replaced"]))
+            except Exception as e:
+                logger.exception("Ingesting %s failed", job["name"])
+                self._update(job_id, status="failed", error=str(e))
+            self._finish(job_id)
+
+    def _finish(self, job_id: str):
+        with self._lock:
+            self._jobs[job_id]["finished_at"] = time.time()
+            self._finished.append(job_id)
+            while len(self._finished) > self.max_finished:
+                self._jobs.pop(self._finished.pop(0), None)
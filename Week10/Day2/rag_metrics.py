@@ -0,0 +1,184 @@
+"""
+Metrics for the Agentic RAG System
+==================================
+Aggregates the per-query metrics returned by AgenticRAG.query and exports
+them as Prometheus text or OpenTelemetry spans.
+
+Components:
+- MetricsRegistry: thread-safe counters and histograms with Prometheus
+  text exposition
+- emit_spans: replay one query's node timings as OpenTelemetry spans
+  (no-op when opentelemetry is not installed)
+"""
+
+import bisect
+import threading
+from typing import Dict, Any, Tuple
+
+# Latency buckets in seconds, from cache hits to slow web searches
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Sub-stage timings reported inside node metrics, exported per stage
+STAGE_FIELDS = {
+    "embedding_ms": "embedding",
+    "faiss_ms": "faiss",
+    "bm25_ms": "bm25",
+    "web_search_ms": "web_search",
+    "llm_ms": "llm",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+# ============================================
+# Metrics Registry
+# ============================================
+class MetricsRegistry:
+    """
+    Process-level aggregation of query metrics.
+
+    Exposed series:
+    - agentic_rag_queries_total{cache, status}
+    - agentic_rag_search_cache_total{status}
+    - agentic_rag_fallbacks_total{fallback}
+    - agentic_rag_hedged_requests_total{node}
+    - agentic_rag_llm_tokens_total{node, kind}
+    - agentic_rag_context_tokens_total{kind} (estimated, used / saved)
+    - agentic_rag_query_latency_seconds (histogram)
+    - agentic_rag_node_latency_seconds{node} (histogram)
+    - agentic_rag_stage_latency_seconds{stage} (histogram)
+    """
+
+    def __init__(self, prefix: str = "agentic_rag"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            series.setdefault(key, _Histogram()).observe(value)
+
+    def observe_query(self, metrics: Dict[str, Any]):
+        """Record the 'metrics' dict of one query result."""
+        self.inc("queries_total", cache=metrics.get("cache", "miss"),
+                 status="error" if metrics.get("error") else "ok")
+        self.observe("query_latency_seconds", metrics["total_ms"] / 1000)
+        for fallback in metrics.get("fallbacks", ()):
+            self.inc("fallbacks_total", fallback=fallback)
+
+        for node, record in metrics.get("nodes", {}).items():
+            self.observe("node_latency_seconds", record["wall_ms"] / 1000, node=node)
+            for field, stage in STAGE_FIELDS.items():
+                if field in record:
+                    self.observe("stage_latency_seconds", record[field] / 1000, stage=stage)
+            for kind in ("prompt_tokens", "completion_tokens"):
+                if record.get(kind):
+                    self.inc("llm_tokens_total", record[kind], node=node,
+                             kind=kind.replace("_tokens", ""))
+            if record.get("hedged"):
+                self.inc("hedged_requests_total", node=node)
+            if "search_cache" in record:
+                self.inc("search_cache_total", status=record["search_cache"])
+            if "context_tokens" in record:
+                self.inc("context_tokens_total", record["context_tokens"], kind="used")
+                self.inc("context_tokens_total", record["context_tokens_saved"],
+                         kind="saved")
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {full} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{full}{_format_labels(labels)} {value:g}")
+
+            for name, series in sorted(self._histograms.items()):
+                full = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {full} histogram")
+                for labels, hist in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        le = labels + (("le", f"{bound:g}"),)
+                        lines.append(f"{full}_bucket{_format_labels(le)} {cumulative}")
+                    inf = labels + (("le", "+Inf"),)
+                    lines.append(f"{full}_bucket{_format_labels(inf)} {hist.count}")
+                    lines.append(f"{full}_sum{_format_labels(labels)} {hist.sum:g}")
+                    lines.append(f"{full}_count{_format_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+# ============================================
+# OpenTelemetry
+# ============================================
+def emit_spans(metrics: Dict[str, Any], question: str = ""):
+    """
+    Emit one 'agentic_rag.query' span with a child span per node.
+
+    Uses the start/end timestamps recorded in the node metrics, so it can run
+    after the query has finished. Does nothing without opentelemetry-api.
+    """
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return
+
+    nodes = metrics.get("nodes", {})
+    tracer = trace.get_tracer("agentic_rag")
+    root = tracer.start_span(
+        "agentic_rag.query",
+        start_time=metrics["start_ns"],
+        attributes={
+            "agentic_rag.cache": metrics.get("cache", "miss"),
+            "agentic_rag.question_chars": len(question),
+        },
+    )
+    context = trace.set_span_in_context(root)
+    for node, record in nodes.items():
+        span = tracer.start_span(
+            f"agentic_rag.{node}",
+            context=context,
+            start_time=record["start_ns"],
+            attributes={
+                f"agentic_rag.{k}": v for k, v in record.items()
+                if k != "start_ns" and isinstance(v, (int, float, str, bool))
+            },
+        )
+        span.end(end_time=record["start_ns"] + int(record["wall_ms"] * 1e6))
+    root.end(end_time=metrics["start_ns"] + int(metrics["total_ms"] * 1e6))
@@ -0,0 +1,138 @@
+"""
+Reranking for the Agentic RAG System
+====================================
+Second-stage scoring of retrieved chunks with a local cross-encoder, used
+by the rerank node of agentic_rag.py.
+
+Components:
+- shared_cross_encoder: one sentence-transformers CrossEncoder per model
+  name and process
+- CrossEncoderReranker: batched scoring of over-fetched candidates within
+  a per-query time budget
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Small MS MARCO cross-encoder; fast enough on CPU for a few dozen pairs
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Pairs scored by a time-budgeted call before the cost per pair is known
+PROBE_BATCH = 2
+
+_models_lock = threading.Lock()
+_models: Dict[str, Any] = {}
+
+
+def shared_cross_encoder(model_name: str):
+    """CrossEncoder loaded once per process and model name."""
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is None:
+            from sentence_transformers import CrossEncoder
+
+            model = CrossEncoder(model_name, device="cpu")
+            _models[model_name] = model
+        return model
+
+
+# ============================================
+# Cross-Encoder Reranker
+# ============================================
+class CrossEncoderReranker:
+    """
+    Reorder candidates by cross-encoder relevance to the query.
+
+    At most max_candidates candidates are considered, in first-stage
+    order, and scored batch_size pairs per model call. Batches stop once
+    the next one would overrun time_budget_ms; the cost per pair is learned
+    from earlier calls, so batches shrink to fit the time that is left.
+    Until it has been measured, a budgeted call scores a PROBE_BATCH of
+    pairs first, so a cold or slow model overruns the budget by at most
+    that batch. Candidates left unscored keep their first-stage order
+    behind the scored ones.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_RERANK_MODEL,
+        max_candidates: int = 30,
+        batch_size: int = 16,
+        time_budget_ms: Optional[float] = 150.0,
+        model: Any = None,
+    ):
+        """
+        Args:
+            model_name: sentence-transformers cross-encoder to load
+            max_candidates: Candidates scored per query at most
+            batch_size: Query/passage pairs per model call
+            time_budget_ms: Scoring time per query (None = score every
+                candidate)
+            model: Cross-encoder to use instead of loading model_name
+                (predict(pairs) returning one score per pair)
+        """
+        self.model_name = model_name
+        self.max_candidates = max_candidates
+        self.batch_size = batch_size
+        self.time_budget_ms = time_budget_ms
+        self._model = model
+        # Moving average of milliseconds per scored pair (None until measured)
+        self._pair_ms: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = shared_cross_encoder(self.model_name)
+        return self._model
+
+    def _next_batch(self, remaining_ms: Optional[float], left: int) -> int:
+        size = min(self.batch_size, left)
+        if remaining_ms is None:
+            return size
+        with self._lock:
+            pair_ms = self._pair_ms
+        if pair_ms is None:
+            return min(size, PROBE_BATCH) if remaining_ms > 0 else 0
+        return max(0, min(size, int(remaining_ms / pair_ms)))
+
+    def _observe(self, pairs: int, elapsed_ms: float):
+        with self._lock:
+            per_pair = elapsed_ms / pairs
+            self._pair_ms = (
+                per_pair if self._pair_ms is None else 0.8 * self._pair_ms + 0.2 * per_pair)
+
+    def rerank(
+        self, query: str, passages: List[str], top_k: int
+    ) -> Tuple[List[int], Dict[str, Any]]:
+        """
+        Pick the top_k passages for query.
+
+        Returns:
+            (order, stats): indices into passages, best first, and
+            rerank_ms / candidates / scored counts for the node metrics
+        """
+        start = time.perf_counter()
+        candidates = passages[:self.max_candidates]
+        scores: List[float] = []
+        while len(scores) < len(candidates):
+            remaining_ms = None
+            if self.time_budget_ms is not None:
+                remaining_ms = self.time_budget_ms - (time.perf_counter() - start) * 1000
+            size = self._next_batch(remaining_ms, len(candidates) - len(scores))
+            if size == 0:
+                break
+            batch_start = time.perf_counter()
+            batch = candidates[len(scores):len(scores) + size]
+            scores.extend(
+                float(s) for s in self.model.predict([(query, p) for p in batch]))
+            self._observe(size, (time.perf_counter() - batch_start) * 1000)
+
+        scored = sorted(range(len(scores)), key=lambda i: -scores[i])
+        order = scored + list(range(len(scores), len(passages)))
+        return order[:top_k], {
+            "rerank_ms": (time.perf_counter() - start) * 1000,
+            "candidates": len(candidates),
+            "scored": len(scores),
+        }
@@ -0,0 +1,181 @@
+"""
+Resilience Helpers for the Agentic RAG System
+=============================================
+Bounded, fail-fast calls to the Groq and Tavily upstreams used by
+agentic_rag.py.
+
+Components:
+- CircuitBreaker: stop calling an upstream after repeated failures
+- call_with_timeout / acall_with_timeout: wait at most a timeout for an
+  upstream call; with hedge_after, a second identical request races the
+  first if it is slow
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class UpstreamTimeout(TimeoutError):
+    """An upstream call did not finish within its timeout."""
+
+
+class CircuitOpenError(RuntimeError):
+    """The upstream's circuit breaker is open; the call was not attempted."""
+
+
+# ============================================
+# Circuit Breaker
+# ============================================
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed: calls go through. After failure_threshold consecutive failures
+    (timeouts included) it opens, and check() rejects calls for
+    cooldown_seconds. It then lets a single trial call through (half-open):
+    success closes it, failure opens it for another cooldown.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may be made now."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "closed":
+                return
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "rejected": self.rejected,
+            }
+
+
+# ============================================
+# Timeouts and Hedging
+# ============================================
+def call_with_timeout(
+    fn: Callable[[], Any],
+    timeout: Optional[float],
+    pool: concurrent.futures.Executor,
+    hedge_after: Optional[float] = None,
+) -> Tuple[Any, bool]:
+    """
+    Run fn() on pool and wait at most timeout seconds (None = no limit).
+
+    If hedge_after seconds pass without a result, fn() is started a second
+    time and whichever call succeeds first wins. Calls run with a copy of
+    the caller's context, so LangChain callbacks (token streaming) still
+    reach the caller. A call that times out keeps running in the
+    background; its result is discarded.
+
+    Returns:
+        (result, hedged)
+
+    Raises:
+        UpstreamTimeout, or the last call's exception if all calls failed
+    """
+    if timeout is not None and timeout <= 0:
+        raise UpstreamTimeout("latency budget exhausted")
+    deadline = None if timeout is None else time.monotonic() + timeout
+    futures = [pool.submit(contextvars.copy_context().run, fn)]
+    hedged = False
+    if hedge_after is not None and (timeout is None or hedge_after < timeout):
+        done, _ = concurrent.futures.wait(futures, timeout=hedge_after)
+        if not done:
+            futures.append(pool.submit(contextvars.copy_context().run, fn))
+            hedged = True
+
+    error = None
+    while futures:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            break
+        done, pending = concurrent.futures.wait(
+            futures, timeout=remaining, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result(), hedged
+            error = future.exception()
+        futures = list(pending)
+
+    if futures or error is None:
+        raise UpstreamTimeout(f"no response within {timeout * 1000:.0f} ms")
+    raise error
+
+
+async def acall_with_timeout(
+    factory: Callable[[], Awaitable[Any]],
+    timeout: Optional[float],
+    hedge_after: Optional[float] = None,
+) -> Tuple[Any, bool]:
+    """Async call_with_timeout(); losing and timed-out calls are cancelled."""
+    if timeout is not None and timeout <= 0:
+        raise UpstreamTimeout("latency budget exhausted")
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    tasks = [asyncio.ensure_future(factory())]
+    hedged = False
+    try:
+        if hedge_after is not None and (timeout is None or hedge_after < timeout):
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                tasks.append(asyncio.ensure_future(factory()))
+                hedged = True
+
+        error = None
+        while tasks:
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = await asyncio.wait(
+                tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), hedged
+                error = task.exception()
+            tasks = list(pending)
+
+        if tasks or error is None:
+            raise UpstreamTimeout(f"no response within {timeout * 1000:.0f} ms")
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,518 @@
+"""
+Retrieval Helpers for the Agentic RAG System
+============================================
+Lexical retrieval and rank fusion used alongside FAISS in agentic_rag.py.
+
+Components:
+- BM25Index: incremental in-process inverted index with BM25 scoring
+- reciprocal_rank_fusion: merge ranked lists from several retrievers
+- pack_context: dedupe and rank passages into a prompt token budget
+- IndexSpec: FAISS index type (flat, IVF-Flat, IVF-PQ, HNSW) and its tuning
+- exclusion_selector / visible_selector / search_params / compact_index:
+  searching around deleted (or not yet published) positions and
+  rewriting an index without them
+"""
+
+import logging
+import math
+import pickle
+import re
+import threading
+from array import array
+from dataclasses import dataclass, asdict
+from typing import AbstractSet, List, Dict, Tuple, Iterable, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Very common English words carry no ranking signal and have huge postings
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how in is it its of on or
+that the their this to was were what when where which who why will with
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; identifiers like search_depth stay whole."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+# ============================================
+# BM25 Index
+# ============================================
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring.
+
+    Documents are identified by their insertion position, which matches
+    their position in the FAISS index they are indexed alongside. Postings
+    are kept as parallel array('I') columns (doc ids, term frequencies), so
+    each posting costs 8 bytes instead of a Python tuple per entry, and a
+    search scores them with numpy, straight over those buffers.
+
+    copy() is cheap: postings are shared with the copy and a term's arrays
+    are only duplicated when the copy first appends to them, so the
+    original can keep serving searches while the copy is extended.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._term_ids: Dict[str, int] = {}
+        self._doc_ids: List[array] = []     # per term: ascending doc positions
+        self._freqs: List[array] = []       # per term: term frequency in doc
+        self._doc_lengths = array("I")
+        self._total_length = 0
+        self._owned = set()                 # term ids whose arrays are not shared
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def copy(self) -> "BM25Index":
+        """Copy-on-write copy; appending to it leaves this index unchanged."""
+        with self._lock:
+            index = BM25Index(k1=self.k1, b=self.b)
+            index._term_ids = dict(self._term_ids)
+            index._doc_ids = list(self._doc_ids)
+            index._freqs = list(self._freqs)
+            index._doc_lengths = array("I", self._doc_lengths)
+            index._total_length = self._total_length
+            # Shared from now on, in both directions
+            self._owned = set()
+        return index
+
+    def add(self, texts: Iterable[str]):
+        """Append documents; their positions continue from len(self)."""
+        with self._lock:
+            for text in texts:
+                doc = len(self._doc_lengths)
+                tokens = tokenize(text)
+                counts: Dict[str, int] = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+
+                for token, count in counts.items():
+                    term = self._term_ids.get(token)
+                    if term is None:
+                        term = len(self._doc_ids)
+                        self._term_ids[token] = term
+                        self._doc_ids.append(array("I"))
+                        self._freqs.append(array("I"))
+                        self._owned.add(term)
+                    elif term not in self._owned:
+                        self._doc_ids[term] = array("I", self._doc_ids[term])
+                        self._freqs[term] = array("I", self._freqs[term])
+                        self._owned.add(term)
+                    self._doc_ids[term].append(doc)
+                    self._freqs[term].append(count)
+
+                self._doc_lengths.append(len(tokens))
+                self._total_length += len(tokens)
+
+    def search(
+        self, query: str, k: int, exclude: Optional[AbstractSet[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-k (position, score) pairs, best first.
+
+        Positions in exclude (deleted chunks) are skipped; they still count
+        towards document frequencies and the average length until the index
+        is rebuilt without them.
+        """
+        import numpy as np
+
+        n_docs = len(self._doc_lengths)
+        if not n_docs or k <= 0:
+            return []
+        avg_length = self._total_length / n_docs
+        lengths = np.frombuffer(self._doc_lengths, dtype=np.uintc)
+
+        postings, contributions = [], []
+        for token in set(tokenize(query)):
+            term = self._term_ids.get(token)
+            if term is None:
+                continue
+            doc_ids = np.frombuffer(self._doc_ids[term], dtype=np.uintc)
+            tf = np.frombuffer(self._freqs[term], dtype=np.uintc).astype(np.float64)
+            df = len(doc_ids)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[doc_ids] / avg_length)
+            postings.append(doc_ids)
+            contributions.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not postings:
+            return []
+
+        matches, scores = np.concatenate(postings), np.concatenate(contributions)
+        if len(postings) > 1:
+            if len(matches) * 8 > n_docs:
+                # Summed per document in one pass over a dense score array
+                dense = np.bincount(matches, weights=scores)
+                matches = np.flatnonzero(dense)  # every match scores > 0 (idf > 0)
+                scores = dense[matches]
+            else:
+                matches, inverse = np.unique(matches, return_inverse=True)
+                scores = np.bincount(inverse, weights=scores)
+        if exclude:
+            if len(matches) < len(exclude):
+                kept = np.fromiter((doc not in exclude for doc in matches.tolist()),
+                                   dtype=bool, count=len(matches))
+            else:
+                excluded = np.fromiter(exclude, dtype=np.int64, count=len(exclude))
+                kept = ~np.isin(matches, excluded)
+            matches, scores = matches[kept], scores[kept]
+        if len(matches) > k:
+            # Everything tied with the k-th best, so ties resolve below
+            top = np.flatnonzero(scores >= np.partition(scores, -k)[-k])
+            matches, scores = matches[top], scores[top]
+        # Best first, ties in position order
+        order = np.lexsort((matches, -scores))[:k]
+        return [(int(matches[i]), float(scores[i])) for i in order]
+
+    def save(self, path: str):
+        with self._lock:
+            state = (self.k1, self.b, self._term_ids, self._doc_ids,
+                     self._freqs, self._doc_lengths, self._total_length)
+        with open(path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, "rb") as f:
+            (k1, b, term_ids, doc_ids, freqs,
+             doc_lengths, total_length) = pickle.load(f)
+        index = cls(k1=k1, b=b)
+        index._term_ids, index._doc_ids, index._freqs = term_ids, doc_ids, freqs
+        index._doc_lengths, index._total_length = doc_lengths, total_length
+        index._owned = set(range(len(doc_ids)))
+        return index
+
+
+# ============================================
+# Rank Fusion
+# ============================================
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[int]:
+    """
+    Fuse ranked lists of ids: score(d) = sum over lists of 1 / (k + rank).
+
+    Ids ranked highly by any retriever rise to the top without needing the
+    retrievers' raw scores to be comparable.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+# ============================================
+# Context Packing
+# ============================================
+def estimate_tokens(text: str) -> int:
+    """Fast token estimate (~4 characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def _overlap(left: str, right: str, max_overlap: int, min_overlap: int) -> int:
+    """Length of the longest suffix of left that is also a prefix of right."""
+    for size in range(min(max_overlap, len(left), len(right)), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def pack_context(
+    ranked_lists: List[List[Dict[str, str]]],
+    token_budget: Optional[int],
+    max_overlap: int = 200,
+    min_overlap: int = 20,
+    min_passage_tokens: int = 32,
+) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+    """
+    Select passages for the synthesis prompt.
+
+    Each ranked list holds {"label", "content"} passages, best first, with
+    an optional "score": relevance on a common 0-1 scale (e.g. vector
+    similarity for retrieved chunks, the search API's score for web
+    results). Lists are merged by score, so a strong second hit of one
+    list is packed before a weak first hit of another; a list keeps its
+    own order (a score never ranks a passage above an earlier one of its
+    list). Passages without a score fall back to reciprocal rank. Then:
+
+    - passages contained in an already packed passage are dropped, and text
+      shared with a neighbouring chunk (the splitter overlap) is cut once;
+    - passages are added until token_budget (None = unlimited) is reached;
+      the first one that does not fit is truncated at a word boundary if at
+      least min_passage_tokens remain.
+
+    Returns:
+        (passages, stats): stats has tokens_in (all passages as given),
+        tokens_out, tokens_saved, passages_in and passages_out.
+    """
+    scored = []
+    for order, ranking in enumerate(ranked_lists):
+        ceiling = math.inf
+        for rank, passage in enumerate(ranking, start=1):
+            score = passage.get("score")
+            ceiling = min(ceiling, 1.0 / rank if score is None else score)
+            scored.append((ceiling, order, rank, passage))
+    scored.sort(key=lambda item: (-item[0], item[1], item[2]))
+
+    tokens_in = sum(estimate_tokens(p["content"]) for *_, p in scored)
+    packed: List[Dict[str, str]] = []
+    originals: List[str] = []   # untrimmed text of the packed passages
+    used = 0
+    for *_, passage in scored:
+        original = passage["content"].strip()
+        if not original or any(original in kept for kept in originals):
+            continue
+        content = original
+        for kept in originals:
+            content = content[_overlap(kept, content, max_overlap, min_overlap):]
+            cut = _overlap(content, kept, max_overlap, min_overlap)
+            if cut:
+                content = content[:-cut]
+        content = content.strip()
+        if not content:
+            continue
+
+        remaining = None if token_budget is None else token_budget - used
+        tokens = estimate_tokens(content)
+        if remaining is not None and tokens > remaining:
+            if remaining < min(min_passage_tokens, token_budget):
+                break
+            content = content[:remaining * 4 - 4].rsplit(" ", 1)[0] + " …"
+            tokens = estimate_tokens(content)
+        packed.append({**passage, "content": content})
+        originals.append(original)
+        used += tokens
+        if remaining is not None and tokens >= remaining:
+            break
+
+    return packed, {
+        "tokens_in": tokens_in,
+        "tokens_out": used,
+        "tokens_saved": tokens_in - used,
+        "passages_in": len(scored),
+        "passages_out": len(packed),
+    }
+
+
+# ============================================
+# Vector Index Specs
+# ============================================
+INDEX_KINDS = ("flat", "ivf-flat", "ivf-pq", "hnsw")
+
+# FAISS warns below this many training points per IVF cell
+_MIN_POINTS_PER_CELL = 39
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """
+    FAISS index type for the knowledge base (L2 distance throughout).
+
+    - flat: exact search, 4 * dim bytes per vector, cost linear in corpus
+    - ivf-flat: vectors bucketed into nlist k-means cells; a query scans
+      the nprobe nearest cells
+    - ivf-pq: IVF with product-quantized codes of pq_m * pq_bits bits per
+      vector (dim must be divisible by pq_m); distances are approximate
+    - hnsw: navigable small-world graph, no training; ef_search sets the
+      candidate list size per query
+
+    IVF kinds are trained on up to train_size vectors. nlist is capped for
+    small corpora, and ivf-pq falls back to ivf-flat when there are fewer
+    vectors than PQ centroids; degraded() tells when a corpus has grown
+    enough for such an index to be retrained as specified.
+    """
+    kind: str = "flat"
+    nlist: int = 1024
+    nprobe: int = 16
+    pq_m: int = 16
+    pq_bits: int = 8
+    hnsw_m: int = 32
+    ef_construction: int = 80
+    ef_search: int = 64
+    train_size: int = 100_000
+
+    def __post_init__(self):
+        if self.kind not in INDEX_KINDS:
+            raise ValueError(f"kind must be one of {INDEX_KINDS}, got {self.kind!r}")
+
+    def build_params(self) -> Dict[str, Any]:
+        """Parameters that determine the index contents (search params excluded)."""
+        params = asdict(self)
+        del params["nprobe"], params["ef_search"]
+        return params
+
+    def _ivf_shape(self, n_train: int) -> Tuple[int, bool]:
+        """(nlist, whether PQ-coded) of the IVF index built for n_train vectors."""
+        nlist = max(1, min(self.nlist, n_train // _MIN_POINTS_PER_CELL))
+        return nlist, self.kind == "ivf-pq" and n_train >= 2 ** self.pq_bits
+
+    def factory_string(self, n_train: int) -> str:
+        """faiss.index_factory description for a corpus of n_train vectors."""
+        if self.kind == "flat":
+            return "Flat"
+        if self.kind == "hnsw":
+            return f"HNSW{self.hnsw_m}"
+
+        nlist, pq = self._ivf_shape(n_train)
+        if pq:
+            return f"IVF{nlist},PQ{self.pq_m}x{self.pq_bits}"
+        if self.kind == "ivf-pq":
+            logger.warning(
+                "%d vectors are too few to train PQ%dx%d; using IVF%d,Flat",
+                n_train, self.pq_m, self.pq_bits, nlist)
+        return f"IVF{nlist},Flat"
+
+    def build(self, vectors):
+        """
+        Create an empty, trained and tuned index for vectors (float32, n x dim).
+
+        The vectors are only used for training; add them afterwards.
+        """
+        import faiss
+        import numpy as np
+
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        if self.kind == "ivf-pq" and dim % self.pq_m:
+            raise ValueError(f"pq_m={self.pq_m} must divide the embedding dimension {dim}")
+
+        index = faiss.index_factory(dim, self.factory_string(n), faiss.METRIC_L2)
+        if self.kind == "hnsw":
+            index.hnsw.efConstruction = self.ef_construction
+        if not index.is_trained:
+            if n > self.train_size:
+                sample = np.random.default_rng(0).choice(n, self.train_size, replace=False)
+                vectors = vectors[np.sort(sample)]
+            index.train(vectors)
+        self.tune(index)
+        return index
+
+    def degraded(self, index, n: int) -> Optional[str]:
+        """
+        Why an IVF index trained on a smaller corpus is too coarse for n
+        vectors, or None: it is IVF-Flat where this spec builds IVF-PQ, or
+        the spec now gives it at least twice as many cells (so retraining
+        as a corpus grows happens a logarithmic number of times).
+        """
+        import faiss
+
+        if self.kind not in ("ivf-flat", "ivf-pq") or not isinstance(index, faiss.Index):
+            return None
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is None:
+            return None
+        nlist, pq = self._ivf_shape(n)
+        if pq and not isinstance(ivf, faiss.IndexIVFPQ):
+            return f"IVF{ivf.nlist},Flat holds {n} vectors; spec is {self.factory_string(n)}"
+        if nlist >= 2 * ivf.nlist:
+            return f"IVF{ivf.nlist} holds {n} vectors; spec is {self.factory_string(n)}"
+        return None
+
+    def tune(self, index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Set the search-time recall/latency knob (defaults to this spec's value)."""
+        import faiss
+
+        if self.kind in ("ivf-flat", "ivf-pq"):
+            faiss.extract_index_ivf(index).nprobe = nprobe or self.nprobe
+        elif self.kind == "hnsw":
+            index.hnsw.efSearch = ef_search or self.ef_search
+
+
+# ============================================
+# Deleted Positions
+# ============================================
+def exclusion_selector(positions: Iterable[int]):
+    """FAISS IDSelector matching every position except the given ones."""
+    import faiss
+    import numpy as np
+
+    batch = faiss.IDSelectorBatch(np.fromiter(positions, dtype=np.int64))
+    selector = faiss.IDSelectorNot(batch)
+    # IDSelectorNot does not own the wrapped selector
+    selector.referenced_objects = [batch]
+    return selector
+
+
+def visible_selector(ntotal: int, positions: Iterable[int] = ()):
+    """
+    FAISS IDSelector matching positions below ntotal except the given ones,
+    for an index that has been appended to past what a reader may see.
+    """
+    import faiss
+
+    selector = faiss.IDSelectorRange(0, ntotal)
+    excluded = list(positions)
+    if not excluded:
+        return selector
+    exclusion = exclusion_selector(excluded)
+    both = faiss.IDSelectorAnd(selector, exclusion)
+    both.referenced_objects = [selector, exclusion]
+    return both
+
+
+def search_params(index, selector):
+    """
+    Search parameters restricting index to selector, carrying over the
+    index's own nprobe / efSearch (parameter objects default to 1 / 16).
+    """
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def compact_index(index, keep, vectors=None, spec: Optional[IndexSpec] = None):
+    """
+    Copy of index holding only the vectors at positions keep, renumbered
+    0 .. len(keep) - 1 in that order.
+
+    The copy keeps the original's training (IVF centroids, PQ codebooks)
+    and search settings, so nothing is retrained, unless spec is given:
+    then it is a new index of that spec trained on the kept vectors.
+    Without vectors, they are reconstructed from the index: exact for
+    flat, ivf-flat and hnsw, the decoded codes for ivf-pq.
+    """
+    import faiss
+    import numpy as np
+
+    keep = np.asarray(keep, dtype=np.int64)
+    if spec is not None:
+        if vectors is None:
+            vectors = _reconstruct(index, keep)
+        retrained = spec.build(vectors)
+        retrained.add(np.ascontiguousarray(vectors, dtype=np.float32))
+        return retrained
+
+    compacted = faiss.clone_index(index)
+    ivf = faiss.try_extract_index_ivf(compacted)
+    if vectors is None:
+        if ivf is not None:
+            # IVF lists are keyed by id; a direct map makes them addressable
+            ivf.make_direct_map()
+        vectors = compacted.reconstruct_batch(keep) if len(keep) else None
+    compacted.reset()
+    if ivf is not None:
+        ivf.make_direct_map(False)
+    if vectors is not None and len(keep):
+        compacted.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    return compacted
+
+
+def _reconstruct(index, keep):
+    """Vectors at positions keep, read back from index (see compact_index)."""
+    import faiss
+
+    copy = faiss.clone_index(index)
+    ivf = faiss.try_extract_index_ivf(copy)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return copy.reconstruct_batch(keep)
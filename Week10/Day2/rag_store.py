@@ -0,0 +1,441 @@
+"""
+Chunk Store for the Agentic RAG System
+======================================
+On-disk chunk text, metadata and embeddings, used by agentic_rag.py with
+chunk_store=True in place of the LangChain FAISS store's in-memory
+docstore.
+
+Components:
+- ChunkStore: append-only record segment with an offsets array and a
+  float32 embedding matrix, all memory-mapped read-only
+- MemmapFlatIndex: exact L2 search straight over the mapped matrix
+- DiskVectorStore: the part of the LangChain FAISS store interface that
+  AgenticRAG uses, backed by a ChunkStore, plus compact() to rewrite it
+  without deleted chunks
+- UpdateLog: uploads to a saved LangChain FAISS store since its last full
+  save, so persisting one costs what it added
+
+Only the records a query returns are read and decoded, and the mapped
+pages live in the OS page cache, so several worker processes serving the
+same index share them.
+"""
+
+import json
+import os
+import pickle
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+STORE_FILE = "chunks.json"
+ANN_FILE = "chunks.faiss"
+UPDATE_LOG = "updates.log"
+
+# Rows of the embedding matrix scanned per faiss.knn call
+SCAN_BLOCK = 65536
+
+
+def _map(path: str, dtype, shape):
+    if not shape[0]:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def _write_json(path: str, payload: Dict[str, Any]):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# ============================================
+# Chunk Store
+# ============================================
+class ChunkStore:
+    """
+    Immutable view of the first `count` chunks of an on-disk store.
+
+    Files (per generation g):
+    - chunks.<g>.seg: one JSON record {"text", "metadata"} per line
+    - chunks.<g>.off: uint64 byte offsets, count + 1 of them
+    - chunks.<g>.f32: count x dim float32 embeddings
+    - chunks.json: generation, count, dim and segment size of the last
+      committed view; written last, so a crashed append is ignored
+
+    append() writes past this view's end and returns a longer view, leaving
+    this one valid; readers never need a lock. A new generation (create())
+    starts fresh files, so views of the old one keep working until dropped.
+    """
+
+    def __init__(self, path: str, generation: int = 0, count: int = 0,
+                 dim: int = 0, segment_bytes: int = 0):
+        self.path = path
+        self.generation = generation
+        self.count = count
+        self.dim = dim
+        self.segment_bytes = segment_bytes
+        self._offsets = _map(self._file("off"), np.uint64, (count + 1,) if count else (0,))
+        self._segment = _map(self._file("seg"), np.uint8, (segment_bytes,))
+        self._vectors = _map(self._file("f32"), np.float32, (count, dim))
+
+    def _file(self, kind: str) -> str:
+        return os.path.join(self.path, f"chunks.{self.generation}.{kind}")
+
+    @classmethod
+    def create(cls, path: str) -> "ChunkStore":
+        """Empty store in a new generation (previous files are removed on commit)."""
+        os.makedirs(path, exist_ok=True)
+        previous = cls.open(path)
+        return cls(path, previous.generation + 1 if previous else 0)
+
+    @classmethod
+    def open(cls, path: str) -> Optional["ChunkStore"]:
+        """The last committed view, or None if nothing was committed."""
+        try:
+            with open(os.path.join(path, STORE_FILE)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(path, state["generation"], state["count"], state["dim"],
+                   state["segment_bytes"])
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """count x dim embedding matrix (memory-mapped)."""
+        return self._vectors
+
+    def record(self, position: int) -> Tuple[str, Dict[str, Any]]:
+        """(text, metadata) of one chunk; only its bytes are read."""
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        record = json.loads(self._segment[start:end].tobytes())
+        return record["text"], record["metadata"]
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for position in range(self.count):
+            yield self.record(position)
+
+    def append(self, texts: Sequence[str], metadatas: Sequence[Dict[str, Any]],
+               vectors) -> "ChunkStore":
+        """Write chunks after this view's end and return the longer view (not yet committed)."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return self
+        dim = self.dim or vectors.shape[1]
+        if vectors.shape != (len(texts), dim):
+            raise ValueError(f"expected {len(texts)} x {dim} vectors, got {vectors.shape}")
+
+        records = [
+            (json.dumps({"text": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+            .encode("utf-8")
+            for text, metadata in zip(texts, metadatas)
+        ]
+        ends = self.segment_bytes + np.cumsum([len(r) for r in records], dtype=np.uint64)
+        offsets = ends if self.count else np.concatenate([[0], ends]).astype(np.uint64)
+
+        # Anything past this view's end is left over from an uncommitted append
+        for kind, size, data in (
+            ("seg", self.segment_bytes, b"".join(records)),
+            ("off", (self.count + 1) * 8 if self.count else 0, offsets.tobytes()),
+            ("f32", self.count * dim * 4, vectors.tobytes()),
+        ):
+            path = self._file(kind)
+            with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+                f.truncate(size)
+                f.seek(size)
+                f.write(data)
+        return ChunkStore(self.path, self.generation, self.count + len(texts), dim,
+                          int(ends[-1]))
+
+    def commit(self):
+        """Make this view the one open() returns, and drop older generations' files."""
+        for kind in ("seg", "off", "f32"):
+            if os.path.exists(self._file(kind)):
+                with open(self._file(kind), "rb+") as f:
+                    os.fsync(f.fileno())
+        _write_json(os.path.join(self.path, STORE_FILE), {
+            "generation": self.generation,
+            "count": self.count,
+            "dim": self.dim,
+            "segment_bytes": self.segment_bytes,
+        })
+        # Open maps of old views stay readable after unlinking (POSIX)
+        for name in os.listdir(self.path):
+            parts = name.split(".")
+            if (len(parts) == 3 and parts[0] == "chunks" and parts[1].isdigit()
+                    and int(parts[1]) != self.generation):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+
+# ============================================
+# Exact Search over the Mapped Matrix
+# ============================================
+class MemmapFlatIndex:
+    """
+    Read-only stand-in for faiss.IndexFlatL2 over a ChunkStore's matrix.
+
+    Scans SCAN_BLOCK rows per faiss.knn call, so memory stays bounded by
+    the block size whatever the corpus size.
+    """
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    @property
+    def ntotal(self) -> int:
+        return len(self.store)
+
+    def search(self, queries, k: int, exclude: Optional[np.ndarray] = None):
+        """
+        (distances, indices) like faiss: squared L2, -1 for missing hits.
+
+        Args:
+            exclude: Sorted positions (deleted chunks) never to return
+        """
+        import faiss
+
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        n_queries = queries.shape[0]
+        best_d = np.full((n_queries, k), np.inf, dtype=np.float32)
+        best_i = np.full((n_queries, k), -1, dtype=np.int64)
+        vectors = self.store.vectors
+        for start in range(0, len(self.store), SCAN_BLOCK):
+            block = vectors[start:start + SCAN_BLOCK]
+            skipped = None
+            if exclude is not None and len(exclude):
+                lo, hi = np.searchsorted(exclude, [start, start + len(block)])
+                skipped = exclude[lo:hi]
+            # Over-fetch by the block's excluded rows, then drop them
+            block_k = min(k + (len(skipped) if skipped is not None else 0), len(block))
+            d, i = faiss.knn(queries, block, block_k)
+            i = np.where(i >= 0, i + start, -1)
+            if skipped is not None and len(skipped):
+                hidden = np.isin(i, skipped)
+                d, i = np.where(hidden, np.inf, d), np.where(hidden, -1, i)
+            merged_d = np.concatenate([best_d, d], axis=1)
+            merged_i = np.concatenate([best_i, i], axis=1)
+            order = np.argsort(merged_d, axis=1, kind="stable")[:, :k]
+            best_d = np.take_along_axis(merged_d, order, axis=1)
+            best_i = np.take_along_axis(merged_i, order, axis=1)
+        return best_d, best_i
+
+
+# ============================================
+# Vector Store
+# ============================================
+class DiskVectorStore:
+    """
+    Vector store over a ChunkStore with the interface AgenticRAG uses on
+    LangChain's FAISS store (index, add_embeddings, save_local).
+
+    Flat (exact) search reads the mapped matrix through MemmapFlatIndex.
+    Approximate index kinds keep their FAISS index in memory, as with the
+    LangChain store (ivf-pq codes are compact; ivf-flat and hnsw hold full
+    vectors).
+    """
+
+    # AgenticRAG normalizes query vectors when a store asks for it
+    _normalize_L2 = False
+
+    def __init__(self, store: ChunkStore, embedding_function=None, ann_index=None):
+        self.store = store
+        self.embedding_function = embedding_function
+        self.ann_index = ann_index
+        self.index = ann_index if ann_index is not None else MemmapFlatIndex(store)
+
+    @classmethod
+    def create(cls, path: str, embedding_function=None, ann_index=None) -> "DiskVectorStore":
+        """
+        Empty store at path, replacing any committed one once saved.
+
+        Args:
+            ann_index: Empty, trained FAISS index for approximate search
+                (None searches the mapped matrix exactly)
+        """
+        return cls(ChunkStore.create(path), embedding_function, ann_index)
+
+    @classmethod
+    def load(cls, path: str, embedding_function=None) -> "DiskVectorStore":
+        """Open the committed store at path (raises ValueError if there is none)."""
+        import faiss
+
+        store = ChunkStore.open(path)
+        if store is None:
+            raise ValueError(f"no chunk store in {path}")
+        ann_index = None
+        ann_path = os.path.join(path, ANN_FILE)
+        if os.path.exists(ann_path):
+            ann_index = faiss.read_index(ann_path)
+            if ann_index.ntotal > len(store):
+                raise ValueError(
+                    f"{ANN_FILE} holds {ann_index.ntotal} vectors, store has {len(store)}")
+            # Written by full saves only: add the vectors committed since
+            for start in range(ann_index.ntotal, len(store), SCAN_BLOCK):
+                ann_index.add(np.ascontiguousarray(store.vectors[start:start + SCAN_BLOCK]))
+        return cls(store, embedding_function, ann_index)
+
+    def clone(self) -> "DiskVectorStore":
+        """
+        Store that can be appended to without changing what this one
+        returns. The ANN index is shared, not copied: callers restrict
+        searches of it to the positions they have published. Vectors left
+        in it by an abandoned append get empty placeholder chunks, so
+        positions line up again (callers treat them as deleted).
+        """
+        store = self.store
+        if self.ann_index is not None and self.ann_index.ntotal > len(store):
+            missing = self.ann_index.ntotal - len(store)
+            store = store.append([""] * missing, [{}] * missing,
+                                 np.zeros((missing, store.dim), dtype=np.float32))
+        return DiskVectorStore(store, self.embedding_function, self.ann_index)
+
+    def add_embeddings(self, text_embeddings, metadatas: Optional[List[Dict]] = None,
+                       add_vectors: Optional[Callable[[np.ndarray], None]] = None):
+        """
+        Append chunks past this view's end.
+
+        Args:
+            add_vectors: Adds the new vectors to the ANN index in place of
+                ann_index.add (e.g. under a lock searches of it take)
+        """
+        pairs = list(text_embeddings)
+        if not pairs:
+            return
+        texts = [text for text, _ in pairs]
+        vectors = np.asarray([vector for _, vector in pairs], dtype=np.float32)
+        self.store = self.store.append(texts, metadatas or [{}] * len(texts), vectors)
+        if self.ann_index is not None:
+            (add_vectors or self.ann_index.add)(vectors)
+        else:
+            self.index = MemmapFlatIndex(self.store)
+
+    def compact(self, keep: Sequence[int], spec=None) -> "DiskVectorStore":
+        """
+        Store holding only the chunks at positions keep, renumbered in that
+        order, in a new generation; this one stays readable and is replaced
+        on disk by save_local. With an IndexSpec, the ANN index is retrained
+        as that spec on the kept vectors.
+        """
+        from rag_retrieval import compact_index
+
+        keep = np.asarray(keep, dtype=np.int64)
+        store = ChunkStore.create(self.store.path)
+        for start in range(0, len(keep), SCAN_BLOCK):
+            block = keep[start:start + SCAN_BLOCK]
+            records = [self.store.record(int(position)) for position in block]
+            store = store.append([text for text, _ in records],
+                                 [metadata for _, metadata in records],
+                                 self.store.vectors[block])
+        ann_index = None
+        if self.ann_index is not None:
+            # Exact vectors from the matrix; the ANN index keeps its training
+            # unless a spec asks for it to be retrained
+            ann_index = compact_index(self.ann_index, keep, store.vectors, spec)
+        return DiskVectorStore(store, self.embedding_function, ann_index)
+
+    def save_local(self, folder_path: str, index: bool = True):
+        """
+        Commit the store in its own directory, and write the approximate
+        index unless index is False (load() re-adds the vectors committed
+        after the written index was).
+        """
+        import faiss
+
+        if os.path.abspath(folder_path) != os.path.abspath(self.store.path):
+            raise ValueError(f"chunk store lives in {self.store.path}, not {folder_path}")
+        ann_path = os.path.join(self.store.path, ANN_FILE)
+        if index and self.ann_index is not None:
+            faiss.write_index(self.ann_index, ann_path + ".tmp")
+            os.replace(ann_path + ".tmp", ann_path)
+        elif index and os.path.exists(ann_path):
+            os.remove(ann_path)
+        self.store.commit()
+
+    def document(self, position: int):
+        """LangChain Document for one FAISS position."""
+        from langchain_core.documents import Document
+
+        text, metadata = self.store.record(position)
+        return Document(page_content=text, metadata=metadata)
+
+    def iter_chunks(self, start: int = 0) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(text, metadata) of every chunk from position start on, in position order."""
+        return (self.store.record(position) for position in range(start, len(self.store)))
+
+
+# ============================================
+# Update Log
+# ============================================
+class UpdateLog:
+    """
+    Chunks added to a saved LangChain FAISS store since its last full
+    save_local, one pickled batch per upload: (first position, texts,
+    metadatas, float32 vectors).
+
+    save_local rewrites the whole index and docstore pickle; appending a
+    batch here costs what the upload added. Loading replays the batches
+    onto the saved store, and the next full save clears the log.
+    """
+
+    def __init__(self, index_dir: str):
+        self.path = os.path.join(index_dir, UPDATE_LOG)
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def append(self, first: int, texts: Sequence[str], metadatas: Sequence[Dict[str, Any]],
+               vectors):
+        record = pickle.dumps(
+            (first, list(texts), list(metadatas), np.ascontiguousarray(vectors, dtype=np.float32)),
+            protocol=pickle.HIGHEST_PROTOCOL)
+        with open(self.path, "ab") as f:
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def truncate(self, size: int):
+        """Drop everything past size bytes (batches whose upload was not saved)."""
+        if os.path.exists(self.path):
+            os.truncate(self.path, size)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def replay(self, start: int, end: int) -> Iterator[Tuple[int, List[str], List[Dict], Any]]:
+        """
+        Logged batches within positions start .. end - 1, in order.
+
+        Batches before start are already in the full save. The file is cut
+        at the first batch reaching past end (logged, but the manifest
+        publishing it was never written) or torn by a crash.
+        """
+        kept = 0
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            while True:
+                try:
+                    first, texts, metadatas, vectors = pickle.load(f)
+                except Exception:
+                    # End of the log, or a record cut short
+                    break
+                if first + len(texts) > end:
+                    break
+                if first + len(texts) > start:
+                    yield first, texts, metadatas, vectors
+                kept = f.tell()
+        if kept < self.size():
+            self.truncate(kept)
@@ -0,0 +1,78 @@
+"""
+Circuit breaker tests for the web search path of agentic_rag.py.
+
+Offline (benchmark.py stand-ins). Run from this directory:
+    python -m pytest test_rag_resilience.py
+"""
+
+import time
+
+from benchmark import StubSearch, offline_agent
+
+
+class FlakySearch(StubSearch):
+    """StubSearch that fails while failing is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.failing = False
+
+    def invoke(self, query, **kwargs):
+        if self.failing:
+            raise RuntimeError("search is down")
+        return super().invoke(query, **kwargs)
+
+
+def _agent(search):
+    # One failure opens the circuit; cached results go stale as it cools down
+    return offline_agent(search_tool=search, breaker_failures=1, breaker_cooldown=0.05,
+                         search_cache_ttl=0.05)
+
+
+def _wait_for_refreshes(agent, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while agent.search_cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not agent.search_cache._refreshing
+
+
+def _search(agent, question):
+    update = agent._web_search_node({"query": question})
+    return update["metrics"][0].get("search_cache"), update.get("fallbacks", [])
+
+
+def test_stale_refresh_closes_half_open_breaker():
+    search = FlakySearch()
+    agent = _agent(search)
+    assert _search(agent, "cached question") == ("miss", [])
+
+    search.failing = True
+    assert _search(agent, "other question") == (None, ["web_search_error"])
+    assert agent.upstream_status()["search"]["state"] == "open"
+
+    # Cooldown over: the refresh of the stale entry is the half-open trial
+    search.failing = False
+    time.sleep(0.1)
+    assert _search(agent, "cached question") == ("stale", [])
+    _wait_for_refreshes(agent)
+    assert agent.upstream_status()["search"]["state"] == "closed"
+    assert _search(agent, "new question") == ("miss", [])
+
+
+def test_failed_stale_refresh_reopens_breaker():
+    search = FlakySearch()
+    agent = _agent(search)
+    _search(agent, "cached question")
+    search.failing = True
+    _search(agent, "other question")
+
+    time.sleep(0.1)
+    assert _search(agent, "cached question") == ("stale", [])
+    _wait_for_refreshes(agent)
+    assert agent.upstream_status()["search"]["state"] == "open"
+
+    # The failed trial released its slot: the next cooldown allows another
+    search.failing = False
+    time.sleep(0.1)
+    assert _search(agent, "new question") == ("miss", [])
+    assert agent.upstream_status()["search"]["state"] == "closed"
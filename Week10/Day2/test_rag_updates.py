@@ -0,0 +1,160 @@
+"""
+Update path tests for agentic_rag.py and rag_store.py: uploads, upserts,
+deletes and compaction surviving a reload, the FAISS update log and its
+checkpoints, chunk store generations, collection eviction and rebuilds.
+
+Offline (benchmark.py stand-ins). Run from this directory:
+    python -m pytest test_rag_updates.py
+"""
+
+import glob
+import os
+import time
+
+import numpy as np
+import pytest
+
+import agentic_rag
+from benchmark import offline_agent
+from rag_ingest import document_hash
+from rag_retrieval import IndexSpec
+from rag_store import ChunkStore, UpdateLog
+
+DOCUMENTS = [
+    {"title": title, "type": "knowledge_base", "content": f"{title.lower()} handbook {title}"}
+    for title in ("Guide", "Manual", "Primer")
+]
+UPLOADS = [f"upload {i} topic{i}" for i in range(40)]
+UPLOAD_IDS = [f"u{i}" for i in range(40)]
+PROBES = ["upload 7 topic7", "upload 3 revised", "manual handbook Manual"]
+
+
+def _agent(index_dir=None, kind="flat", chunk_store=False, **kwargs):
+    return offline_agent(
+        documents=DOCUMENTS, index_dir=str(index_dir) if index_dir else None,
+        chunk_store=chunk_store, index_spec=IndexSpec(kind=kind, nlist=2),
+        compact_threshold=None, **kwargs)
+
+
+def _wait_for_compaction(agent, collection="default", timeout: float = 5.0):
+    target = agent._collection(collection)
+    deadline = time.monotonic() + timeout
+    while target.compaction_pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not target.compaction_pending
+    return target
+
+
+def _state(agent, collection="default"):
+    """Live document ids and the text of each probe's best hit."""
+    target = _wait_for_compaction(agent, collection)
+    hits = agent._search(PROBES, collections=collection)
+    return (sorted(target.documents_table.get().chunks),
+            [docs[0].page_content for docs, _, _ in hits])
+
+
+@pytest.mark.parametrize("chunk_store", [False, True])
+@pytest.mark.parametrize("kind", ["flat", "ivf-flat", "hnsw"])
+def test_updates_survive_reload_and_compaction(tmp_path, kind, chunk_store):
+    agent = _agent(tmp_path, kind, chunk_store)
+    agent.add_documents(UPLOADS, doc_ids=UPLOAD_IDS)
+    agent.upsert_documents(["upload 3 revised"], doc_ids=["u3"])
+    agent.delete_documents(["u5", "Guide"])
+    before = _state(agent)
+    assert "u5" not in before[0] and "Guide" not in before[0]
+    assert before[1] == PROBES[:2] + ["manual handbook Manual"]
+    assert _state(_agent(tmp_path, kind, chunk_store)) == before
+
+    assert agent.compact()["reclaimed"] > 0
+    assert _state(agent) == before
+    reloaded = _agent(tmp_path, kind, chunk_store)
+    assert _state(reloaded) == before
+    assert reloaded.collection_stats()["default"]["deleted_chunks"] == 0
+
+
+def test_update_log_replay_skips_unpublished_and_torn_records(tmp_path):
+    agent = _agent(tmp_path)
+    agent.add_documents(UPLOADS[:20], doc_ids=UPLOAD_IDS[:20])
+    agent.add_documents(UPLOADS[20:], doc_ids=UPLOAD_IDS[20:])
+    before = _state(agent)
+    log = UpdateLog(str(tmp_path))
+    size = log.size()
+    assert size > 0
+
+    # Logged by an upload whose manifest was never written, then cut short
+    log.append(10 ** 6, ["ghost"], [{}], np.zeros((1, 64), dtype=np.float32))
+    with open(log.path, "ab") as f:
+        f.write(b"\x80\x05torn")
+    assert _state(_agent(tmp_path)) == before
+    assert log.size() == size
+
+
+def test_checkpoint_saves_in_full_and_clears_update_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(agentic_rag, "CHECKPOINT_MIN_CHUNKS", 8)
+    agent = _agent(tmp_path)
+    agent.add_documents(UPLOADS, doc_ids=UPLOAD_IDS)
+    target = _wait_for_compaction(agent)
+    assert target.saved_chunks == target.snapshot.get().ntotal
+    assert UpdateLog(str(tmp_path)).size() == 0
+    assert _state(_agent(tmp_path)) == _state(agent)
+
+
+def test_compaction_starts_a_new_chunk_store_generation(tmp_path):
+    agent = _agent(tmp_path, chunk_store=True)
+    agent.add_documents(UPLOADS, doc_ids=UPLOAD_IDS)
+    agent.delete_documents(UPLOAD_IDS[:10])
+    generation = ChunkStore.open(str(tmp_path)).generation
+
+    agent.compact()
+    store = ChunkStore.open(str(tmp_path))
+    assert store.generation == generation + 1
+    assert len(store) == len(DOCUMENTS) + 30
+    assert not glob.glob(os.path.join(str(tmp_path), f"chunks.{generation}.*"))
+    assert _state(_agent(tmp_path, chunk_store=True)) == _state(agent)
+
+
+def test_eviction_only_unloads_collections_that_can_be_reloaded(tmp_path):
+    in_memory = _agent(max_loaded_collections=1)
+    saved = _agent(tmp_path, max_loaded_collections=1)
+    for agent in (in_memory, saved):
+        for name in ("a", "b", "c"):
+            agent.add_documents([f"note for {name}"], doc_ids=[f"{name}1"], collection=name)
+
+    assert in_memory.evict_idle() == []
+    assert all(stats["loaded"] for stats in in_memory.collection_stats().values())
+    saved.evict_idle()
+    assert sum(stats["loaded"] for stats in saved.collection_stats().values()) == 1
+    for agent in (in_memory, saved):
+        for name in ("a", "b", "c"):
+            assert _state(agent, name)[0] == [f"{name}1"]
+
+
+def test_upsert_skips_only_content_the_same_document_holds():
+    agent = _agent()
+    agent.add_documents(["shared text"], doc_ids=["a"])
+    assert agent.add_documents(["shared text"], doc_ids=["b"])["duplicates"] == 1
+    assert agent.upsert_documents(["shared text"], doc_ids=["a"])["duplicates"] == 1
+
+    # Another document with the same content is still added
+    stats = agent.upsert_documents(["shared text"], doc_ids=["b"])
+    assert (stats["documents"], stats["duplicates"]) == (1, 0)
+    # and a document edited to match it still replaces its old version
+    agent.add_documents(["old text"], doc_ids=["c"])
+    assert agent.upsert_documents(["shared text"], doc_ids=["c"])["replaced"] == 1
+    table = agent._collection("default").documents_table.get()
+    assert table.owners[document_hash("shared text")] == {"a", "b", "c"}
+    assert document_hash("old text") not in table.owners
+
+
+@pytest.mark.parametrize("chunk_store", [False, True])
+def test_rebuild_for_a_new_configuration_keeps_uploads(tmp_path, chunk_store):
+    agent = _agent(tmp_path, chunk_store=chunk_store)
+    agent.add_documents(UPLOADS, doc_ids=UPLOAD_IDS)
+    agent.upsert_documents(["upload 3 revised"], doc_ids=["u3"])
+    agent.delete_documents(["u5", "Guide"])
+    agent.add_documents(["team note"], doc_ids=["t1"], collection="team")
+    before = _state(agent)
+
+    rebuilt = _agent(tmp_path, "hnsw", chunk_store)
+    assert _state(rebuilt) == before
+    assert _state(rebuilt, "team")[0] == ["t1"]